@@ -1,7 +1,8 @@
+import io
+import math
 import os
 import re
 import time
-import random
 import logging
 from dataclasses import dataclass
 from functools import wraps
@@ -9,32 +10,39 @@ from html import unescape
 from urllib.parse import urlparse
 
 # Third-party imports
-import nltk
 import colorlog
 import requests
 from dotenv import load_dotenv
 from flask import (
     Flask,
+    Response,
     render_template,
     request,
     jsonify,
     send_file,
     send_from_directory,
+    g,
     current_app,
+    stream_with_context,
+    url_for,
 )
 from flask_caching import Cache
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-from llamaapi import LlamaAPI
-from firecrawl import FirecrawlApp
-from openai import OpenAI, OpenAIError
 
 # Local imports
 
+from utils.cache import answerUtils, articleUtils, cacheUtils, libraryUtils, singleflightUtils
+from utils.clients import clientUtils, resilienceUtils
 from utils.constants import IndexModel
-from utils.fetch import imageUtils
-from utils.generate import pdfUtils
-from utils.index import indexUtils
+from utils.fetch import batchUtils, extractUtils, feedUtils, imageUtils, urlUtils
+from utils.generate import pdfUtils, streamUtils, summaryUtils
+from utils.index import indexUtils, lexicalUtils, retrievalUtils
+from utils.jobs import jobUtils, speculateUtils
+from utils.metrics import metricsUtils
+from utils.ratelimit import limiterUtils, quotaUtils
+from utils.response import responseUtils
+from utils.startup import startupUtils
 
 MODELS = {
     "llama-3.1": "llama3.1-70b",
@@ -45,8 +53,6 @@ MODELS = {
 
 handler = colorlog.StreamHandler()
 
-nltk.download('punkt')
-
 logger = colorlog.getLogger(__name__)
 logger.addHandler(handler)
 
@@ -54,50 +60,130 @@ logger.addHandler(handler)
 load_dotenv()
 
 app = Flask(__name__)
+app.json = responseUtils.OrjsonProvider(app)
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-if client.api_key is None:
+if os.getenv("OPENAI_API_KEY") is None:
     raise ValueError("OpenAI API Key is not set. Please set it in the .env file.")
 
+
+def default_openai_client():
+    """OpenAI client for the server's key, created on first use and then reused."""
+    return clientUtils.registry.openai(os.getenv("OPENAI_API_KEY"))
+
+
 # Enhanced caching configuration
+# The SQLite backend is shared by every worker process on the host
 cache_config = {
-    "CACHE_TYPE": "SimpleCache",
+    "CACHE_TYPE": os.getenv("CACHE_TYPE", "utils.cache.cacheUtils.SQLiteCache"),
+    "CACHE_DIR": os.getenv("CACHE_PATH", os.path.join(".cache", "reader_cache.sqlite3")),
     "CACHE_DEFAULT_TIMEOUT": 300,  # 5 minutes default
     "CACHE_THRESHOLD": 1000,  # Maximum number of items the cache will store
+    "CACHE_MAX_BYTES": int(os.getenv("CACHE_MAX_BYTES", str(512 * 1024 * 1024))),  # LRU eviction above this size
 }
 app.config.update(cache_config)
 cache = Cache(app)
 
+# Registered before the limiter's check so the time spent in it is measured
+@app.before_request
+def _start_request_metrics():
+    g.request_start = time.perf_counter()
+    metricsUtils.start_request()
+
+
 # Initialize rate limiter
+# Token buckets in SQLite, so the limits hold across every worker process on the host
 limiter = Limiter(
     get_remote_address,
     app=app,
     default_limits=["200 per day", "50 per hour"],
-    storage_uri="memory://",
+    storage_uri=os.getenv("RATELIMIT_STORAGE_URI", limiterUtils.DEFAULT_STORAGE_URI),
+    strategy=os.getenv("RATELIMIT_STRATEGY", "token-bucket"),
 )
+# Size of one request's worth of work for the weighted limits, 0 counts every request as one
+RATELIMIT_QUERY_TOKENS = int(os.getenv("RATELIMIT_QUERY_TOKENS", "4000"))
+RATELIMIT_PDF_CHARS = int(os.getenv("RATELIMIT_PDF_CHARS", "50000"))
 
-def retry_with_backoff(retries=3, backoff_in_seconds=1):
-    """
-    Decorator that implements an exponential backoff retry strategy
-    """
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            x = 0
-            while True:
-                try:
-                    return func(*args, **kwargs)
-                except (requests.exceptions.RequestException, OpenAIError) as e:
-                    if x == retries:
-                        raise
-                    else:
-                        sleep = (backoff_in_seconds * 2 ** x +
-                               random.uniform(0, 1))
-                        time.sleep(sleep)
-                        x += 1
-        return wrapper
-    return decorator
+
+
+@app.before_request
+def _rate_limit_checked():
+    metricsUtils.record_stage("rate_limit", time.perf_counter() - g.request_start)
+
+
+# Static URLs carry a content hash, so browsers can keep them until it changes
+asset_versions = responseUtils.AssetVersions(app.static_folder)
+response_optimizer = responseUtils.ResponseOptimizer()
+
+
+@app.template_global()
+def static_url(filename):
+    return url_for("static", filename=filename, v=asset_versions.version(filename))
+
+
+@app.after_request
+def _finish_request_metrics(response):
+    if "request_start" in g:
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        seconds = time.perf_counter() - g.request_start
+        # Streamed responses are measured up to their headers
+        response.headers["Server-Timing"] = metricsUtils.finish_request(endpoint, response.status_code, seconds)
+    return response
+
+
+@app.teardown_request
+def _end_request_metrics(exc):
+    if "request_start" in g:
+        metricsUtils.end_request()
+
+
+# after_request hooks run in reverse order, registered after the metrics
+# hook so Server-Timing includes the compression
+@app.after_request
+def _optimize_response(response):
+    if request.endpoint in ("static", "public_files"):
+        responseUtils.cache_static(response, versioned="v" in request.args)
+    return response_optimizer.process(request, response)
+
+
+# Background jobs (e.g. summaries) run on a bounded worker pool
+job_manager = jobUtils.JobManager(
+    max_workers=int(os.getenv("JOB_WORKERS", "4")),
+    max_pending=int(os.getenv("JOB_MAX_PENDING", "100")),
+    ttl=600,  # keep finished jobs pollable for 10 minutes
+    store=cache,  # so a poll can land on any worker process
+)
+JOB_MAX_WAIT = 30  # seconds a long-poll may block
+
+# PDFs are laid out in worker processes, excess requests get a fast 503
+pdf_pool = pdfUtils.PdfRenderPool(
+    max_workers=int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1))),
+    max_queue=int(os.getenv("PDF_MAX_QUEUE", "8")),
+    timeout=float(os.getenv("PDF_TIMEOUT", "30")),
+    memory_limit=int(os.getenv("PDF_MEMORY_LIMIT_MB", "512")) * 1024 * 1024,
+)
+
+# SPECULATE=1 builds the index and PDF of each fetched article in the
+# background, while the process has few requests of its own
+SPECULATE_MAX_IN_FLIGHT = int(os.getenv("SPECULATE_MAX_IN_FLIGHT", "2"))
+speculator = speculateUtils.Speculator(
+    busy=lambda: metricsUtils.http_in_flight.value() > SPECULATE_MAX_IN_FLIGHT
+) if speculateUtils.SPECULATE else None
+
+# Heavy integrations are imported on first use, PREWARM=1 loads them in the
+# background shortly after startup instead
+if os.getenv("PREWARM", "0") == "1":
+    startupUtils.schedule_prewarm(float(os.getenv("PREWARM_DELAY", "1")))
+
+# Seconds a JSON request may spend on upstream calls, retries included
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "30"))
+
+# Upstream failures handle_timeout answers with 408/503/504, let through by the routes
+UPSTREAM_UNAVAILABLE_ERRORS = (
+    requests.exceptions.Timeout,
+    requests.exceptions.ConnectionError,
+    resilienceUtils.CircuitOpenError,
+    resilienceUtils.DeadlineExceededError,
+)
 
 def validate_url(url):
     """
@@ -147,6 +233,12 @@ def handle_timeout(func):
             return jsonify({
                 "error": "Connection error. Please check your internet connection."
             }), 503
+        except resilienceUtils.CircuitOpenError as e:
+            return jsonify({"error": str(e)}), 503, {"Retry-After": str(max(1, round(e.retry_after)))}
+        except resilienceUtils.DeadlineExceededError:
+            return jsonify({
+                "error": "Request timed out. Please try again."
+            }), 504
     return wrapper
 
 @dataclass
@@ -156,57 +248,149 @@ class FormattedContent:
     top_image_url: str
     markdown_content: str = ""
 
+    def to_dict(self):
+        """Fields sent to the client, markdown_content only when it isn't the content again."""
+        data = {"title": self.title, "content": self.content, "top_image_url": self.top_image_url}
+        if self.markdown_content and self.markdown_content != self.content:
+            data["markdown_content"] = self.markdown_content
+        return data
+
+SUMMARY_MODEL = "gpt-4-turbo-preview"  # Using a stable model
+# Bump when the summaryUtils prompts change so stored summaries are regenerated
+SUMMARY_PROMPT_VERSION = 2
+SUMMARY_CACHE_TTL = int(os.getenv("SUMMARY_CACHE_TTL", str(7 * 24 * 3600)))  # 1 week
+summary_cache_stats = {"hits": 0, "misses": 0, "tokens_saved": 0}
+
+
+def _summary_key(content):
+    return cacheUtils.stable_key(
+        "summary", SUMMARY_MODEL, SUMMARY_PROMPT_VERSION, cacheUtils.normalize_text(content)
+    )
+
+
+def cached_summary(content):
+    """The stored summary of content, or None if it hasn't been summarized yet."""
+    key = _summary_key(content)
+    entry = cache.get(key)
+    if entry is None:
+        # The library keeps summaries past the cache's eviction and restarts
+        summary = library.summary(articleUtils.article_id(content), key)
+        if summary is None:
+            return None
+        cache.set(key, {"summary": summary, "tokens": None}, timeout=SUMMARY_CACHE_TTL)
+        summary_cache_stats["hits"] += 1
+        return summary
+    summary_cache_stats["hits"] += 1
+    summary_cache_stats["tokens_saved"] += entry.get("tokens") or 0
+    return entry["summary"]
+
+
+def _store_summary(content, summary, tokens=None):
+    key = _summary_key(content)
+    cache.set(key, {"summary": summary, "tokens": tokens}, timeout=SUMMARY_CACHE_TTL)
+    library.set_summary(articleUtils.article_id(content), summary, key)
+
+
 def generate_summary(content):
+    """
+    Summarize content, reusing the stored summary of identical content and
+    sharing one completion between concurrent callers. Errors are raised,
+    so a summary job that fails ends in the error status.
+    """
+    summary = cached_summary(content)
+    if summary is not None:
+        return summary
+    return singleflightUtils.flights.do(_summary_key(content), lambda: _generate_summary(content))
+
+
+def generate_summary_or_error(content):
+    """generate_summary for responses that carry the summary inline, with errors as the summary text."""
     try:
-        response = client.chat.completions.create(
-            model="gpt-4-turbo-preview",  # Using a stable model
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that summarizes articles."},
-                {"role": "user", "content": f"Summarize the following article in a concise paragraph:\n\"\"\"{content}\"\"\""}
-            ],
-            max_tokens=500,
-            timeout=15  # 15 second timeout for summary generation
-        )
-        return response.choices[0].message.content.strip()
-    except OpenAIError as e:
+        return generate_summary(content)
+    except (clientUtils.openai_error(), quotaUtils.QuotaExhaustedError) as e:
         logger.error(f"OpenAI API Error: {str(e)}")
         return f"Error generating summary: {str(e)}"
     except Exception as e:
         logger.error(f"Unexpected error generating summary: {str(e)}")
         return "An unexpected error occurred while generating the summary."
 
+
+def _generate_summary(content):
+    # Another process may have stored it while we waited
+    entry = cache.get(_summary_key(content))
+    if entry is not None:
+        return entry["summary"]
+
+    quotaUtils.quotas.check(_server_openai_upstream(), _estimate_tokens(content))
+    summary_cache_stats["misses"] += 1
+    # Long articles are summarized in chunks first, see summaryUtils
+    with metricsUtils.timer("summary"):
+        summary, tokens = summaryUtils.summarize(default_openai_client(), SUMMARY_MODEL, content)
+    _store_summary(content, summary, tokens)
+    return summary
+
+
+def stream_summary(content):
+    """
+    Yield the summary of content as it is generated, or all at once when it
+    is already stored. Errors are raised to the caller, which reports them on
+    the event stream.
+    """
+    key = _summary_key(content)
+    while True:
+        summary = cached_summary(content)
+        if summary is not None:
+            yield summary
+            return
+        # Concurrent requests for the article wait for the one generating it, then read it back
+        with singleflightUtils.flights.lead(key) as leader:
+            if leader:
+                yield from _stream_new_summary(content)
+                return
+
+
+def _stream_new_summary(content):
+    # Another process may have stored it while we waited
+    entry = cache.get(_summary_key(content))
+    if entry is not None:
+        yield entry["summary"]
+        return
+
+    quotaUtils.quotas.check(_server_openai_upstream(), _estimate_tokens(content))
+    summary_cache_stats["misses"] += 1
+    # Chunks of long articles are summarized up front, the final pass streams
+    openai_client = default_openai_client()
+    messages, _ = summaryUtils.prepare_messages(openai_client, SUMMARY_MODEL, content)
+    deltas = []
+    for delta in streamUtils.stream_openai_chat(
+        openai_client,
+        model=SUMMARY_MODEL,
+        messages=messages,
+        max_tokens=summaryUtils.SUMMARY_MAX_TOKENS,
+        timeout=summaryUtils.SUMMARY_TIMEOUT
+    ):
+        deltas.append(delta)
+        yield delta
+    _store_summary(content, "".join(deltas).strip())
+
+# Retries happen per upstream call in resilienceUtils, so only articles are memoized
 @cache.memoize(timeout=3600)  # cache for 1 hour
-@retry_with_backoff()
-@handle_timeout
 def fetch_and_format_content(url):
     logger.info(f"Fetching content from URL: {url}")
     
-    firecrawl_api_key = os.getenv("FIRECRAWL_API_KEY")
-    if not firecrawl_api_key:
-        raise ValueError("Firecrawl API Key is not set. Please set it in the .env file.")
-    
     try:
-        # Initialize FirecrawlApp
-        logger.info(f"Initializing FirecrawlApp with API key: {firecrawl_api_key[:5]}...")
-        firecrawl_app = FirecrawlApp(api_key=firecrawl_api_key)
-        
-        # Scrape the URL and get markdown content
-        logger.info(f"Scraping URL with firecrawl: {url}")
-        scrape_result = firecrawl_app.scrape_url(url, params={'formats': ['markdown']})
-        
-        # Log the result structure
-        logger.info(f"Firecrawl result keys: {scrape_result.keys()}")
+        # Local extraction first, Firecrawl when the result looks poor
+        with metricsUtils.timer("scrape"):
+            scrape_result = extractUtils.extract(url)
         
         # Extract title and content
         title = scrape_result.get('title', '')
         markdown_content = scrape_result.get('markdown', '')
+        top_image_url = scrape_result.get('top_image', '')
         
-        logger.info(f"Extracted title: {title}")
+        logger.info(f"Extracted title with {scrape_result.get('extractor')} extractor: {title}")
         logger.info(f"Markdown content length: {len(markdown_content)}")
         
-        # For now, we'll leave top_image_url empty as per instruction
-        top_image_url = ''
-        
         # Use markdown as the content for compatibility with existing code
         content = markdown_content
         
@@ -226,11 +410,95 @@ def fetch_and_format_content(url):
             markdown_content=markdown_content
         )
         
+    except UPSTREAM_UNAVAILABLE_ERRORS:
+        raise
     except Exception as e:
         logger.error(f"Unexpected error fetching article: {e}")
         raise ValueError(f"An unexpected error occurred while fetching the article from {url}: {str(e)}")
 
 
+# Fetched articles by ID, so follow-up requests don't upload the text again
+article_store = articleUtils.ArticleStore(cache)
+
+# Every fetched article and summary, kept across restarts and searchable
+library = libraryUtils.ArticleLibrary(
+    os.getenv("LIBRARY_PATH", os.path.join(".cache", "library.sqlite3")),
+    max_age=libraryUtils.LIBRARY_MAX_AGE,
+    max_articles=libraryUtils.LIBRARY_MAX_ARTICLES,
+)
+
+
+def stored_article(article_id):
+    """The store entry of article_id, restored from the library once the store has lost it."""
+    article = article_store.get(article_id)
+    if article is None and articleUtils.is_article_id(article_id):
+        entry = library.get(article_id)
+        if entry is not None:
+            article_store.put(entry["title"], entry["content"], entry["top_image_url"])
+            article = article_store.get(article_id)
+    return article
+
+
+def request_article(data):
+    """
+    The article a /query or /generate_pdf payload refers to, by `articleId`
+    or as raw `content`. Returns (article, error response), the article is
+    a store entry whose `id` is None for raw content.
+    """
+    article_id = data.get("articleId")
+    if article_id:
+        article = stored_article(article_id)
+        if article is None:
+            # The client still has the text and can send it instead
+            return None, (jsonify({"error": "Unknown or expired article"}), 404)
+        return {**article, "id": article_id}, None
+    content = data.get("content")
+    if not validate_content(content):
+        return None, (jsonify({"error": "Invalid or missing content"}), 400)
+    return {"title": None, "content": content, "top_image_url": None, "id": None}, None
+
+
+def _payload_content(data):
+    """Article text of a payload for the rate limit costs, empty when it isn't known."""
+    if data.get("articleId"):
+        article = stored_article(data["articleId"])
+        return article["content"] if article else ""
+    content = data.get("content")
+    return content if isinstance(content, str) else ""
+
+
+def fetch_content(url):
+    """
+    The article at url from the library, or fetch_and_format_content of
+    it, shared by concurrent callers. Later callers in other processes
+    read the stored result.
+    """
+    # Tracking parameters and AMP variants share the cache entry of the article,
+    # the page itself is still fetched from the URL as sent
+    canonical_url = urlUtils.canonicalize_url(url)
+    key = cacheUtils.stable_key("fetch", canonical_url)
+    return singleflightUtils.flights.do(
+        key, lambda: _fetch_through_library(urlUtils.unwrap_amp_cache(url.strip()), canonical_url)
+    )
+
+
+def _fetch_through_library(url, canonical_url):
+    """The library's copy of the article at canonical_url, fetched from url when missing or stale."""
+    with metricsUtils.timer("library"):
+        article = library.get_by_url(canonical_url)
+    if article is not None:
+        return FormattedContent(
+            title=article["title"],
+            content=article["content"],
+            top_image_url=article["top_image_url"],
+            markdown_content=article["content"],
+        )
+    content = fetch_and_format_content(url)
+    # Only the canonical URL is kept, the library is listed to every client
+    library.put(canonical_url, content.title, content.content, content.top_image_url)
+    return content
+
+
 @app.route("/")
 def home():
     return render_template("index.html")
@@ -241,133 +509,585 @@ def public_files(filename):
     return send_from_directory(app.static_folder, filename)
 
 
+@app.route("/stats")
+def stats():
+    return jsonify({
+        "clients": clientUtils.registry.stats(),
+        "cache": cache.cache.stats() if hasattr(cache.cache, "stats") else {},
+        "index_cache": indexUtils.index_cache.stats(),
+        "image_cache": imageUtils.image_cache.stats(),
+        "jobs": job_manager.stats(),
+        "pdf": pdf_pool.stats(),
+        "singleflight": singleflightUtils.flights.stats(),
+        "summary_cache": summary_cache_stats,
+        "llama_context": llama_context_stats,
+        "answer_cache": answer_cache.stats(),
+        "articles": article_store.stats(),
+        "library": library.stats(),
+        "upstream_quota": quotaUtils.quotas.stats(),
+        "resilience": resilienceUtils.breakers.stats(),
+        "responses": response_optimizer.stats(),
+        "news": news_feed.stats(),
+        "speculation": speculator.stats() if speculator else {"enabled": False},
+    })
+
+
+@app.route("/metrics")
+@limiter.exempt
+def metrics():
+    return Response(metricsUtils.registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+def _cache_metrics():
+    """Hit and miss counts the caches already keep, for /metrics."""
+    index, image, answers = indexUtils.index_cache.stats(), imageUtils.image_cache.stats(), answer_cache.stats()
+    hits = {
+        "index": index["hits"] + index["disk_hits"],
+        "image": image["hits"],
+        "summary": summary_cache_stats["hits"],
+        "answer": answers["exact_hits"] + answers["semantic_hits"],
+    }
+    misses = {
+        "index": index["misses"],
+        "image": image["misses"],
+        "summary": summary_cache_stats["misses"],
+        "answer": answers["misses"],
+    }
+    return [
+        ("reader_cache_hits_total", "counter", "Cache lookups answered from the cache",
+         [({"cache": name}, value) for name, value in hits.items()]),
+        ("reader_cache_misses_total", "counter", "Cache lookups that had to compute the value",
+         [({"cache": name}, value) for name, value in misses.items()]),
+        ("reader_singleflight_coalesced_total", "counter", "Calls that waited for an identical call in flight",
+         [({}, singleflightUtils.flights.stats()["coalesced"])]),
+    ]
+
+
+metricsUtils.registry.add_collector(_cache_metrics)
+
+
+def _event_stream(events):
+    """Wrap a generator of SSE messages in a streaming response."""
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.route("/fetch", methods=["POST"])
 @limiter.limit("30 per minute")  # Rate limit for article fetching
 @handle_timeout
+@resilienceUtils.with_deadline(REQUEST_DEADLINE)
 def fetch_article():
     url = request.json.get("url")
     if not url or not validate_url(url):
         return jsonify({"error": "Invalid or missing URL"}), 400
     try:
-        content = fetch_and_format_content(url)
+        content = fetch_content(url)
         if not content.title or not content.content:
             raise ValueError("Failed to extract meaningful content from the URL")
         
-        summary = generate_summary(content.content)
-        
-        return jsonify({"content": content.__dict__, "summary": summary})
+        article_id = article_store.put(content.title, content.content, content.top_image_url)
+        speculate(article_id, content.content, content.top_image_url, request.json.get("model"))
+
+        # Articles seen before come with their stored summary
+        summary = cached_summary(content.content)
+        if summary is not None:
+            return jsonify({"content": content.to_dict(), "article_id": article_id, "summary": summary, "summary_job": None})
+
+        # Return the article right away and summarize it in the background
+        try:
+            job = job_manager.submit("summary", generate_summary, content.content)
+        except jobUtils.JobQueueFullError:
+            logger.warning("Summary queue is full, summarizing inline")
+            return jsonify({
+                "content": content.to_dict(),
+                "article_id": article_id,
+                "summary": generate_summary_or_error(content.content),
+            })
+
+        return jsonify({"content": content.to_dict(), "article_id": article_id, "summary": None, "summary_job": job.id})
+    except UPSTREAM_UNAVAILABLE_ERRORS:
+        raise
     except Exception as e:
         error_message = f"Error fetching article: {str(e)}"
         logger.error(error_message, exc_info=True)
         return jsonify({"error": error_message}), 400
 
 
-@app.route("/generate_pdf", methods=["POST"])
-@limiter.limit("10 per minute")  # Rate limit for PDF generation
+BATCH_MAX_URLS = 50
+BATCH_MAX_WORKERS = int(os.getenv("BATCH_MAX_WORKERS", "8"))
+BATCH_MAX_PER_HOST = int(os.getenv("BATCH_MAX_PER_HOST", "2"))
+
+
+def _batch_cost():
+    urls = (request.get_json(silent=True) or {}).get("urls")
+    return max(1, len(urls)) if isinstance(urls, list) else 1
+
+
+def _fetch_for_batch(url):
+    content = fetch_content(url)
+    if not isinstance(content, FormattedContent) or not content.title or not content.content:
+        raise ValueError("Failed to extract meaningful content from the URL")
+    return content
+
+
+@app.route("/fetch/batch", methods=["POST"])
+@limiter.limit("60 per minute", cost=_batch_cost)  # Each URL counts against the limit
+def fetch_article_batch():
+    """
+    Fetch a list of URLs concurrently.
+    Streams one `result` event per URL as it completes, then a `done` event.
+    """
+    urls = (request.get_json(silent=True) or {}).get("urls")
+    if not isinstance(urls, list) or not urls:
+        return jsonify({"error": "Invalid or missing URLs"}), 400
+    if len(urls) > BATCH_MAX_URLS:
+        return jsonify({"error": f"At most {BATCH_MAX_URLS} URLs per batch"}), 400
+
+    valid_urls = [url for url in urls if isinstance(url, str) and validate_url(url)]
+    invalid_urls = [url for url in urls if url not in valid_urls]
+
+    def events():
+        succeeded = failed = 0
+        for url in invalid_urls:
+            failed += 1
+            yield streamUtils.format_sse({"url": url, "error": "Invalid URL"}, event="result")
+        results = batchUtils.fetch_many(
+            valid_urls,
+            _fetch_for_batch,
+            max_workers=BATCH_MAX_WORKERS,
+            per_host=BATCH_MAX_PER_HOST,
+        )
+        for url, content, error in results:
+            if error is None:
+                succeeded += 1
+                article_id = article_store.put(content.title, content.content, content.top_image_url)
+                yield streamUtils.format_sse(
+                    {"url": url, "content": content.to_dict(), "article_id": article_id}, event="result"
+                )
+            else:
+                failed += 1
+                logger.error(f"Error fetching {url} in batch: {error}")
+                yield streamUtils.format_sse({"url": url, "error": f"Error fetching article: {error}"}, event="result")
+        yield streamUtils.format_sse({"succeeded": succeeded, "failed": failed}, event="done")
+
+    return _event_stream(events())
+
+
+@app.route("/jobs/<job_id>")
+@limiter.limit("120 per minute")  # Polling is cheap, allow frequent checks
+def job_status(job_id):
+    """
+    Return a job's status and result.
+    With ?wait=N the request long-polls for up to N seconds until the job finishes.
+    """
+    wait = request.args.get("wait", 0, type=float)
+    if not math.isfinite(wait):
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+    wait = min(max(wait, 0), JOB_MAX_WAIT)
+    job = job_manager.status(job_id, timeout=wait)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    return jsonify(job)
+
+
+# Hacker News, GDELT and arXiv, fetched by the server once per refresh for every visitor
+news_feed = feedUtils.NewsFeed(cache)
+
+
+@app.route("/news")
+@limiter.limit("60 per minute")
+def news():
+    """
+    Latest items of the news sources in ?sources (comma separated, all by
+    default), at most ?limit per source.
+    """
+    names = [name for name in request.args.get("sources", "").split(",") if name] or list(feedUtils.SOURCES)
+    if any(name not in feedUtils.SOURCES for name in names):
+        return jsonify({"error": f"Unknown source, expected {', '.join(feedUtils.SOURCES)}"}), 400
+    limit = min(max(request.args.get("limit", feedUtils.FEED_ITEMS, type=int), 1), feedUtils.FEED_ITEMS)
+    feeds = news_feed.get(list(dict.fromkeys(names)))
+    response = jsonify({"feeds": {
+        name: {**feed, "items": feed["items"][:limit]} if "items" in feed else feed
+        for name, feed in feeds.items()
+    }})
+    if any("error" in feed for feed in feeds.values()):
+        response.cache_control.no_cache = True
+        return response
+    # Browsers may reuse it until a feed is due, then show it while revalidating
+    response.cache_control.public = True
+    response.cache_control.max_age = news_feed.max_age(feeds)
+    response.cache_control.stale_while_revalidate = feedUtils.FEED_TTL
+    return response
+
+
+@app.route("/library")
+@limiter.limit("60 per minute")
+def library_list():
+    """Stored articles, most recently opened first, paged with ?limit and ?offset."""
+    limit = request.args.get("limit", libraryUtils.LIBRARY_PAGE_SIZE, type=int)
+    offset = request.args.get("offset", 0, type=int)
+    return jsonify(library.recent(limit, offset))
+
+
+@app.route("/library/search")
+@limiter.limit("120 per minute")  # Searched as the user types
+def library_search():
+    query = request.args.get("q", "").strip()
+    if not query or len(query) > 200:
+        return jsonify({"error": "Invalid or missing query"}), 400
+    limit = request.args.get("limit", libraryUtils.LIBRARY_PAGE_SIZE, type=int)
+    offset = request.args.get("offset", 0, type=int)
+    with metricsUtils.timer("library_search"):
+        results = library.search(query, limit, offset)
+    return jsonify({"query": query, "results": results})
+
+
+@app.route("/library/<article_id>")
+@limiter.limit("60 per minute")
+def library_article(article_id):
+    """A stored article with its summary, reopened without scraping it again."""
+    article = library.get(article_id) if articleUtils.is_article_id(article_id) else None
+    if article is None:
+        return jsonify({"error": "Unknown article"}), 404
+    # Follow-up /query and /generate_pdf calls can use the ID again
+    article_store.put(article["title"], article["content"], article["top_image_url"])
+    speculate(article_id, article["content"], article["top_image_url"], request.args.get("model"))
+    content = FormattedContent(
+        title=article["title"],
+        content=article["content"],
+        top_image_url=article["top_image_url"],
+        markdown_content=article["content"],
+    )
+    return jsonify({
+        "content": content.to_dict(),
+        "article_id": article_id,
+        "url": article["url"],
+        "fetched_at": article["fetched_at"],
+        "summary": cached_summary(article["content"]),
+    })
+
+
+def _pdf_payload():
+    """Fields of a /generate_pdf request, from the query string of a GET."""
+    if request.method == "GET":
+        return request.args.to_dict()
+    return request.get_json(silent=True) or {}
+
+
+def _pdf_cost():
+    content = _payload_content(_pdf_payload())
+    return limiterUtils.weighted_cost(len(content), RATELIMIT_PDF_CHARS)
+
+
+# GET with an articleId lets the browser cache the PDF and revalidate it by ETag
+@app.route("/generate_pdf", methods=["GET", "POST"])
+@limiter.limit("10 per minute", cost=_pdf_cost)  # Long articles take longer to lay out
 @handle_timeout
+@resilienceUtils.with_deadline(REQUEST_DEADLINE)
 def generate_pdf_route():
     try:
-        data = request.json
+        data = _pdf_payload()
+        if request.method == "GET" and not data.get("articleId"):
+            return jsonify({"error": "articleId is required"}), 400
         if not data:
             return jsonify({"error": "No data provided"}), 400
             
-        title = data.get("title", "article")
-        content = data.get("content", "")
-        
-        if not validate_content(content):
-            return jsonify({"error": "Invalid or missing content"}), 400
-            
+        article, error_response = request_article(data)
+        if error_response:
+            return error_response
+        content = article["content"]
+
+        # Stored articles bring their own title and image
+        title = data.get("title") or (article["title"] or "article")[:200]
         if not isinstance(title, str) or len(title) > 200:  # Reasonable title length limit
             return jsonify({"error": "Invalid title"}), 400
             
-        top_image_url = data.get("imageUrl", "")
+        top_image_url = data.get("imageUrl", article["top_image_url"] or "")
         sanitized_title = "".join(c if c.isalnum() else "_" for c in title)
         
-        # Generate cache key based on content hash
-        cache_key = f"pdf_{hash(content)}"
+        # Keyed by article ID, stable across worker processes
+        article_id = article["id"] or articleUtils.article_id(content)
+        cache_key = _pdf_cache_key(article_id, top_image_url)
+
+        # The same article and image always lay out the same PDF
+        if cache_key in request.if_none_match:
+            response = Response(status=304)
+            _set_pdf_etag(response, cache_key)
+            return response
         
-        # Try to get PDF from cache
+        # Try to get PDF from cache, stored as bytes so every hit gets its own stream
         cached_pdf = cache.get(cache_key)
         if cached_pdf:
             logger.info(f"Serving cached PDF for {sanitized_title}")
-            return send_file(
-                cached_pdf,
-                download_name=f"{sanitized_title}.pdf",
-                as_attachment=True,
-                mimetype="application/pdf",
-            )
-        
-        # Generate new PDF if not in cache
-        logger.info(f"Generating new PDF for {sanitized_title}")
-        pdf = pdfUtils.generate_pdf(content, top_image_url)
-        pdf.seek(0)
+            return _send_pdf(cached_pdf, sanitized_title, cache_key)
         
-        # Cache the PDF for 1 hour
-        cache.set(cache_key, pdf, timeout=3600)
-        
-        return send_file(
-            pdf,
-            download_name=f"{sanitized_title}.pdf",
-            as_attachment=True,
-            mimetype="application/pdf",
+        # Generate new PDF if not in cache, once for all concurrent requests
+        pdf_bytes = singleflightUtils.flights.do(
+            cache_key, lambda: _render_and_cache_pdf(cache_key, content, top_image_url)
         )
+        
+        return _send_pdf(pdf_bytes, sanitized_title, cache_key)
+    except pdfUtils.PdfQueueFullError as e:
+        logger.warning(str(e))
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
+    except pdfUtils.PdfRenderTimeoutError as e:
+        logger.error(str(e))
+        return jsonify({"error": str(e)}), 504
+    except UPSTREAM_UNAVAILABLE_ERRORS:
+        raise
     except Exception as e:
         error_message = f"Error generating PDF: {str(e)}"
         logger.error(error_message, exc_info=True)
         return jsonify({"error": error_message}), 500
 
 
-@app.route("/query", methods=["POST"])
-@limiter.limit("20 per minute")  # Rate limit for queries
-@handle_timeout
-def query_article():
-    data = request.json
+def _pdf_cache_key(article_id, top_image_url):
+    return cacheUtils.stable_key("pdf", article_id, top_image_url or "")
+
+
+def _set_pdf_etag(response, cache_key):
+    response.set_etag(cache_key)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+
+
+def _send_pdf(pdf_bytes, sanitized_title, cache_key):
+    response = send_file(
+        io.BytesIO(pdf_bytes),
+        download_name=f"{sanitized_title}.pdf",
+        as_attachment=True,
+        mimetype="application/pdf",
+    )
+    _set_pdf_etag(response, cache_key)
+    return response
+
+
+def _render_and_cache_pdf(cache_key, content, top_image_url):
+    # Another process may have rendered it while we waited
+    pdf_bytes = cache.get(cache_key)
+    if pdf_bytes:
+        return pdf_bytes
+
+    logger.info(f"Generating new PDF for {cache_key}")
+    with metricsUtils.timer("pdf_render"):
+        pdf_bytes = pdf_pool.render(content, top_image_url)
+
+    # Cache the PDF for 1 hour
+    cache.set(cache_key, pdf_bytes, timeout=3600)
+    return pdf_bytes
+
+
+def _speculate_pdf(cache_key, content, top_image_url):
+    if not cache.has(cache_key):
+        singleflightUtils.flights.do(cache_key, lambda: _render_and_cache_pdf(cache_key, content, top_image_url))
+
+
+OPENAI_MODELS = ["gpt-4-turbo-preview", "gpt-3.5-turbo", "gpt-4"]
+# Index speculatively built for clients that don't say which model they will query with
+SPECULATE_MODEL = os.getenv("SPECULATE_MODEL", OPENAI_MODELS[0])
+llama_context_stats = {"requests": 0, "prompt_tokens_saved": 0}
+
+
+def _estimate_tokens(text):
+    # Rough count, cheap enough to run before the request is admitted
+    return len(text) // summaryUtils.CHARS_PER_TOKEN
+
+
+def _server_openai_upstream():
+    return quotaUtils.openai_upstream(os.getenv("OPENAI_API_KEY"))
+
+
+def _query_cost():
+    data = request.get_json(silent=True) or {}
+    text = f"{_payload_content(data)}{data.get('query') or ''}"
+    return limiterUtils.weighted_cost(_estimate_tokens(text), RATELIMIT_QUERY_TOKENS)
+
+# Paraphrased questions are matched with the server's embedding key, for OpenAI models only,
+# and without retries as a failed embedding only costs the paraphrase match
+answer_cache = answerUtils.AnswerCache(
+    cache, embed=lambda text: lexicalUtils.embed_texts(default_openai_client(), [text], attempts=1)[0]
+)
+
+
+def _use_answer_cache(data):
+    """False when the request asks for a fresh answer."""
+    if data.get("cache") is False or "no-cache" in request.headers.get("Cache-Control", ""):
+        answer_cache.bypass()
+        return False
+    return True
+
+
+def _validate_query_request(data):
+    """
+    Validate a query payload, apart from its article (see request_article).
+    Returns an error response tuple, or None when the payload is valid.
+    """
     if not data:
         return jsonify({"error": "No data provided"}), 400
-        
+
     model = data.get("model")
     api_key = data.get("apiKey")
-    content = data.get("content")
     query = data.get("query")
-    
+
     # Validate inputs
-    if not model or model not in MODELS and model not in ["gpt-4-turbo-preview", "gpt-3.5-turbo", "gpt-4"]:
+    if not model or model not in MODELS and model not in OPENAI_MODELS:
         return jsonify({"error": "Invalid or unsupported model"}), 400
-        
+
     if api_key and not validate_api_key(api_key):
         return jsonify({"error": "Invalid API key format"}), 400
-        
-    if not validate_content(content):
-        return jsonify({"error": "Invalid or missing content"}), 400
-        
+
     if not query or not isinstance(query, str) or len(query) > 1000:  # Reasonable query length limit
         return jsonify({"error": "Invalid or missing query"}), 400
-    if model in ["gpt-4-turbo-preview", "gpt-3.5-turbo", "gpt-4"]:
-        try:
-            # Create a new OpenAI client with the provided API key or use the default one
-            openai_client = OpenAI(api_key=api_key) if api_key else client
-            indexModel = IndexModel.VECTOR_STORE
-            temperature = 0.2
 
-            prompt = f"""
+    index_model = data.get("indexModel", QUERY_INDEX_MODEL.value)
+    if not isinstance(index_model, str) or index_model not in QUERY_INDEX_MODELS:
+        return jsonify({"error": "Invalid index model"}), 400
+    return None
+
+
+QUERY_INSTRUCTIONS = """
                 You need to write your answer into the MarkDown format.
                 You can link and highlight part of the article using MarkDown link like so: \"\"\"[Source](#highlight=Exact%20Text%20from%20the%20content)\"\"\",
                 Do not use '-' for space use '%20' instead, and refer to the content using the exact words within the content.
                 Do not hesitate to link and highlight each part of the content that informs your answer.
+"""
+# lexical and hybrid build the index locally, vector_store embeds the whole article.
+# Requests can pick another one with indexModel.
+QUERY_INDEX_MODEL = IndexModel(os.getenv("QUERY_INDEX_MODEL", IndexModel.VECTOR_STORE.value))
+QUERY_INDEX_MODELS = {m.value for m in (IndexModel.LEXICAL, IndexModel.HYBRID, IndexModel.VECTOR_STORE)}
+
+
+def _query_index_model(data):
+    """The index model OpenAI queries of this request use."""
+    return IndexModel(data.get("indexModel", QUERY_INDEX_MODEL.value))
+
+
+def _answer_cache_model(model, index_model):
+    """Answers are cached per index model too, the same question gets a different answer from each."""
+    return f"{model}:{index_model.value}" if model in OPENAI_MODELS else model
+
+
+def _build_query_prompt(content):
+    return f"""{QUERY_INSTRUCTIONS}
                 This is the content: <content>{content}</content>
                 """
 
-            # Create RAG index
-            index = indexUtils.create_rag_index(prompt, model, indexModel)
-            if index is None:
-                raise ValueError("Failed to create RAG index")
-            
-            query_engine = index.as_query_engine()
+
+def _get_query_engine(content, model, index_model, streaming=False, openai_client=None):
+    # Reuse the cached RAG index for this content, building it on a miss
+    if index_model == IndexModel.VECTOR_STORE:
+        index = indexUtils.get_or_create_rag_index(_build_query_prompt(content), model, index_model)
+        if index is None:
+            raise ValueError("Failed to create RAG index")
+        return index.as_query_engine(streaming=streaming)
+
+    index = indexUtils.get_or_create_rag_index(content, model, index_model)
+    if index is None:
+        raise ValueError("Failed to create RAG index")
+    return index.as_query_engine(
+        streaming=streaming, instructions=QUERY_INSTRUCTIONS, openai_client=openai_client
+    )
+
+
+def _build_llama_request(model, content, query):
+    """
+    Llama API request answering query from the passages of content that
+    match it best, within LLAMA_CONTEXT_TOKENS. Returns the request and the
+    RetrievedContext, which tells how many prompt tokens were saved.
+    """
+    context = retrievalUtils.retrieve_context(content, query)
+    logger.info(
+        f"Llama query context: {context.prompt_tokens} of {context.full_tokens} tokens "
+        f"({context.tokens_saved} saved)"
+    )
+    llama_context_stats["requests"] += 1
+    llama_context_stats["prompt_tokens_saved"] += context.tokens_saved
+    return {
+        "model": MODELS[model],
+        "messages": [
+            {"role": "system", "content": (
+                "Answer the user's question about an article using these excerpts of it, "
+                f"grouped by section:\n<content>{context.text}</content>"
+            )},
+            {"role": "user", "content": query},
+        ],
+        "timeout": 15  # 15 second timeout for LLM queries
+    }, context
+
+
+def speculate(article_id, content, top_image_url, model=None):
+    """
+    Queue what the first /query and /generate_pdf on a fetched article
+    will need, for the model the client says it will use. Vector store
+    indexes are left out, they spend embedding quota on articles that may
+    never be queried.
+    """
+    if speculator is None:
+        return
+    if model in MODELS:
+        speculator.submit(f"sentences_{article_id}", retrievalUtils.get_sentence_index, content)
+    elif QUERY_INDEX_MODEL != IndexModel.VECTOR_STORE:
+        model = model if model in OPENAI_MODELS else SPECULATE_MODEL
+        speculator.submit(
+            f"index_{article_id}_{model}", indexUtils.get_or_create_rag_index, content, model, QUERY_INDEX_MODEL
+        )
+    # The PDF a request by articleId gets, with the article's own image
+    cache_key = _pdf_cache_key(article_id, top_image_url)
+    speculator.submit(cache_key, _speculate_pdf, cache_key, content, top_image_url, ready=pdf_pool.has_capacity)
+
+
+@app.route("/query", methods=["POST"])
+@limiter.limit("20 per minute", cost=_query_cost)  # Long articles count as several queries
+@handle_timeout
+@resilienceUtils.with_deadline(REQUEST_DEADLINE)
+def query_article():
+    data = request.json
+    error_response = _validate_query_request(data)
+    if error_response:
+        return error_response
+    article, error_response = request_article(data)
+    if error_response:
+        return error_response
+
+    model = data.get("model")
+    api_key = data.get("apiKey")
+    content = article["content"]
+    query = data.get("query")
+    index_model = _query_index_model(data)
+    cache_model = _answer_cache_model(model, index_model)
+
+    # Repeated and paraphrased questions about an article are answered from the cache
+    use_cache = _use_answer_cache(data)
+    if use_cache:
+        with metricsUtils.timer("answer_cache"):
+            answer = answer_cache.get(content, cache_model, query, semantic=model in OPENAI_MODELS)
+        if answer is not None:
+            return jsonify({"result": answer, "cached": True})
+
+    if model in OPENAI_MODELS:
+        try:
+            # Hold back before OpenAI would answer with a 429
+            quotaUtils.quotas.check(quotaUtils.openai_upstream(api_key or os.getenv("OPENAI_API_KEY")))
+
+            # Create a new OpenAI client with the provided API key or use the default one
+            openai_client = clientUtils.registry.openai(api_key) if api_key else default_openai_client()
+
             # Use RAG to get relevant content
-            response = query_engine.query(query)
+            query_engine = _get_query_engine(content, model, index_model, openai_client=openai_client)
+            with metricsUtils.timer("query_engine"):
+                response = query_engine.query(query)
 
+            answer_cache.put(content, cache_model, query, str(response))
             return jsonify({"result": str(response)})
-        except OpenAIError as e:
+        except quotaUtils.QuotaExhaustedError as e:
+            logger.warning(str(e))
+            return jsonify({"error": str(e)}), 503, {"Retry-After": str(max(1, round(e.retry_after)))}
+        except UPSTREAM_UNAVAILABLE_ERRORS:
+            raise
+        except clientUtils.openai_error() as e:
             logger.error(f"OpenAI API Error in query: {str(e)}")
             return jsonify({"error": f"OpenAI API Error: {str(e)}"}), 400
         except Exception as e:
@@ -375,22 +1095,109 @@ def query_article():
             return jsonify({"error": str(e)}), 400
     else:
         api_key = api_key if api_key else os.getenv("LLAMA_API_KEY")
-        llama = LlamaAPI(api_key)
+        llama = clientUtils.registry.llama(api_key)
         try:
-            api_request_json = {
-                "model": MODELS[model],
-                "messages": [
-                    {"role": "system", "content": query},
-                    {"role": "user", "content": content},
-                ],
-                "timeout": 15  # 15 second timeout for LLM queries
-            }
             # Make your request and handle the response
-            response = llama.run(api_request_json)
-            return jsonify({"result": response.json()["choices"][0]["message"]["content"]})
+            api_request_json, context = _build_llama_request(model, content, query)
+            with metricsUtils.timer("generation"), metricsUtils.upstream("llama"):
+                response = resilienceUtils.call(quotaUtils.llama_upstream(api_key), lambda: llama.run(
+                    {**api_request_json, "timeout": resilienceUtils.timeout(api_request_json["timeout"])}
+                ))
+            answer = response.json()["choices"][0]["message"]["content"]
+            answer_cache.put(content, cache_model, query, answer, semantic=False)
+            return jsonify({"result": answer, "prompt_tokens_saved": context.tokens_saved})
+        except UPSTREAM_UNAVAILABLE_ERRORS:
+            raise
         except Exception as e:
-            return jsonify({"error": str(e)}), 400      
-    
+            return jsonify({"error": str(e)}), 400
+
+
+@app.route("/query/stream", methods=["POST"])
+@limiter.limit("20 per minute", cost=_query_cost)  # Shares the /query budget
+def query_article_stream():
+    """Same payload as /query, answered as a stream of `token` events."""
+    data = request.json
+    error_response = _validate_query_request(data)
+    if error_response:
+        return error_response
+    article, error_response = request_article(data)
+    if error_response:
+        return error_response
+
+    model = data.get("model")
+    api_key = data.get("apiKey")
+    content = article["content"]
+    query = data.get("query")
+    index_model = _query_index_model(data)
+    cache_model = _answer_cache_model(model, index_model)
+
+    use_cache = _use_answer_cache(data)
+
+    def events():
+        try:
+            semantic = model in OPENAI_MODELS
+            answer = answer_cache.get(content, cache_model, query, semantic=semantic) if use_cache else None
+            if answer is not None:
+                yield streamUtils.format_sse({"text": answer}, event="token")
+                yield streamUtils.format_sse({"cached": True}, event="done")
+                return
+
+            done = {}
+            if model in OPENAI_MODELS:
+                quotaUtils.quotas.check(quotaUtils.openai_upstream(api_key or os.getenv("OPENAI_API_KEY")))
+                openai_client = clientUtils.registry.openai(api_key) if api_key else default_openai_client()
+                query_engine = _get_query_engine(
+                    content, model, index_model, streaming=True, openai_client=openai_client
+                )
+                deltas = streamUtils.stream_query_engine(query_engine, query)
+            else:
+                llama = clientUtils.registry.llama(api_key if api_key else os.getenv("LLAMA_API_KEY"))
+                api_request_json, context = _build_llama_request(model, content, query)
+                done["prompt_tokens_saved"] = context.tokens_saved
+                deltas = streamUtils.stream_llama_chat(llama, api_request_json)
+            answer = []
+            for delta in deltas:
+                answer.append(delta)
+                yield streamUtils.format_sse({"text": delta}, event="token")
+            answer_cache.put(content, cache_model, query, "".join(answer), semantic=semantic)
+            yield streamUtils.format_sse(done, event="done")
+        except Exception as e:
+            logger.error(f"Error streaming query: {str(e)}")
+            yield streamUtils.format_sse({"error": str(e)}, event="error")
+
+    return _event_stream(events())
+
+
+@app.route("/fetch/stream", methods=["POST"])
+@limiter.limit("30 per minute")  # Shares the /fetch budget
+def fetch_article_stream():
+    """
+    Same payload as /fetch. Sends the article as an `article` event as soon
+    as it is scraped, then the summary as a stream of `token` events.
+    """
+    url = request.json.get("url")
+    model = request.json.get("model")
+    if not url or not validate_url(url):
+        return jsonify({"error": "Invalid or missing URL"}), 400
+
+    def events():
+        try:
+            content = fetch_content(url)
+            if not content.title or not content.content:
+                raise ValueError("Failed to extract meaningful content from the URL")
+            article_id = article_store.put(content.title, content.content, content.top_image_url)
+            speculate(article_id, content.content, content.top_image_url, model)
+            yield streamUtils.format_sse({"content": content.to_dict(), "article_id": article_id}, event="article")
+            for delta in stream_summary(content.content):
+                yield streamUtils.format_sse({"text": delta}, event="token")
+            yield streamUtils.format_sse({}, event="done")
+        except Exception as e:
+            error_message = f"Error fetching article: {str(e)}"
+            logger.error(error_message, exc_info=True)
+            yield streamUtils.format_sse({"error": error_message}, event="error")
+
+    return _event_stream(events())
+
 
 if __name__ == "__main__":
     # Configure logging
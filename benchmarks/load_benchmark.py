@@ -0,0 +1,308 @@
+"""
+Drive /fetch, /query and /generate_pdf against local upstream stubs and
+report throughput and latency percentiles per endpoint and pipeline stage.
+
+    python benchmarks/load_benchmark.py --concurrency 1,8,32 --requests 64 --output load.json
+    python benchmarks/load_benchmark.py --baseline load.json --max-regression 0.2
+
+Nothing leaves the machine: Firecrawl, OpenAI (chat and embeddings), the
+Llama API, article pages and images are served by stub_upstreams with the
+latencies and sizes given on the command line, and token counts are
+estimated from the text length, as tiktoken downloads its tokenizer on
+first use. The app runs in this process on a threaded local server with
+its own temporary caches, and rate limits are off unless --keep-limits
+is set.
+
+Each concurrency level uses its own articles, so --articles smaller than
+--requests measures repeat (cached) traffic and the default measures cold
+requests. Stage timings are taken by wrapping the pipeline functions.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+import requests
+
+from stub_upstreams import StubConfig, StubUpstreams, article_markdown
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = ["fetch", "query", "generate_pdf"]
+QUESTIONS = [
+    "What are the key points of this article?",
+    "What does the article say about the budget?",
+    "How does the report describe climate policy?",
+    "Summarize the main arguments.",
+    "What future impact is expected?",
+]
+
+
+class StageTimer:
+    """Durations of wrapped pipeline functions, by stage name."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.durations = {}
+
+    def wrap(self, owner, attribute: str, stage: str) -> None:
+        function = getattr(owner, attribute)
+
+        @wraps(function)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.durations.setdefault(stage, []).append(time.perf_counter() - start)
+
+        setattr(owner, attribute, timed)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {stage: len(values) for stage, values in self.durations.items()}
+
+    def since(self, snapshot: dict) -> dict:
+        with self._lock:
+            return {
+                stage: summarize(values[snapshot.get(stage, 0):])
+                for stage, values in self.durations.items()
+                if len(values) > snapshot.get(stage, 0)
+            }
+
+
+def percentile(values: list, q: float) -> float:
+    """Nearest-rank percentile of values, q between 0 and 1."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+def summarize(values: list) -> dict:
+    return {
+        "count": len(values),
+        "mean": statistics.fmean(values),
+        "p50": percentile(values, 0.50),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+        "max": max(values),
+    }
+
+
+def load_app(stubs: StubUpstreams, args, cache_dir: str):
+    """Import the app configured against the stubs, with stage timers installed."""
+    os.environ.update(stubs.environment())
+    os.environ.update({
+        "CACHE_PATH": os.path.join(cache_dir, "reader_cache.sqlite3"),
+        "INDEX_CACHE_DIR": os.path.join(cache_dir, "index"),
+        "SINGLEFLIGHT_LOCK_DIR": os.path.join(cache_dir, "locks"),
+        "RATELIMIT_STORAGE_URI": "sqlite:///" + os.path.join(cache_dir, "ratelimit.sqlite3"),
+        "UPSTREAM_QUOTA_PATH": os.path.join(cache_dir, "ratelimit.sqlite3"),
+        "LIBRARY_PATH": os.path.join(cache_dir, "library.sqlite3"),
+        "EXTRACTORS": args.extractors,
+        "ALLOW_PRIVATE_URLS": "1",  # The stubs listen on 127.0.0.1
+        "PDF_WORKERS": str(args.pdf_workers),
+        "NLTK_ALLOW_DOWNLOAD": "0",
+        "PREWARM": "0",
+        "SPECULATE": "0",
+    })
+    sys.path.insert(0, ROOT)
+    import app
+    from utils.fetch import extractUtils
+    from utils.generate import pdfUtils, summaryUtils
+    from utils.index import indexUtils, lexicalUtils, retrievalUtils
+
+    # tiktoken would download cl100k_base, use the length-based estimate summaryUtils falls back to
+    summaryUtils._encoding_failed = True
+    timer = StageTimer()
+    timer.wrap(extractUtils, "extract", "scrape")
+    timer.wrap(summaryUtils, "summarize", "summary")
+    timer.wrap(indexUtils, "get_or_create_rag_index", "index")
+    timer.wrap(lexicalUtils.LexicalQueryEngine, "query", "generation")
+    timer.wrap(retrievalUtils, "retrieve_context", "retrieval")
+    timer.wrap(pdfUtils, "fetch_display_image", "image")
+    timer.wrap(app.pdf_pool, "render", "pdf_render")
+    if not args.keep_limits:
+        app.limiter.enabled = False
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    logging.getLogger("app").setLevel(logging.WARNING)
+    return app, timer
+
+
+def request_for(endpoint: str, number: int, sequence: int, stubs: StubUpstreams, args):
+    """Path and JSON body of one benchmark request."""
+    if endpoint == "fetch":
+        return "/fetch", {"url": f"{stubs.url}/article/{number}"}
+    content = article_markdown(number, args.article_kb)
+    if endpoint == "query":
+        return "/query", {
+            "model": args.query_model, "indexModel": args.index_model,
+            "content": content, "query": QUESTIONS[sequence % len(QUESTIONS)],
+        }
+    return "/generate_pdf", {"title": f"Article {number}", "content": content, "imageUrl": f"{stubs.url}/image/{number}.png"}
+
+
+def run_level(base_url: str, endpoint: str, concurrency: int, level: int, stubs, args, requests_count: int = None) -> dict:
+    sessions = threading.local()
+    latencies, errors = [], {}
+    lock = threading.Lock()
+
+    def send(sequence: int):
+        session = getattr(sessions, "session", None)
+        if session is None:
+            session = sessions.session = requests.Session()
+        number = level * 100000 + sequence % args.articles
+        path, body = request_for(endpoint, number, sequence, stubs, args)
+        start = time.perf_counter()
+        try:
+            status = session.post(f"{base_url}{path}", json=body, timeout=args.timeout).status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if status != 200:
+                errors[str(status)] = errors.get(str(status), 0) + 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(send, range(requests_count or args.requests)))
+    seconds = time.perf_counter() - start
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": seconds,
+        "throughput_rps": len(latencies) / seconds,
+        "latency": summarize(latencies),
+    }
+
+
+def wait_for_jobs(app, timeout: float) -> None:
+    """Let background summaries finish so their work counts towards the level that queued them."""
+    deadline = time.monotonic() + timeout
+    while app.job_manager.stats()["pending"] and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+
+def upstream_delta(before: dict, after: dict) -> dict:
+    return {
+        kind: {"calls": stats["calls"] - before.get(kind, {}).get("calls", 0)}
+        for kind, stats in after.items()
+        if stats["calls"] != before.get(kind, {}).get("calls", 0)
+    }
+
+
+def compare(report: dict, baseline: dict, max_regression: float) -> bool:
+    """Print the change against a baseline report, returning whether it is within max_regression."""
+    previous = {(r["endpoint"], r["concurrency"]): r for r in baseline["results"]}
+    ok = True
+    for result in report["results"]:
+        old = previous.get((result["endpoint"], result["concurrency"]))
+        if old is None:
+            continue
+        change = result["latency"]["p95"] / old["latency"]["p95"] - 1
+        throughput = result["throughput_rps"] / old["throughput_rps"] - 1
+        flag = ""
+        if max_regression is not None and change > max_regression:
+            ok, flag = False, "  REGRESSION"
+        print(f"{result['endpoint']:>12} x{result['concurrency']:<4} p95 {change:+.1%}  throughput {throughput:+.1%}{flag}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="comma separated, from: " + ", ".join(ENDPOINTS))
+    parser.add_argument("--concurrency", default="1,8", help="comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=32, help="requests per endpoint and level")
+    parser.add_argument("--articles", type=int, help="distinct articles per level (default: one per request)")
+    parser.add_argument("--query-model", default="gpt-4", help="an OpenAI model or a Llama API model name")
+    parser.add_argument("--index-model", default="lexical", help="indexModel of the OpenAI queries")
+    parser.add_argument("--extractors", default="local,firecrawl", help="EXTRACTORS for the app, e.g. firecrawl")
+    parser.add_argument("--pdf-workers", type=int, default=2)
+    parser.add_argument("--keep-limits", action="store_true", help="leave the rate limits on")
+    parser.add_argument("--warmup", type=int, default=1, help="unmeasured requests per endpoint before the first level")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--page-latency", type=float, default=StubConfig.page_latency)
+    parser.add_argument("--scrape-latency", type=float, default=StubConfig.scrape_latency)
+    parser.add_argument("--llm-latency", type=float, default=StubConfig.llm_latency)
+    parser.add_argument("--embedding-latency", type=float, default=StubConfig.embedding_latency)
+    parser.add_argument("--image-latency", type=float, default=StubConfig.image_latency)
+    parser.add_argument("--article-kb", type=int, default=StubConfig.article_kb)
+    parser.add_argument("--image-px", type=int, default=StubConfig.image_px)
+    parser.add_argument("--completion-words", type=int, default=StubConfig.completion_words)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--max-regression", type=float, help="fail when a p95 grew by more than this fraction")
+    args = parser.parse_args()
+    args.articles = args.articles or args.requests
+
+    stubs = StubUpstreams(StubConfig(
+        page_latency=args.page_latency,
+        scrape_latency=args.scrape_latency,
+        llm_latency=args.llm_latency,
+        embedding_latency=args.embedding_latency,
+        image_latency=args.image_latency,
+        article_kb=args.article_kb,
+        image_px=args.image_px,
+        completion_words=args.completion_words,
+    )).start()
+
+    from werkzeug.serving import make_server
+
+    with tempfile.TemporaryDirectory(prefix="reader-benchmark-") as cache_dir:
+        app, timer = load_app(stubs, args, cache_dir)
+        server = make_server("127.0.0.1", 0, app.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+
+        results = []
+        levels = [int(level) for level in args.concurrency.split(",")]
+        for endpoint in args.endpoints.split(","):
+            # Lazy imports and first connections are paid outside the measurements
+            for _ in range(args.warmup):
+                run_level(base_url, endpoint, 1, len(levels), stubs, args, requests_count=1)
+            wait_for_jobs(app, args.timeout)
+            for level_number, concurrency in enumerate(levels):
+                stages, upstream = timer.snapshot(), stubs.stats()
+                result = run_level(base_url, endpoint, concurrency, level_number, stubs, args)
+                wait_for_jobs(app, args.timeout)
+                result.update({
+                    "endpoint": endpoint,
+                    "concurrency": concurrency,
+                    "stages": timer.since(stages),
+                    "upstream": upstream_delta(upstream, stubs.stats()),
+                })
+                results.append(result)
+                latency = result["latency"]
+                print(
+                    f"{endpoint:>12} x{concurrency:<4} {result['throughput_rps']:7.1f} req/s  "
+                    f"p50 {latency['p50'] * 1000:7.0f}ms  p95 {latency['p95'] * 1000:7.0f}ms  "
+                    f"p99 {latency['p99'] * 1000:7.0f}ms  errors {sum(result['errors'].values())}"
+                )
+        server.shutdown()
+
+    stubs.stop()
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if not compare(report, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Measure how long importing the app takes, so startup regressions are visible.
+
+    python benchmarks/startup_benchmark.py --runs 5 --output startup.json --max-seconds 2
+
+Each run imports app.py in a fresh interpreter with network-free settings.
+With --prewarm the time of startupUtils.prewarm() is measured as well.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = """
+import json, time
+start = time.perf_counter()
+import app
+result = {"import_seconds": time.perf_counter() - start}
+if PREWARM:
+    from utils.startup import startupUtils
+    start = time.perf_counter()
+    result["prewarm"] = startupUtils.prewarm()
+    result["prewarm_seconds"] = time.perf_counter() - start
+print(json.dumps(result))
+"""
+
+
+def run_once(prewarm: bool) -> dict:
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    env["PREWARM"] = "0"
+    env["NLTK_ALLOW_DOWNLOAD"] = "0"
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", f"PREWARM = {prewarm}\n{IMPORT_SNIPPET}"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process_seconds"] = time.perf_counter() - start
+    return result
+
+
+def summarize(values: []) -> dict:
+    return {
+        "min": min(values),
+        "median": statistics.median(values),
+        "max": max(values),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--prewarm", action="store_true", help="also time the prewarm hook")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--max-seconds", type=float, help="fail when the median import time is above this")
+    args = parser.parse_args()
+
+    runs = [run_once(args.prewarm) for _ in range(args.runs)]
+    report = {
+        "runs": runs,
+        "import_seconds": summarize([run["import_seconds"] for run in runs]),
+        "process_seconds": summarize([run["process_seconds"] for run in runs]),
+    }
+    if args.prewarm:
+        report["prewarm_seconds"] = summarize([run["prewarm_seconds"] for run in runs])
+
+    print(json.dumps({key: value for key, value in report.items() if key != "runs"}, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    median = report["import_seconds"]["median"]
+    if args.max_seconds is not None and median > args.max_seconds:
+        print(f"Median import time {median:.2f}s is above {args.max_seconds:.2f}s", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
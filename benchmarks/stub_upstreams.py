@@ -0,0 +1,272 @@
+"""
+Local stand-ins for the upstream services the app calls, for benchmarks.
+
+One threaded HTTP server answers as
+- article pages and images:  GET /article/<n>, GET /image/<n>.png
+- Firecrawl:                 POST /v0/scrape          (FIRECRAWL_API_URL)
+- OpenAI chat + embeddings:  POST /v1/chat/completions, POST /v1/embeddings (OPENAI_BASE_URL)
+- Llama API:                 POST /chat/completions   (LLAMA_API_URL)
+
+Each kind of call sleeps for its configured latency, and the server keeps
+count of calls and time spent per kind so runs can tell upstream time from
+time spent in the app.
+"""
+import hashlib
+import http.server
+import io
+import json
+import math
+import random
+import threading
+import time
+from dataclasses import dataclass
+
+WORDS = (
+    "market policy climate energy carbon tax growth budget research model data "
+    "city transport housing health school election court science study report "
+    "price rate company product team season result analysis impact future"
+).split()
+
+
+@dataclass
+class StubConfig:
+    page_latency: float = 0.1
+    scrape_latency: float = 0.3
+    llm_latency: float = 0.2
+    embedding_latency: float = 0.05
+    image_latency: float = 0.05
+    article_kb: int = 20
+    image_px: int = 1200
+    completion_words: int = 120
+    embedding_dimensions: int = 256
+
+
+def article_markdown(number: int, size_kb: int) -> str:
+    """Deterministic markdown article of about size_kb kilobytes."""
+    rng = random.Random(number)
+    parts, size, section = [f"# Article {number}"], 0, 0
+    while size < size_kb * 1024:
+        if len(parts) % 6 == 1:
+            section += 1
+            parts.append(f"## Section {section}")
+        paragraph = " ".join(
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + "."
+            for _ in range(rng.randint(3, 6))
+        )
+        parts.append(paragraph)
+        size += len(paragraph)
+    return "\n\n".join(parts)
+
+
+def article_html(number: int, size_kb: int, base_url: str) -> str:
+    markdown = article_markdown(number, size_kb)
+    body = []
+    for block in markdown.split("\n\n"):
+        if block.startswith("## "):
+            body.append(f"<h2>{block[3:]}</h2>")
+        elif block.startswith("# "):
+            body.append(f"<h1>{block[2:]}</h1>")
+        else:
+            body.append(f"<p>{block}</p>")
+    return (
+        "<html><head>"
+        f"<title>Article {number}</title>"
+        f"<meta property=\"og:image\" content=\"{base_url}/image/{number}.png\">"
+        "</head><body><nav><a href=\"/\">Home</a></nav>"
+        f"<article>{''.join(body)}</article>"
+        "<footer>Footer</footer></body></html>"
+    )
+
+
+class StubUpstreams:
+    """The stub server, started on a free local port by start()."""
+
+    def __init__(self, config: StubConfig = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or StubConfig()
+        self._server = http.server.ThreadingHTTPServer((host, port), _handler_for(self))
+        self._server.daemon_threads = True
+        self._lock = threading.Lock()
+        self._image = None
+        self.calls = {}  # kind -> [count, seconds]
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubUpstreams":
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def environment(self) -> dict:
+        """Environment variables pointing the app at this server."""
+        return {
+            "OPENAI_API_KEY": "sk-benchmark",
+            "OPENAI_BASE_URL": f"{self.url}/v1",
+            "FIRECRAWL_API_KEY": "fc-benchmark",
+            "FIRECRAWL_API_URL": self.url,
+            "LLAMA_API_KEY": "llama-benchmark",
+            "LLAMA_API_URL": self.url,
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                kind: {"calls": count, "seconds": seconds, "mean_seconds": seconds / count if count else 0.0}
+                for kind, (count, seconds) in sorted(self.calls.items())
+            }
+
+    def record(self, kind: str, seconds: float) -> None:
+        with self._lock:
+            count, total = self.calls.get(kind, (0, 0.0))
+            self.calls[kind] = (count + 1, total + seconds)
+
+    def image_bytes(self) -> bytes:
+        with self._lock:
+            if self._image is None:
+                from PIL import Image
+                size = self.config.image_px
+                image = Image.effect_noise((size, size * 2 // 3), 64).convert("RGB")
+                output = io.BytesIO()
+                image.save(output, format="JPEG", quality=85)
+                self._image = output.getvalue()
+            return self._image
+
+
+def _handler_for(stubs: StubUpstreams):
+    config = stubs.config
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            start = time.perf_counter()
+            if self.path.startswith("/article/"):
+                time.sleep(config.page_latency)
+                number = _number(self.path)
+                self._send(200, article_html(number, config.article_kb, stubs.url).encode(), "text/html; charset=utf-8")
+                stubs.record("page", time.perf_counter() - start)
+            elif self.path.startswith("/image/"):
+                time.sleep(config.image_latency)
+                self._send_image()
+                stubs.record("image", time.perf_counter() - start)
+            else:
+                self._send(404, b"{}", "application/json")
+
+        def do_POST(self):
+            start = time.perf_counter()
+            length = int(self.headers.get("Content-Length") or 0)
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if self.path == "/v0/scrape":
+                time.sleep(config.scrape_latency)
+                number = _number(payload.get("url", ""))
+                self._send_json({"success": True, "data": {
+                    "markdown": article_markdown(number, config.article_kb),
+                    "metadata": {"title": f"Article {number}", "ogImage": f"{stubs.url}/image/{number}.png"},
+                }})
+                stubs.record("firecrawl", time.perf_counter() - start)
+            elif self.path in ("/v1/chat/completions", "/chat/completions"):
+                kind = "openai_chat" if self.path.startswith("/v1/") else "llama_chat"
+                self._chat(payload)
+                stubs.record(kind, time.perf_counter() - start)
+            elif self.path == "/v1/embeddings":
+                time.sleep(config.embedding_latency)
+                inputs = payload.get("input") or []
+                inputs = [inputs] if isinstance(inputs, str) else inputs
+                self._send_json({
+                    "object": "list",
+                    "model": payload.get("model", "stub"),
+                    "data": [
+                        {"object": "embedding", "index": i, "embedding": _embedding(text, config.embedding_dimensions)}
+                        for i, text in enumerate(inputs)
+                    ],
+                    "usage": {"prompt_tokens": len(inputs), "total_tokens": len(inputs)},
+                })
+                stubs.record("openai_embeddings", time.perf_counter() - start)
+            else:
+                self._send(404, b"{}", "application/json")
+
+        def _chat(self, payload):
+            words = [random.choice(WORDS) for _ in range(config.completion_words)]
+            prompt_tokens = sum(len(str(m.get("content", ""))) for m in payload.get("messages", [])) // 4
+            if not payload.get("stream"):
+                time.sleep(config.llm_latency)
+                self._send_json({
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": payload.get("model", "stub"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": " ".join(words)},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": len(words),
+                        "total_tokens": prompt_tokens + len(words),
+                    },
+                })
+                return
+
+            # Streamed: the latency is spread over the chunks
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            chunks = [" ".join(words[i:i + 10]) + " " for i in range(0, len(words), 10)]
+            for text in chunks:
+                time.sleep(config.llm_latency / len(chunks))
+                chunk = {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": payload.get("model", "stub"),
+                    "choices": [{"index": 0, "delta": {"content": text}, "finish_reason": None}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+
+        def _send_image(self):
+            data = stubs.image_bytes()
+            byte_range = self.headers.get("Range")
+            if byte_range and byte_range.startswith("bytes=0-"):
+                end = min(len(data), int(byte_range.split("-")[1]) + 1)
+                self._send(206, data[:end], "image/jpeg")
+            else:
+                self._send(200, data, "image/jpeg")
+
+        def _send_json(self, payload):
+            self._send(200, json.dumps(payload).encode(), "application/json")
+
+        def _send(self, status, body: bytes, content_type: str):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def _number(path: str) -> int:
+    digits = "".join(c for c in path.rsplit("/", 1)[-1] if c.isdigit())
+    return int(digits) if digits else 0
+
+
+def _embedding(text: str, dimensions: int) -> list:
+    """Bag of hashed words, so texts sharing words get similar vectors."""
+    vector = [0.0] * dimensions
+    for word in text.lower().split():
+        vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % dimensions] += 1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
@@ -1,24 +1,38 @@
 const converter = new showdown.Converter();
 let articleTitle = '';
 let topImageUrl = '';
+let articleId = ''; // Server-side copy of the article, sent instead of its content
 
 /**
- * Function to write messages to the chatbox.
- * @param {boolean} isAI - Whether the message is from AI or user.
+ * Function to send a request about the fetched article, by ID when the server has it.
+ * Falls back to sending the content once the server no longer knows the ID.
+ * @param {string} content - The article content.
+ * @param {Function} send - Called with the article fields of the payload, returns the request's promise.
+ */
+const sendWithArticle = async (content, send) => {
+    if (articleId) {
+        try {
+            return await send({ articleId: articleId });
+        } catch (error) {
+            const status = error.status || (error.response && error.response.status);
+            if (status !== 404) throw error;
+            articleId = '';
+        }
+    }
+    return send({ content: content });
+};
+
+/**
+ * Function to render a message into an existing chat bubble.
+ * @param {HTMLElement} chatBubble - The chat bubble element.
  * @param {string} message - The message content.
- * @param {string} [color=""] - The color of the chat bubble (optional).
  */
-const writeToChat = (isAI, message, color="") => {
-    const queryResultElement = document.getElementById('queryResult');
-    
+const renderChatBubble = (chatBubble, message) => {
     // Convert "#Some Text" to a special link
     message = message.replace(/#(.*?)#/g, (match, p1) => {
         return `[${p1}](#highlight=${encodeURIComponent(p1)})`;
     });
 
-    // Create the chat bubble element
-    const chatBubble = document.createElement('div');
-    chatBubble.className = `chat-bubble ${color === "" ? "" : "font_reader chat-bubble-" + color}`;
     chatBubble.innerHTML = converter.makeHtml(message);
 
     // Add click event listeners to the special links
@@ -30,6 +44,22 @@ const writeToChat = (isAI, message, color="") => {
             openArticleModalWithHighlight(textToHighlight);
         });
     });
+};
+
+/**
+ * Function to write messages to the chatbox.
+ * @param {boolean} isAI - Whether the message is from AI or user.
+ * @param {string} message - The message content.
+ * @param {string} [color=""] - The color of the chat bubble (optional).
+ * @returns {HTMLElement} The chat bubble, so streamed messages can be re-rendered.
+ */
+const writeToChat = (isAI, message, color="") => {
+    const queryResultElement = document.getElementById('queryResult');
+
+    // Create the chat bubble element
+    const chatBubble = document.createElement('div');
+    chatBubble.className = `chat-bubble ${color === "" ? "" : "font_reader chat-bubble-" + color}`;
+    renderChatBubble(chatBubble, message);
 
     // Create the chat container element
     const chatContainer = document.createElement('div');
@@ -41,6 +71,7 @@ const writeToChat = (isAI, message, color="") => {
 
     // Scroll to the bottom of the chatbox
     queryResultElement.scrollTop = queryResultElement.scrollHeight;
+    return chatBubble;
 };
 
 /**
@@ -57,30 +88,43 @@ const fetchArticle = async () => {
     queryResultElement.appendChild(queryLoadingElement);
 
     hiddenContentElement.value = ''; // Clear the hidden content field
+    articleId = '';
     queryLoadingElement.classList.remove('hidden'); // Show loading spinner
     queryResultElement.scrollTop = queryResultElement.scrollHeight;
 
     try {
-        const response = await axios.post('/fetch', { url: url });
-        const article = response.data.content;
-        articleTitle = article.title;
-        topImageUrl = article.top_image_url;
-
-        writeToChat(true, `${topImageUrl !== '' ? `![Header](${topImageUrl})` : ''}\n\n##${articleTitle}\n\n${response.data.summary}`, 'primary');
-        
-        // Store markdown content if available, otherwise use the regular content
-        if (article.markdown_content) {
-            hiddenContentElement.value = article.markdown_content;
-        } else {
-            hiddenContentElement.value = `
-                <img src=${topImageUrl} ><h1><a href="${url}" target="_blank">${articleTitle}</a></h1>
-                ${article.content}
-            `;
-        }
+        let chatBubble = null;
+        let header = '';
+        let summary = '';
+
+        // The article arrives first, then the summary streams in token by token
+        // The model lets the server prepare the index the first question will use
+        const model = document.getElementById('modelSelect').value;
+        await postEventStream('/fetch/stream', { url: url, model: model }, (eventName, data) => {
+            if (eventName === 'article') {
+                const article = data.content;
+                articleTitle = article.title;
+                topImageUrl = article.top_image_url;
+                articleId = data.article_id || '';
+                header = `${topImageUrl !== '' ? `![Header](${topImageUrl})` : ''}\n\n##${articleTitle}\n\n`;
+
+                // markdown_content is only sent when it differs from the content
+                hiddenContentElement.value = article.markdown_content || article.content;
+
+                queryLoadingElement.classList.add('hidden');
+                chatBubble = writeToChat(true, header, 'primary');
+            } else if (eventName === 'token') {
+                summary += data.text;
+                renderChatBubble(chatBubble, header + summary);
+                queryResultElement.scrollTop = queryResultElement.scrollHeight;
+            } else if (eventName === 'error') {
+                throw new Error(data.error);
+            }
+        });
 
     } catch (error) {
         writeToChat(true, `Error fetching article.`, 'error');
-        console.error(`Error fetching article:\n${error.response?.data?.error || error.message}`);
+        console.error(`Error fetching article:\n${error.message}`);
     } finally {
         queryLoadingElement.classList.add('hidden'); // Hide loading spinner
     }
@@ -101,7 +145,12 @@ const generatePDF = async () => {
     }
 
     try {
-        const response = await axios.post('/generate_pdf', { title: articleTitle, content: content, images: images }, { responseType: 'blob' });
+        // By ID the PDF is a GET the browser can cache and revalidate
+        const response = await sendWithArticle(content, (article) =>
+            article.articleId
+                ? axios.get('/generate_pdf', { params: { title: articleTitle, ...article }, responseType: 'blob' })
+                : axios.post('/generate_pdf', { title: articleTitle, ...article, images: images }, { responseType: 'blob' })
+        );
         const url = window.URL.createObjectURL(new Blob([response.data]));
         const link = document.createElement('a');
         link.href = url;
@@ -142,18 +191,32 @@ const queryArticle = async () => {
     try {
         // Get the API key from localStorage using the getApiKey function
         const apiKey = getApiKey();
-        
+        let chatBubble = null;
+        let answer = '';
+
         // Include the API key in the request if it exists
-        const response = await axios.post('/query', { 
-            content: content, 
-            query: query, 
+        await sendWithArticle(content, (article) => postEventStream('/query/stream', {
+            ...article,
+            query: query,
             model: model,
             apiKey: apiKey
-        });
-        writeToChat(true, response.data.result);
+        }, (eventName, data) => {
+            if (eventName === 'token') {
+                answer += data.text;
+                if (!chatBubble) {
+                    queryLoadingElement.classList.add('hidden');
+                    chatBubble = writeToChat(true, answer);
+                } else {
+                    renderChatBubble(chatBubble, answer);
+                }
+                queryResultElement.scrollTop = queryResultElement.scrollHeight;
+            } else if (eventName === 'error') {
+                throw new Error(data.error);
+            }
+        }));
     } catch (error) {
         writeToChat(true, `Error querying article.`, 'error');
-        console.error(`Error querying article:\n${error.response?.data?.error || error.message}`);
+        console.error(`Error querying article:\n${error.message}`);
     } finally {
         queryLoadingElement.classList.add('hidden');
         queryInputElement.value = '';
@@ -60,6 +60,19 @@ const loadNewsContent = async (loadFunction, container, loadMoreButton) => {
     }
 }
 
+/**
+ * Function to fetch the latest items of a news source from the server's aggregated feed.
+ * @param {string} source - The source name: hackernews, gdelt or arxiv.
+ * @param {number} limit - The maximum number of items.
+ * @returns {Promise<Array>} The items, each with id, title, url, by, score, published and comments_url.
+ */
+const fetchNewsItems = async (source, limit = 6) => {
+    const response = await axios.get('/news', { params: { sources: source, limit: limit } });
+    const feed = response.data.feeds[source];
+    if (feed.error) throw new Error(feed.error);
+    return feed.items;
+};
+
 
 // Initialize sections with "Load More" buttons
 window.onload = () => {
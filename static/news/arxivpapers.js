@@ -6,15 +6,11 @@
 const loadArxivPapers = async (container, loadMoreButton) => {
     return loadNewsContent(async (container, loadMoreButton) => {
         try {
-            const response = await axios.get(`http://export.arxiv.org/api/query?search_query=all&start=0&max_results=6&sortBy=lastUpdatedDate&sortOrder=descending`);
-            const parser = new DOMParser();
-            const xmlDoc = parser.parseFromString(response.data, "text/xml");
-
-            const entries = xmlDoc.getElementsByTagName("entry");
-            const papers = Array.from(entries).map(entry => {
-                const title = entry.getElementsByTagName("title")[0].textContent.trim();
-                const authors = Array.from(entry.getElementsByTagName("author")).map(author => author.getElementsByTagName("name")[0].textContent.trim()).join(", ");
-                const link = entry.getElementsByTagName("id")[0].textContent.trim();
+            const entries = await fetchNewsItems('arxiv', 6);
+            const papers = entries.map(entry => {
+                const title = entry.title;
+                const authors = entry.by || '';
+                const link = entry.url;
                 return `
                     <div class="relative flex flex-col justify-center p-4 bg-primary text-white rounded-lg pb-10 text-center">
                         <!-- Title of the Arxiv paper -->
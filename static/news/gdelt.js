@@ -6,8 +6,7 @@
 const loadGDELTNews = async (container, loadMoreButton) => {
     return loadNewsContent(async (container, loadMoreButton) => {
         try {
-            const response = await axios.get('https://api.gdeltproject.org/api/v2/doc/doc?query=technology&mode=artlist&maxrecords=6&format=json');
-            const articles = response.data.articles;
+            const articles = await fetchNewsItems('gdelt', 6);
 
             const articleElements = articles.map(article => {
                 return `
@@ -22,7 +21,7 @@ const loadGDELTNews = async (container, loadMoreButton) => {
                         </button>
                         <!-- Source (positioned at the bottom) -->
                         <span class="absolute bottom-2 left-2 bg-gray-700 text-white rounded-full px-3 py-1 text-xs">
-                            Source: ${article.source}
+                            Source: ${article.by}
                         </span>
                     </div>
                 `;
@@ -118,3 +118,48 @@ function openArticleModalWithHighlight(textToHighlight) {
         firstHighlight.scrollIntoView({ behavior: 'smooth', block: 'center' });
     }
 }
+
+/**
+ * Function to POST a JSON payload and consume the server-sent events it streams back.
+ * @param {string} url - The endpoint to call.
+ * @param {Object} payload - The JSON body of the request.
+ * @param {Function} onEvent - Called with (eventName, data) for every event received.
+ */
+const postEventStream = async (url, payload, onEvent) => {
+    const response = await fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(payload),
+    });
+    if (!response.ok) {
+        const data = await response.json().catch(() => ({}));
+        const error = new Error(data.error || `Request failed with status ${response.status}`);
+        error.status = response.status;
+        throw error;
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let eventName = 'message';
+            let data = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event:')) eventName = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            });
+            onEvent(eventName, data ? JSON.parse(data) : {});
+        }
+    }
+};
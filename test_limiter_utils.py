@@ -0,0 +1,91 @@
+from limits import parse
+
+from utils.ratelimit import limiterUtils
+
+
+def make_storage(tmp_path):
+    return limiterUtils.SQLiteStorage("sqlite:///" + str(tmp_path / "ratelimit.sqlite3"))
+
+
+def freeze_time(monkeypatch, start=1000.0):
+    """Make the storage's clock a settable value instead of the wall clock."""
+    now = [start]
+    monkeypatch.setattr(limiterUtils.time, "time", lambda: now[0])
+    return now
+
+
+def test_weighted_cost():
+    """
+    One request per started per_unit, at least one, capped when a cap is given
+    """
+    assert limiterUtils.weighted_cost(0, 1000) == 1
+    assert limiterUtils.weighted_cost(1000, 1000) == 1
+    assert limiterUtils.weighted_cost(1001, 1000) == 2
+    assert limiterUtils.weighted_cost(4500, 1000) == 5
+    assert limiterUtils.weighted_cost(4500, 1000, cap=3) == 3
+    assert limiterUtils.weighted_cost(10 ** 6, 0) == 1
+
+
+def test_acquire_empties_and_refills_the_bucket(tmp_path, monkeypatch):
+    """
+    A bucket allows a burst up to its capacity, then one request per refilled token
+    """
+    now = freeze_time(monkeypatch)
+    storage = make_storage(tmp_path)
+
+    assert [storage.acquire("bucket", 3, 0.5, 1) for _ in range(4)] == [True, True, True, False]
+    now[0] += 1
+    assert storage.acquire("bucket", 3, 0.5, 1) is False
+    now[0] += 1
+    assert storage.acquire("bucket", 3, 0.5, 1) is True
+    now[0] += 60
+    assert storage.tokens("bucket", 3, 0.5) == 3
+
+
+def test_acquire_takes_the_whole_cost_or_nothing(tmp_path, monkeypatch):
+    freeze_time(monkeypatch)
+    storage = make_storage(tmp_path)
+
+    assert storage.acquire("bucket", 5, 1, 4) is True
+    assert storage.acquire("bucket", 5, 1, 2) is False
+    assert storage.tokens("bucket", 5, 1) == 1
+
+
+def test_buckets_are_shared_between_storages(tmp_path, monkeypatch):
+    """
+    Worker processes open the same database, each sees the others' requests
+    """
+    freeze_time(monkeypatch)
+    first, second = make_storage(tmp_path), make_storage(tmp_path)
+
+    assert first.acquire("bucket", 2, 0.1, 1) is True
+    assert second.acquire("bucket", 2, 0.1, 1) is True
+    assert first.acquire("bucket", 2, 0.1, 1) is False
+
+
+def test_token_bucket_rate_limiter(tmp_path, monkeypatch):
+    now = freeze_time(monkeypatch)
+    limiter = limiterUtils.TokenBucketRateLimiter(make_storage(tmp_path))
+    item = parse("3 per minute")
+
+    assert limiter.test(item, "client") is True
+    assert [limiter.hit(item, "client") for _ in range(4)] == [True, True, True, False]
+    assert limiter.test(item, "client") is False
+    # Other clients have their own bucket
+    assert limiter.hit(item, "other") is True
+    # 3 per minute refills a token every 20 seconds
+    now[0] += 20
+    assert limiter.get_window_stats(item, "client").remaining == 1
+    assert limiter.hit(item, "client") is True
+
+
+def test_token_bucket_charges_at_most_the_bucket(tmp_path, monkeypatch):
+    """
+    A request costing more than the whole limit still goes through on a full bucket
+    """
+    freeze_time(monkeypatch)
+    limiter = limiterUtils.TokenBucketRateLimiter(make_storage(tmp_path))
+    item = parse("3 per minute")
+
+    assert limiter.hit(item, "client", cost=10) is True
+    assert limiter.hit(item, "client") is False
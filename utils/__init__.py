@@ -3,9 +3,16 @@ Utils package for the Reader application.
 Contains various utility modules for article processing, indexing, and PDF generation.
 """
 
+from . import cache
+from . import clients
 from . import constants
 from . import fetch
 from . import generate
 from . import index
+from . import jobs
+from . import metrics
+from . import ratelimit
+from . import response
+from . import startup
 
-__all__ = ['constants', 'fetch', 'generate', 'index']
+__all__ = ['cache', 'clients', 'constants', 'fetch', 'generate', 'index', 'jobs', 'metrics', 'ratelimit', 'response', 'startup']
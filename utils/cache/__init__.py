@@ -0,0 +1,7 @@
+"""
+Cache package for caches shared by every worker process on a host.
+"""
+
+from . import answerUtils, articleUtils, cacheUtils, libraryUtils, singleflightUtils, sqliteUtils
+
+__all__ = ['answerUtils', 'articleUtils', 'cacheUtils', 'libraryUtils', 'singleflightUtils', 'sqliteUtils']
@@ -0,0 +1,148 @@
+''' Utils function related to cached query answers '''
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from utils.cache.cacheUtils import normalize_text, stable_key
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", str(24 * 3600)))  # 1 day
+# Cosine similarity above which a paraphrased question reuses an answer, opt-in as it spends embedding calls
+ANSWER_SEMANTIC_THRESHOLD = float(os.getenv("ANSWER_SEMANTIC_THRESHOLD", "0"))
+ANSWER_SEMANTIC_MAX_ENTRIES = int(os.getenv("ANSWER_SEMANTIC_MAX_ENTRIES", "64"))  # Per article and model
+QUERY_EMBEDDING_CACHE_SIZE = 256
+
+_TRAILING_PUNCTUATION = re.compile(r"[\s?.!]+$")
+
+
+def normalize_query(query: str) -> str:
+    return _TRAILING_PUNCTUATION.sub("", normalize_text(query).lower())
+
+
+class AnswerCache:
+    """
+    Answers to questions about an article, stored in the shared cache.
+    The exact tier is keyed by the article digest, model and normalized
+    question. The semantic tier keeps the question embeddings of each
+    article and model, so a paraphrase whose similarity reaches threshold
+    gets the stored answer. Answers are embedded for it in the background,
+    after the response. Every entry expires after ttl seconds.
+    """
+
+    def __init__(self, cache, embed=None, ttl: int = ANSWER_CACHE_TTL,
+                 threshold: float = ANSWER_SEMANTIC_THRESHOLD,
+                 max_semantic_entries: int = ANSWER_SEMANTIC_MAX_ENTRIES):
+        self.cache = cache
+        self.embed = embed  # text -> unit vector
+        self.ttl = ttl
+        self.threshold = threshold
+        self.max_semantic_entries = max_semantic_entries
+        self._embeddings = OrderedDict()  # normalized query -> unit vector
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="answer-embed")
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    @property
+    def semantic(self) -> bool:
+        return self.embed is not None and self.threshold > 0
+
+    def get(self, content: str, model: str, query: str, semantic: bool = True):
+        """The stored answer for query, or None. semantic=False only looks for the exact question."""
+        article = _article_digest(content)
+        answer = self.cache.get(stable_key("answer", article, model, normalize_query(query)))
+        if answer is not None:
+            self._count("exact_hits")
+            return answer
+
+        if self.semantic and semantic:
+            entries = self._semantic_entries(article, model)
+            vector = self._embed_query(query) if entries else None
+            if vector is not None:
+                similarity = np.stack([e["embedding"] for e in entries]) @ vector
+                best = int(np.argmax(similarity))
+                if similarity[best] >= self.threshold:
+                    self._count("semantic_hits")
+                    return entries[best]["answer"]
+
+        self._count("misses")
+        return None
+
+    def put(self, content: str, model: str, query: str, answer: str, semantic: bool = True) -> None:
+        """Store the answer, and queue it for the semantic tier unless semantic=False."""
+        if not answer:
+            return
+        article = _article_digest(content)
+        self.cache.set(stable_key("answer", article, model, normalize_query(query)), answer, timeout=self.ttl)
+        if self.semantic and semantic:
+            self._executor.submit(self._put_semantic, article, model, query, answer)
+
+    def _put_semantic(self, article: str, model: str, query: str, answer: str) -> None:
+        vector = self._embed_query(query)
+        if vector is None:
+            return
+        entries = self._semantic_entries(article, model)
+        entries.append({"embedding": vector, "answer": answer, "expires": time.time() + self.ttl})
+        # The oldest entries go first when an article collects too many questions
+        self.cache.set(
+            stable_key("answer_semantic", article, model),
+            entries[-self.max_semantic_entries:],
+            timeout=self.ttl,
+        )
+
+    def bypass(self) -> None:
+        """Count a request that skipped the lookup."""
+        self._count("bypassed")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_ratio": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+                "semantic_hit_ratio": self.semantic_hits / lookups if lookups else 0.0,
+            }
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _semantic_entries(self, article: str, model: str) -> list:
+        now = time.time()
+        entries = self.cache.get(stable_key("answer_semantic", article, model)) or []
+        return [e for e in entries if e["expires"] > now]
+
+    def _embed_query(self, query: str):
+        # The lookup and the following put embed the same question once
+        normalized = normalize_query(query)
+        with self._lock:
+            vector = self._embeddings.get(normalized)
+            if vector is not None:
+                self._embeddings.move_to_end(normalized)
+                return vector
+        try:
+            vector = self.embed(normalized)
+        except Exception as e:
+            logger.warning(f"Skipping the semantic answer cache, embedding failed: {e}")
+            return None
+        with self._lock:
+            self._embeddings[normalized] = vector
+            while len(self._embeddings) > QUERY_EMBEDDING_CACHE_SIZE:
+                self._embeddings.popitem(last=False)
+        return vector
+
+
+def _article_digest(content: str) -> str:
+    return stable_key("article", normalize_text(content))
@@ -0,0 +1,92 @@
+''' Utils function related to the server-side article store '''
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+ARTICLE_STORE_TTL = int(os.getenv("ARTICLE_STORE_TTL", str(7 * 24 * 3600)))  # 7 days
+ARTICLE_MEMORY_ENTRIES = 64  # Articles kept unpickled for follow-up queries
+
+_ARTICLE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def article_id(content: str) -> str:
+    """Content-addressed ID of an article, the same text always gets the same ID."""
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def is_article_id(value) -> bool:
+    return isinstance(value, str) and bool(_ARTICLE_ID.match(value))
+
+
+class ArticleStore:
+    """
+    Fetched articles by article_id in the shared cache, so /query and
+    /generate_pdf can be sent the ID /fetch returned instead of the whole
+    text. The most recently used articles are also kept in memory.
+    Entries are dicts with `title`, `content` and `top_image_url`.
+    """
+
+    def __init__(self, cache, ttl: int = ARTICLE_STORE_TTL, max_memory_entries: int = ARTICLE_MEMORY_ENTRIES):
+        self.cache = cache
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self._memory = OrderedDict()  # article ID -> entry
+        self._lock = threading.Lock()
+        self.stored = 0
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, title: str, content: str, top_image_url: str = "") -> str:
+        """Store an article and return its ID."""
+        key = article_id(content)
+        entry = {"title": title, "content": content, "top_image_url": top_image_url or ""}
+        with self._lock:
+            known = self._memory.get(key) == entry
+        # Articles this process already stored are only written again once evicted
+        if not known:
+            self.cache.set(_cache_key(key), entry, timeout=self.ttl)
+            with self._lock:
+                self.stored += 1
+        self._remember(key, entry)
+        return key
+
+    def get(self, key: str):
+        """The entry stored under key, or None for unknown or expired IDs."""
+        if not is_article_id(key):
+            return None
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry
+        entry = self.cache.get(_cache_key(key))
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self._remember(key, entry)
+        return entry
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_memory": len(self._memory),
+                "stored": self.stored,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _remember(self, key: str, entry: dict) -> None:
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+
+def _cache_key(key: str) -> str:
+    return f"article_{key}"
@@ -0,0 +1,163 @@
+''' Utils function related to the shared cache '''
+import hashlib
+import os
+import pickle
+import sqlite3
+import time
+import unicodedata
+
+from flask_caching.backends.base import BaseCache
+
+from utils.cache.sqliteUtils import ThreadConnections
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024  # 512MB
+ACCESS_RESOLUTION = 60  # Seconds a hit may lag behind in the LRU order, so most reads don't write
+PRUNE_EVERY = 100  # Writes between checks of the size limits
+
+
+def stable_key(prefix: str, *parts) -> str:
+    """
+    Cache key from a BLAKE2 digest of parts.
+    Unlike hash(), the digest is identical in every process and restart.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = str(part).encode("utf-8")
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return f"{prefix}_{digest.hexdigest()}"
+
+
+def normalize_text(text: str) -> str:
+    """
+    Text with Unicode forms and whitespace normalized, for keys that should
+    not change when the same article is scraped with different formatting.
+    """
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class SQLiteCache(BaseCache):
+    """
+    Cache stored in a SQLite database so every worker process on the host
+    shares entries. Expired entries are dropped on access and the least
+    recently used ones are evicted once the store exceeds max_bytes or
+    threshold entries, checked every PRUNE_EVERY writes of a process.
+    A hit only records its access time when the stored one is older than
+    ACCESS_RESOLUTION seconds.
+    """
+
+    def __init__(self, path: str, default_timeout: int = 300, threshold: int = 0,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        super().__init__(default_timeout=default_timeout)
+        self.path = path
+        self.threshold = threshold
+        self.max_bytes = max_bytes
+        self._writes = 0
+        self._connections = ThreadConnections(path)
+        with self._connections.get() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY,"
+                " value BLOB NOT NULL,"
+                " expires REAL NOT NULL,"
+                " accessed REAL NOT NULL,"
+                " size INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        path = config.get("CACHE_DIR") or os.path.join(".cache", "reader_cache.sqlite3")
+        kwargs.update(
+            threshold=config.get("CACHE_THRESHOLD", 0),
+            max_bytes=config.get("CACHE_MAX_BYTES", DEFAULT_MAX_BYTES),
+        )
+        return cls(path, *args, **kwargs)
+
+    def _expires_at(self, timeout) -> float:
+        timeout = self._normalize_timeout(timeout)
+        return time.time() + timeout if timeout > 0 else 0
+
+    def get(self, key):
+        conn = self._connections.get()
+        row = conn.execute("SELECT value, expires, accessed FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires, accessed = row
+        now = time.time()
+        if expires and expires <= now:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            return None
+        if now - accessed > ACCESS_RESOLUTION:
+            try:
+                conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            except sqlite3.OperationalError:
+                pass  # Only the eviction order depends on it, a busy database isn't worth failing the read
+        try:
+            return pickle.loads(value)
+        except (pickle.UnpicklingError, AttributeError, EOFError, ImportError):
+            return None
+
+    def set(self, key, value, timeout=None):
+        return self._write("INSERT OR REPLACE", key, value, timeout)
+
+    def add(self, key, value, timeout=None):
+        # Clear an expired entry so it doesn't block the insert
+        self._connections.get().execute(
+            "DELETE FROM entries WHERE key = ? AND expires > 0 AND expires <= ?",
+            (key, time.time()),
+        )
+        return self._write("INSERT OR IGNORE", key, value, timeout)
+
+    def _write(self, verb, key, value, timeout) -> bool:
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        conn = self._connections.get()
+        cursor = conn.execute(
+            f"{verb} INTO entries (key, value, expires, accessed, size) VALUES (?, ?, ?, ?, ?)",
+            (key, sqlite3.Binary(blob), self._expires_at(timeout), now, len(blob)),
+        )
+        self._writes += 1
+        if self._writes % PRUNE_EVERY == 0:
+            self._prune(conn)
+        return cursor.rowcount > 0
+
+    def delete(self, key):
+        cursor = self._connections.get().execute("DELETE FROM entries WHERE key = ?", (key,))
+        return cursor.rowcount > 0
+
+    def has(self, key):
+        row = self._connections.get().execute(
+            "SELECT expires FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        return row is not None and (not row[0] or row[0] > time.time())
+
+    def clear(self):
+        self._connections.get().execute("DELETE FROM entries")
+        return True
+
+    def stats(self) -> dict:
+        count, size = self._connections.get().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        return {"entries": count, "bytes": size, "max_bytes": self.max_bytes}
+
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        """Drop expired entries, then least recently used ones over the limits."""
+        conn.execute("DELETE FROM entries WHERE expires > 0 AND expires <= ?", (time.time(),))
+        count, size = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        over_count = count - self.threshold if self.threshold else 0
+        if size <= self.max_bytes and over_count <= 0:
+            return
+        freed = removed = 0
+        stale_keys = []
+        for key, entry_size in conn.execute("SELECT key, size FROM entries ORDER BY accessed"):
+            if size - freed <= self.max_bytes and removed >= over_count:
+                break
+            stale_keys.append((key,))
+            freed += entry_size
+            removed += 1
+        conn.executemany("DELETE FROM entries WHERE key = ?", stale_keys)
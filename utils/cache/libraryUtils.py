@@ -0,0 +1,272 @@
+''' Utils function related to the persistent article library '''
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from utils.cache.articleUtils import article_id
+from utils.cache.sqliteUtils import ThreadConnections
+
+logger = logging.getLogger(__name__)
+
+LIBRARY_MAX_AGE = int(os.getenv("LIBRARY_MAX_AGE", str(7 * 24 * 3600)))  # Older copies of a URL are fetched again
+LIBRARY_MAX_ARTICLES = int(os.getenv("LIBRARY_MAX_ARTICLES", "10000"))  # Least recently opened ones go first
+PRUNE_EVERY = 100  # Writes between checks of the article limit
+LIBRARY_PAGE_SIZE = 20
+LIBRARY_MAX_PAGE_SIZE = 100
+SNIPPET_TOKENS = 24
+TITLE_WEIGHT = 5.0  # Matches in the title rank above matches in the text
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS articles ("
+    " rowid INTEGER PRIMARY KEY,"
+    " id TEXT NOT NULL UNIQUE,"
+    " url TEXT,"
+    " title TEXT NOT NULL,"
+    " content TEXT NOT NULL,"
+    " top_image_url TEXT NOT NULL DEFAULT '',"
+    " summary TEXT,"
+    " summary_key TEXT,"  # Model and prompt version the summary was made with
+    " fetched_at REAL NOT NULL,"
+    " opened_at REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS urls ("
+    " url TEXT PRIMARY KEY,"
+    " article_id TEXT NOT NULL,"
+    " fetched_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS articles_opened ON articles (opened_at)",
+    # Libraries written before only canonical URLs were stored kept the URL as requested
+    "UPDATE articles SET url = (SELECT u.url FROM urls u WHERE u.article_id = articles.id"
+    " ORDER BY u.fetched_at DESC LIMIT 1) WHERE url NOT IN (SELECT url FROM urls)",
+)
+
+# External content FTS5 index, kept in step with articles by triggers
+_FTS_SCHEMA = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5("
+    " title, content, content='articles', content_rowid='rowid',"
+    " tokenize='porter unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS articles_fts_insert AFTER INSERT ON articles BEGIN"
+    " INSERT INTO articles_fts (rowid, title, content) VALUES (new.rowid, new.title, new.content);"
+    " END",
+    "CREATE TRIGGER IF NOT EXISTS articles_fts_delete AFTER DELETE ON articles BEGIN"
+    " INSERT INTO articles_fts (articles_fts, rowid, title, content) VALUES ('delete', old.rowid, old.title, old.content);"
+    " END",
+    "CREATE TRIGGER IF NOT EXISTS articles_fts_update AFTER UPDATE OF title, content ON articles BEGIN"
+    " INSERT INTO articles_fts (articles_fts, rowid, title, content) VALUES ('delete', old.rowid, old.title, old.content);"
+    " INSERT INTO articles_fts (rowid, title, content) VALUES (new.rowid, new.title, new.content);"
+    " END",
+)
+
+_LISTED = "a.id, a.url, a.title, a.top_image_url, a.fetched_at, a.opened_at, a.summary IS NOT NULL"
+
+
+class ArticleLibrary:
+    """
+    Every fetched article with its summary, kept in SQLite across restarts
+    and cache evictions, with an FTS5 index over title and text for search.
+    Articles are keyed by article_id, each canonical URL points at the
+    article it was last fetched as. Only canonical URLs are stored, as the
+    library is listed to every client. Past max_articles, the least
+    recently opened articles are dropped, checked every PRUNE_EVERY writes
+    of a process.
+    Without FTS5 in the SQLite build, search falls back to LIKE matching.
+    """
+
+    def __init__(self, path: str, max_age: int = LIBRARY_MAX_AGE, max_articles: int = LIBRARY_MAX_ARTICLES):
+        self.path = path
+        self.max_age = max_age
+        self.max_articles = max_articles
+        self._writes = 0
+        self._lock = threading.Lock()
+        self.url_hits = 0
+        self.url_misses = 0
+        self.searches = 0
+        self._connections = ThreadConnections(path)
+        conn = self._connections.get()
+        for statement in _SCHEMA:
+            conn.execute(statement)
+        try:
+            for statement in _FTS_SCHEMA:
+                conn.execute(statement)
+            self.fts = True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"FTS5 unavailable, library search falls back to LIKE: {e}")
+            self.fts = False
+
+    def put(self, url: str, title: str, content: str, top_image_url: str = "") -> str:
+        """Store the article fetched from the canonical url and return its ID."""
+        key = article_id(content)
+        now = time.time()
+        conn = self._connections.get()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO articles (id, url, title, content, top_image_url, fetched_at, opened_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (id) DO UPDATE SET"
+                " title = excluded.title, top_image_url = excluded.top_image_url,"
+                " fetched_at = excluded.fetched_at, opened_at = excluded.opened_at",
+                (key, url, title, content, top_image_url or "", now, now),
+            )
+            if url:
+                conn.execute(
+                    "INSERT OR REPLACE INTO urls (url, article_id, fetched_at) VALUES (?, ?, ?)",
+                    (url, key, now),
+                )
+            self._writes += 1
+            if self._writes % PRUNE_EVERY == 0:
+                self._prune(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return key
+
+    def get(self, key: str):
+        """The article stored under key with its summary, None for unknown IDs."""
+        row = self._connections.get().execute(
+            "SELECT id, url, title, content, top_image_url, summary, summary_key, fetched_at"
+            " FROM articles WHERE id = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        self._touch(key)
+        return _article(row)
+
+    def get_by_url(self, url: str):
+        """The article last fetched from the canonical url, None when unknown or older than max_age."""
+        row = self._connections.get().execute(
+            "SELECT a.id, a.url, a.title, a.content, a.top_image_url, a.summary, a.summary_key, u.fetched_at"
+            " FROM urls u JOIN articles a ON a.id = u.article_id WHERE u.url = ? AND u.fetched_at > ?",
+            (url, time.time() - self.max_age),
+        ).fetchone()
+        with self._lock:
+            if row is None:
+                self.url_misses += 1
+                return None
+            self.url_hits += 1
+        self._touch(row[0])
+        return _article(row)
+
+    def set_summary(self, key: str, summary: str, summary_key: str) -> None:
+        """Attach the summary made under summary_key to the stored article, if there is one."""
+        self._connections.get().execute(
+            "UPDATE articles SET summary = ?, summary_key = ? WHERE id = ?", (summary, summary_key, key)
+        )
+
+    def summary(self, key: str, summary_key: str):
+        """The stored summary of the article, None unless it was made under summary_key."""
+        row = self._connections.get().execute(
+            "SELECT summary FROM articles WHERE id = ? AND summary_key = ?", (key, summary_key)
+        ).fetchone()
+        return row[0] if row else None
+
+    def recent(self, limit: int = LIBRARY_PAGE_SIZE, offset: int = 0) -> dict:
+        """Articles by when they were last opened, newest first."""
+        conn = self._connections.get()
+        rows = conn.execute(
+            f"SELECT {_LISTED} FROM articles a ORDER BY a.opened_at DESC LIMIT ? OFFSET ?",
+            (_page_size(limit), max(0, offset)),
+        ).fetchall()
+        total = conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+        return {"articles": [_listed(row) for row in rows], "total": total}
+
+    def search(self, query: str, limit: int = LIBRARY_PAGE_SIZE, offset: int = 0) -> list:
+        """
+        Articles matching every word of query, the last one as a prefix so
+        results come up while typing, best match first with a snippet
+        around the matches (marked with **).
+        """
+        words = _WORD.findall(query or "")
+        if not words:
+            return []
+        with self._lock:
+            self.searches += 1
+        if not self.fts:
+            return self._search_like(words, limit, offset)
+        # Quoted so words are never read as FTS5 operators
+        match = " ".join(f'"{word}"' for word in words) + "*"
+        rows = self._connections.get().execute(
+            f"SELECT {_LISTED}, snippet(articles_fts, -1, '**', '**', '…', ?),"
+            f" bm25(articles_fts, ?, 1.0) AS score"
+            " FROM articles_fts JOIN articles a ON a.rowid = articles_fts.rowid"
+            " WHERE articles_fts MATCH ? ORDER BY score LIMIT ? OFFSET ?",
+            (SNIPPET_TOKENS, TITLE_WEIGHT, match, _page_size(limit), max(0, offset)),
+        ).fetchall()
+        return [{**_listed(row), "snippet": row[7], "score": -row[8]} for row in rows]
+
+    def _search_like(self, words, limit: int, offset: int) -> list:
+        conditions = " AND ".join("(a.title LIKE ? OR a.content LIKE ?)" for _ in words)
+        params = [pattern for word in words for pattern in (f"%{word}%",) * 2]
+        rows = self._connections.get().execute(
+            f"SELECT {_LISTED} FROM articles a WHERE {conditions} ORDER BY a.opened_at DESC LIMIT ? OFFSET ?",
+            (*params, _page_size(limit), max(0, offset)),
+        ).fetchall()
+        return [{**_listed(row), "snippet": None, "score": None} for row in rows]
+
+    def stats(self) -> dict:
+        conn = self._connections.get()
+        articles, summarized = conn.execute("SELECT COUNT(*), COUNT(summary) FROM articles").fetchone()
+        with self._lock:
+            return {
+                "articles": articles,
+                "summarized": summarized,
+                "url_hits": self.url_hits,
+                "url_misses": self.url_misses,
+                "searches": self.searches,
+                "full_text": self.fts,
+            }
+
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        """Drop the least recently opened articles over the limit, then URLs left pointing nowhere."""
+        if self.max_articles:
+            conn.execute(
+                "DELETE FROM articles WHERE rowid IN"
+                " (SELECT rowid FROM articles ORDER BY opened_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_articles,),
+            )
+        conn.execute(
+            "DELETE FROM urls WHERE fetched_at <= ? OR article_id NOT IN (SELECT id FROM articles)",
+            (time.time() - self.max_age,),
+        )
+
+    def _touch(self, key: str) -> None:
+        try:
+            self._connections.get().execute("UPDATE articles SET opened_at = ? WHERE id = ?", (time.time(), key))
+        except sqlite3.OperationalError as e:
+            # Only the listing order depends on it, a busy database isn't worth failing the read
+            logger.debug(f"Failed to update when {key} was opened: {e}")
+
+
+def _article(row) -> dict:
+    key, url, title, content, top_image_url, summary, summary_key, fetched_at = row
+    return {
+        "id": key,
+        "url": url,
+        "title": title,
+        "content": content,
+        "top_image_url": top_image_url,
+        "summary": summary,
+        "summary_key": summary_key,
+        "fetched_at": fetched_at,
+    }
+
+
+def _listed(row) -> dict:
+    key, url, title, top_image_url, fetched_at, opened_at, summarized = row[:7]
+    return {
+        "id": key,
+        "url": url,
+        "title": title,
+        "top_image_url": top_image_url,
+        "fetched_at": fetched_at,
+        "opened_at": opened_at,
+        "summarized": bool(summarized),
+    }
+
+
+def _page_size(limit) -> int:
+    return max(1, min(int(limit), LIBRARY_MAX_PAGE_SIZE))
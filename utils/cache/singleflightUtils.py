@@ -0,0 +1,163 @@
+''' Utils function related to coalescing duplicate work '''
+import hashlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Empty disables coalescing across processes
+SINGLEFLIGHT_LOCK_DIR = os.getenv("SINGLEFLIGHT_LOCK_DIR", os.path.join(".cache", "locks"))
+SINGLEFLIGHT_LOCK_TIMEOUT = float(os.getenv("SINGLEFLIGHT_LOCK_TIMEOUT", "60"))
+LOCK_STRIPES = 1024
+LOCK_POLL_INTERVAL = 0.05
+_LED = object()  # Result of a lead(), whose leader stores what it computed itself
+
+
+class SingleFlight:
+    """
+    Runs at most one computation per key at a time.
+    Threads calling do() with a key that is already in flight wait for it and
+    share its result or exception. With a lock_dir, the computation also holds
+    a file lock for the key, so a caller in another process waits for it and
+    then finds the result in the shared cache; fn is expected to read through
+    that cache for this to save work. lead() does the same for callers that
+    stream the result into the cache instead of returning it.
+    """
+
+    def __init__(self, lock_dir: str = None, lock_timeout: float = 60.0):
+        self.lock_dir = lock_dir if fcntl is not None else None
+        self.lock_timeout = lock_timeout
+        self._flights = {}  # key -> Future
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.executed = 0
+        self.coalesced = 0
+        self.lock_waits = 0
+
+    def do(self, key: str, fn):
+        """Return fn(), or the outcome of the call already running for key."""
+        future, is_leader = self._join(key)
+        if not is_leader:
+            result = future.result()
+            # A lead() has no result to share, fn finds what its leader stored
+            return self.do(key, fn) if result is _LED else result
+
+        try:
+            with self._process_lock(key):
+                with self._lock:
+                    self.executed += 1
+                result = fn()
+        except BaseException as e:
+            self._finish(key)
+            future.set_exception(e)
+            raise
+        self._finish(key)
+        future.set_result(result)
+        return result
+
+    @contextmanager
+    def lead(self, key: str):
+        """
+        Hold key while the caller computes and stores the result itself, for
+        results that are streamed instead of returned. Yields True to the
+        leader. Callers finding key in flight wait for it to finish, whatever
+        its outcome, and get False: they read the stored result, and lead
+        themselves when there is none.
+        """
+        future, is_leader = self._join(key)
+        if not is_leader:
+            try:
+                future.result()
+            except BaseException:
+                pass
+            yield False
+            return
+
+        try:
+            with self._process_lock(key):
+                with self._lock:
+                    self.executed += 1
+                yield True
+        except BaseException as e:
+            self._finish(key)
+            future.set_exception(e)
+            raise
+        self._finish(key)
+        future.set_result(_LED)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": len(self._flights),
+                "calls": self.calls,
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "lock_waits": self.lock_waits,
+                "cross_process": self.lock_dir is not None,
+            }
+
+    def _join(self, key: str):
+        """The future of the flight for key and whether the caller leads it."""
+        with self._lock:
+            self.calls += 1
+            future = self._flights.get(key)
+            if future is None:
+                future = Future()
+                self._flights[key] = future
+                return future, True
+            self.coalesced += 1
+            return future, False
+
+    def _finish(self, key: str) -> None:
+        with self._lock:
+            self._flights.pop(key, None)
+
+    @contextmanager
+    def _process_lock(self, key: str):
+        if not self.lock_dir:
+            yield
+            return
+
+        # Keys share a fixed set of lock files so the directory doesn't grow
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+        stripe = int.from_bytes(digest, "big") % LOCK_STRIPES
+        os.makedirs(self.lock_dir, exist_ok=True)
+        with open(os.path.join(self.lock_dir, f"{stripe:04d}.lock"), "a") as f:
+            locked = self._acquire(f)
+            try:
+                yield
+            finally:
+                if locked:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _acquire(self, f) -> bool:
+        deadline = time.monotonic() + self.lock_timeout
+        waited = False
+        try:
+            while True:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return True
+                except BlockingIOError:
+                    waited = True
+                    if time.monotonic() >= deadline:
+                        # Better duplicate work than a request stuck behind a dead lock holder
+                        logger.warning(f"Gave up waiting {self.lock_timeout}s for a single-flight lock")
+                        return False
+                    time.sleep(LOCK_POLL_INTERVAL)
+        finally:
+            if waited:
+                with self._lock:
+                    self.lock_waits += 1
+
+
+flights = SingleFlight(SINGLEFLIGHT_LOCK_DIR or None, SINGLEFLIGHT_LOCK_TIMEOUT)
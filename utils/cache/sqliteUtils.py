@@ -0,0 +1,30 @@
+''' Utils function related to SQLite databases shared by worker processes '''
+import os
+import sqlite3
+import threading
+
+BUSY_TIMEOUT = 30  # Seconds a write waits for another process's transaction
+
+
+class ThreadConnections:
+    """
+    One connection per thread to the SQLite database at path, as sqlite3
+    connections can't be shared between threads. Connections run in
+    autocommit mode with WAL journaling, so readers don't block the writer.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
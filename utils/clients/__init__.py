@@ -0,0 +1,7 @@
+"""
+Clients package for pooled, reused connections to upstream APIs.
+"""
+
+from . import clientUtils, resilienceUtils
+
+__all__ = ['clientUtils', 'resilienceUtils']
@@ -0,0 +1,153 @@
+''' Utils function related to upstream API clients '''
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict, defaultdict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))  # Hosts kept in the pool
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))  # Connections kept per host
+CLIENT_CACHE_SIZE = int(os.getenv("CLIENT_CACHE_SIZE", "32"))  # Per API key clients kept
+LLAMA_API_URL = os.getenv("LLAMA_API_URL", "https://api.llama-api.com")
+
+FIRECRAWL = "firecrawl"
+OPENAI = "openai"
+LLAMA = "llama"
+
+
+class _NeverRaised(Exception):
+    pass
+
+
+def openai_error():
+    """
+    The OpenAIError class for except clauses, without importing openai.
+    Until openai is imported nothing can raise it, so a placeholder is returned.
+    """
+    openai = sys.modules.get("openai")
+    return openai.OpenAIError if openai is not None else _NeverRaised
+
+
+class ClientRegistry:
+    """
+    Hands out long-lived upstream clients so connections are kept alive
+    between requests. Clients bound to an API key are kept in an LRU of
+    max_clients entries per upstream.
+    """
+
+    def __init__(self, max_clients: int, pool_connections: int, pool_maxsize: int):
+        self.max_clients = max_clients
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self._clients = defaultdict(OrderedDict)  # upstream -> {key digest: client}
+        self._lock = threading.RLock()  # Factories may ask for the shared session
+        self._session = None
+        self.created = defaultdict(int)
+        self.reused = defaultdict(int)
+        self.evicted = defaultdict(int)
+
+    def http_session(self) -> requests.Session:
+        """Shared keep-alive session for plain HTTP fetches (images, streams)."""
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=self.pool_connections,
+                    pool_maxsize=self.pool_maxsize,
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session = session
+            return self._session
+
+    # SDKs are imported on first use to keep startup fast
+
+    def openai(self, api_key: str):
+        def create():
+            import httpx
+            from openai import OpenAI, DefaultHttpxClient
+            from utils.ratelimit import quotaUtils
+            return OpenAI(
+                api_key=api_key,
+                max_retries=0,  # Retried by resilienceUtils, within the request's deadline
+                http_client=DefaultHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=self.pool_maxsize,
+                        max_keepalive_connections=self.pool_maxsize,
+                    ),
+                    # Rate limit headers of every call update the shared quota
+                    event_hooks={"response": [quotaUtils.quotas.response_hook(quotaUtils.openai_upstream(api_key))]},
+                ),
+            )
+        return self._get(OPENAI, api_key, create)
+
+    def llama(self, api_key: str):
+        def create():
+            from utils.clients.llamaUtils import PooledLlamaAPI
+            return PooledLlamaAPI(api_key, self.http_session(), hostname=LLAMA_API_URL)
+        return self._get(LLAMA, api_key, create)
+
+    def firecrawl(self, api_key: str):
+        def create():
+            from firecrawl import FirecrawlApp
+            # The Firecrawl SDK issues its own requests, only the instance is reused
+            return FirecrawlApp(api_key=api_key)
+        return self._get(FIRECRAWL, api_key, create)
+
+    def stats(self) -> dict:
+        with self._lock:
+            clients = {
+                upstream: {
+                    "cached": len(self._clients[upstream]),
+                    "created": self.created[upstream],
+                    "reused": self.reused[upstream],
+                    "evicted": self.evicted[upstream],
+                }
+                for upstream in (FIRECRAWL, OPENAI, LLAMA)
+            }
+            session = self._session
+        clients["http"] = _session_stats(session)
+        return clients
+
+    def _get(self, upstream: str, api_key: str, factory):
+        key = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+        with self._lock:
+            clients = self._clients[upstream]
+            client = clients.get(key)
+            if client is not None:
+                clients.move_to_end(key)
+                self.reused[upstream] += 1
+                return client
+            client = factory()
+            clients[key] = client
+            self.created[upstream] += 1
+            while len(clients) > self.max_clients:
+                # Not closed explicitly, a request may still be using it
+                clients.popitem(last=False)
+                self.evicted[upstream] += 1
+            return client
+
+
+def _session_stats(session) -> dict:
+    """Connections opened versus requests sent over the shared session."""
+    connections = sent = 0
+    if session is not None:
+        for adapter in set(session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                connections += pool.num_connections
+                sent += pool.num_requests
+    return {
+        "connections_opened": connections,
+        "requests_sent": sent,
+        "reuse_ratio": 1 - connections / sent if sent else 0.0,
+    }
+
+
+registry = ClientRegistry(CLIENT_CACHE_SIZE, HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE)
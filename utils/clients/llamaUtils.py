@@ -0,0 +1,31 @@
+''' Utils function related to the Llama API client '''
+import requests
+from llamaapi import LlamaAPI
+
+
+class PooledLlamaAPI(LlamaAPI):
+    """LlamaAPI whose synchronous calls go through a shared session."""
+
+    def __init__(self, api_token, session: requests.Session, **kwargs):
+        super().__init__(api_token, **kwargs)
+        self.session = session
+
+    def run_sync(self, api_request_json):
+        response = self.session.post(
+            f"{self.hostname}{self.domain_path}",
+            headers=self.headers,
+            json=api_request_json,
+            timeout=api_request_json.get("timeout"),
+        )
+        if response.status_code != 200:
+            # HTTPError carries the status, so 429s and 5xxs can be retried
+            raise requests.HTTPError(f"POST {response.status_code} {_error_detail(response)}", response=response)
+        return response
+
+
+def _error_detail(response: requests.Response) -> str:
+    # Proxies and gateways answer with HTML or plain text rather than the API's JSON
+    try:
+        return str(response.json()["detail"])
+    except (ValueError, KeyError, TypeError):
+        return response.text[:200]
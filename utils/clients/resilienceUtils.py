@@ -0,0 +1,242 @@
+''' Utils function related to upstream retries, deadlines and circuit breakers '''
+import contextvars
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+from urllib.parse import urlparse
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", "3"))  # Including the first call
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.25"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "2"))
+# Share of the time left of the deadline that one call may spend sleeping between retries
+RETRY_MAX_DEADLINE_FRACTION = float(os.getenv("RETRY_MAX_DEADLINE_FRACTION", "0.2"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+MAX_BREAKERS = 256  # Image hosts get a breaker each, the least recently used are dropped
+MIN_ATTEMPT_SECONDS = 0.5  # Budget below which another attempt isn't started
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Monotonic time by which the current request must be answered
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+_TRANSIENT_OPENAI_ERRORS = ("APIConnectionError", "RateLimitError", "InternalServerError")
+
+
+class DeadlineExceededError(Exception):
+    """Raised when the request's time budget runs out before an upstream call."""
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"{upstream} is unavailable, retry in {retry_after:.0f}s")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+@contextmanager
+def deadline(seconds: float):
+    """Give the calls in the block at most seconds, or what's left of an enclosing deadline."""
+    end = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(end if current is None else min(current, end))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def with_deadline(seconds: float):
+    """Decorator running each call of the function under deadline(seconds)."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with deadline(seconds):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def remaining():
+    """Seconds left of the current deadline, None without one."""
+    end = _deadline.get()
+    return None if end is None else end - time.monotonic()
+
+
+def timeout(default: float) -> float:
+    """Timeout for one upstream call: default, shortened to the time left of the deadline."""
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceededError("The request ran out of time")
+    return min(default, left)
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive transient failures and fails
+    calls fast for reset_timeout seconds, then lets a single probe call
+    through (half open): it closes the breaker on success and reopens it
+    on failure.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> None:
+        """Raise CircuitOpenError unless a call may go through now."""
+        with self._lock:
+            if self.state == OPEN:
+                wait = self._opened_at + self.reset_timeout - time.monotonic()
+                if wait > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, wait)
+                self.state, self._probing = HALF_OPEN, False
+            if self.state == HALF_OPEN:
+                if self._probing:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, self.reset_timeout)
+                self._probing = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f"Circuit for {self.name} closed")
+            self.state, self.failures, self._probing = CLOSED, 0, False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                logger.warning(f"Circuit for {self.name} opened after {self.failures} failures")
+                self.state, self._opened_at = OPEN, time.monotonic()
+                self.opened += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "opened": self.opened, "rejected": self.rejected}
+
+
+class BreakerRegistry:
+    """One CircuitBreaker per upstream name, created on first use."""
+
+    def __init__(self, max_breakers: int = MAX_BREAKERS):
+        self.max_breakers = max_breakers
+        self._breakers = OrderedDict()
+        self._lock = threading.Lock()
+        self.retries = 0
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = self._breakers[name] = CircuitBreaker(name)
+                while len(self._breakers) > self.max_breakers:
+                    self._breakers.popitem(last=False)
+            else:
+                self._breakers.move_to_end(name)
+            return breaker
+
+    def record_retry(self) -> None:
+        with self._lock:
+            self.retries += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            breakers = list(self._breakers.values())
+            retries = self.retries
+        return {
+            "retries": retries,
+            "breakers": {breaker.name: breaker.stats() for breaker in breakers},
+        }
+
+
+breakers = BreakerRegistry()
+
+
+def host_upstream(kind: str, url: str) -> str:
+    """Breaker name for one host of a kind of upstream, e.g. image:example.com."""
+    return f"{kind}:{urlparse(url).netloc.lower()}"
+
+
+def is_transient(error: Exception) -> bool:
+    """Whether error says the upstream is struggling, rather than the request being wrong."""
+    if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError):
+        status = getattr(error.response, "status_code", None)
+        return status is None or status == 429 or status >= 500
+    openai = sys.modules.get("openai")
+    if openai is not None and isinstance(error, openai.OpenAIError):
+        return any(isinstance(error, getattr(openai, name)) for name in _TRANSIENT_OPENAI_ERRORS)
+    return False
+
+
+def call(upstream: str, fn, *args, attempts: int = RETRY_ATTEMPTS, **kwargs):
+    """
+    fn(*args, **kwargs) through the breaker of upstream, retried on
+    transient errors with full jitter backoff. Other errors are raised
+    at once, and so is a transient error once the breaker isn't closed,
+    as the upstream is known to be failing.
+    The backoff sleeps on the calling thread. Under a deadline they add
+    up to at most RETRY_MAX_DEADLINE_FRACTION of the time it had left,
+    and retries only start while it leaves time for them. Without one,
+    e.g. in background jobs, they are bounded by RETRY_MAX_DELAY each.
+    """
+    breaker = breakers.get(upstream)
+    left = remaining()
+    sleep_budget = None if left is None else max(0.0, left) * RETRY_MAX_DEADLINE_FRACTION
+    for attempt in range(attempts):
+        left = remaining()
+        if left is not None and left < MIN_ATTEMPT_SECONDS:
+            raise DeadlineExceededError(f"No time left to call {upstream}")
+        breaker.allow()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if not is_transient(e):
+                # The upstream answered, the request itself was refused
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            if attempt == attempts - 1 or breaker.state != CLOSED:
+                raise
+            delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+            left = remaining()
+            if left is not None:
+                if sleep_budget <= 0 or left - delay < MIN_ATTEMPT_SECONDS:
+                    raise
+                delay = min(delay, sleep_budget)
+                sleep_budget -= delay
+            logger.info(f"Retrying {upstream} in {delay:.2f}s after {type(e).__name__}: {e}")
+            breakers.record_retry()
+            time.sleep(delay)
+        else:
+            breaker.record_success()
+            return result
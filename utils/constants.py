@@ -13,3 +13,5 @@ class Model(Enum):
 class IndexModel(Enum):
     VECTOR_STORE = "vector_store"
     SUMMARY_INDEX = "summary_index"
+    LEXICAL = "lexical"
+    HYBRID = "hybrid"
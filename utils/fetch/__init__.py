@@ -2,6 +2,10 @@
 Fetch package for handling URL content extraction and image processing.
 """
 
+from . import batchUtils
+from . import extractUtils
+from . import feedUtils
 from . import imageUtils
+from . import urlUtils
 
-__all__ = ['imageUtils']
+__all__ = ['batchUtils', 'extractUtils', 'feedUtils', 'imageUtils', 'urlUtils']
@@ -0,0 +1,41 @@
+''' Utils function related to fetching several URLs at once '''
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlparse
+
+
+def fetch_many(urls: [], fetch_fn, max_workers: int = 8, per_host: int = 2):
+    """
+    Run fetch_fn over urls concurrently and yield (url, result, error) as
+    each one completes.
+    At most max_workers fetches run at once and at most per_host of them
+    target the same host, so a reading list from one site is not hammered.
+    """
+    pending = deque(dict.fromkeys(urls))  # Drop duplicates, keep order
+    in_flight = {}
+    per_host_count = defaultdict(int)
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="batch-fetch") as executor:
+        while pending or in_flight:
+            # Start every queued URL whose host still has capacity
+            deferred = deque()
+            while pending and len(in_flight) < max_workers:
+                url = pending.popleft()
+                host = _host(url)
+                if per_host_count[host] >= per_host:
+                    deferred.append(url)
+                    continue
+                per_host_count[host] += 1
+                in_flight[executor.submit(fetch_fn, url)] = url
+            pending.extendleft(reversed(deferred))
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                url = in_flight.pop(future)
+                per_host_count[_host(url)] -= 1
+                error = future.exception()
+                yield url, None if error else future.result(), error
+
+
+def _host(url: str) -> str:
+    return urlparse(url).netloc.lower()
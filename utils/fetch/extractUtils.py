@@ -0,0 +1,211 @@
+''' Utils function related to article extraction '''
+import logging
+import os
+import re
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup, NavigableString, Tag
+from bs4.element import PreformattedString
+
+from utils.clients import clientUtils, resilienceUtils
+from utils.fetch import urlUtils
+from utils.metrics import metricsUtils
+
+logger = logging.getLogger(__name__)
+
+# Extractors tried in order, the first good result wins
+EXTRACTORS = [name.strip() for name in os.getenv("EXTRACTORS", "local,firecrawl").split(",") if name.strip()]
+LOCAL_MIN_QUALITY = float(os.getenv("LOCAL_EXTRACT_MIN_QUALITY", "0.5"))
+HTML_MAX_BYTES = 5 * 1024 * 1024
+HTML_TIMEOUT = 10
+USER_AGENT = "Mozilla/5.0 (compatible; Reader/1.0)"
+
+_SKIPPED_TAGS = {
+    "script", "style", "noscript", "nav", "footer", "header", "aside",
+    "form", "iframe", "svg", "button", "select", "template",
+}
+_BLOCK_SEPARATOR = "\n\n"
+
+
+def extract(url: str) -> dict:
+    """
+    Run the extractor chain over url.
+    Returns a dict with `title`, `markdown`, `top_image` and `extractor`.
+    Local results below LOCAL_MIN_QUALITY fall through to the next extractor,
+    the last extractor's result is returned as is.
+    """
+    errors = []
+    for position, name in enumerate(EXTRACTORS):
+        is_last = position == len(EXTRACTORS) - 1
+        try:
+            result = _EXTRACTOR_FUNCTIONS[name](url)
+        except Exception as e:
+            if is_last:
+                raise
+            logger.warning(f"Extractor {name} failed for {url}: {e}")
+            errors.append(f"{name}: {e}")
+            continue
+        quality = result.get("quality")
+        if is_last or quality is None or quality >= LOCAL_MIN_QUALITY:
+            result["extractor"] = name
+            return result
+        logger.info(f"Extractor {name} result for {url} looks poor (quality={quality:.2f}), falling back")
+    raise ValueError(f"No extractor could handle {url}: {'; '.join(errors)}")
+
+
+def extract_local(url: str) -> dict:
+    """Download the page and extract the article from its HTML."""
+    with metricsUtils.upstream("article_page"):
+        body, final_url = resilienceUtils.call(resilienceUtils.host_upstream("page", url), _download_html, url)
+    with metricsUtils.timer("extract"):
+        return extract_from_html(body, final_url or url)
+
+
+def _download_html(url: str):
+    return urlUtils.download_public(url, ("html",), HTML_MAX_BYTES, HTML_TIMEOUT, {"User-Agent": USER_AGENT})
+
+
+def extract_firecrawl(url: str) -> dict:
+    """Scrape the page with the Firecrawl API."""
+    firecrawl_api_key = os.getenv("FIRECRAWL_API_KEY")
+    if not firecrawl_api_key:
+        raise ValueError("Firecrawl API Key is not set. Please set it in the .env file.")
+
+    # Reuse the FirecrawlApp for this API key
+    firecrawl_app = clientUtils.registry.firecrawl(firecrawl_api_key)
+    logger.info(f"Scraping URL with firecrawl: {url}")
+    with metricsUtils.upstream("firecrawl"):
+        scrape_result = resilienceUtils.call(
+            "firecrawl", firecrawl_app.scrape_url, url, params={'formats': ['markdown']}
+        )
+    logger.info(f"Firecrawl result keys: {scrape_result.keys()}")
+
+    metadata = scrape_result.get('metadata') or {}
+    return {
+        "title": scrape_result.get('title', '') or metadata.get('title', ''),
+        "markdown": scrape_result.get('markdown', ''),
+        "top_image": metadata.get('ogImage', '') or '',
+    }
+
+
+def extract_from_html(html, base_url: str) -> dict:
+    """Pick the main content of an HTML page and convert it to markdown."""
+    soup = BeautifulSoup(html, "lxml")
+    title = _meta_content(soup, "og:title") or (soup.title.get_text(strip=True) if soup.title else "")
+    top_image = _meta_content(soup, "og:image") or _meta_content(soup, "twitter:image")
+
+    for tag in soup.find_all(_SKIPPED_TAGS):
+        tag.decompose()
+
+    node = _main_content_node(soup)
+    markdown = _to_markdown(node, base_url).strip() if node is not None else ""
+    markdown = re.sub(r"\n{3,}", _BLOCK_SEPARATOR, markdown)
+    if not title:
+        heading = soup.find("h1")
+        title = heading.get_text(" ", strip=True) if heading else ""
+    if title and markdown and not markdown.startswith("#"):
+        markdown = f"# {title}{_BLOCK_SEPARATOR}{markdown}"
+
+    return {
+        "title": title,
+        "markdown": markdown,
+        "top_image": urljoin(base_url, top_image) if top_image else "",
+        "quality": score_quality(node),
+    }
+
+
+def score_quality(node) -> float:
+    """
+    Rough 0-1 score of how article-like the extracted node is, based on the
+    amount of paragraph text and how much of the text is links.
+    """
+    if node is None:
+        return 0.0
+    paragraphs = [p.get_text(" ", strip=True) for p in node.find_all("p")]
+    paragraphs = [p for p in paragraphs if len(p.split()) >= 8]
+    words = sum(len(p.split()) for p in paragraphs)
+    text_length = len(node.get_text(" ", strip=True)) or 1
+    link_length = sum(len(a.get_text(" ", strip=True)) for a in node.find_all("a"))
+    link_density = min(1.0, link_length / text_length)
+    volume = min(1.0, words / 300) * min(1.0, len(paragraphs) / 3)
+    return volume * (1 - link_density)
+
+
+def _meta_content(soup: BeautifulSoup, name: str) -> str:
+    tag = soup.find("meta", attrs={"property": name}) or soup.find("meta", attrs={"name": name})
+    return (tag.get("content") or "").strip() if tag else ""
+
+
+def _main_content_node(soup: BeautifulSoup):
+    """The <article> or <main> element, otherwise the container with the most paragraph text."""
+    for name in ("article", "main"):
+        candidates = soup.find_all(name)
+        if candidates:
+            return max(candidates, key=lambda n: len(n.get_text(" ", strip=True)))
+
+    scores = {}
+    for paragraph in soup.find_all("p"):
+        length = len(paragraph.get_text(" ", strip=True))
+        parent = paragraph.parent
+        if parent is None:
+            continue
+        scores[parent] = scores.get(parent, 0) + length
+        if parent.parent is not None:
+            scores[parent.parent] = scores.get(parent.parent, 0) + length / 2
+    if not scores:
+        return soup.body
+    return max(scores, key=scores.get)
+
+
+def _to_markdown(node, base_url: str) -> str:
+    if isinstance(node, PreformattedString):  # Comments, doctypes, CDATA
+        return ""
+    if isinstance(node, NavigableString):
+        return re.sub(r"\s+", " ", str(node))
+    if not isinstance(node, Tag):
+        return ""
+
+    name = node.name
+    if name == "pre":
+        return f"{_BLOCK_SEPARATOR}```\n{node.get_text()}\n```{_BLOCK_SEPARATOR}"
+
+    inner = "".join(_to_markdown(child, base_url) for child in node.children)
+    if name in ("h1", "h2", "h3", "h4", "h5", "h6"):
+        text = inner.strip()
+        return f"{_BLOCK_SEPARATOR}{'#' * int(name[1])} {text}{_BLOCK_SEPARATOR}" if text else ""
+    if name == "p":
+        text = inner.strip()
+        return f"{_BLOCK_SEPARATOR}{text}{_BLOCK_SEPARATOR}" if text else ""
+    if name == "br":
+        return "\n"
+    if name == "li":
+        return f"\n- {inner.strip()}"
+    if name in ("ul", "ol"):
+        return f"{_BLOCK_SEPARATOR}{inner.strip()}{_BLOCK_SEPARATOR}"
+    if name == "blockquote":
+        lines = inner.strip().splitlines()
+        return _BLOCK_SEPARATOR + "\n".join(f"> {line}" for line in lines) + _BLOCK_SEPARATOR
+    if name in ("strong", "b"):
+        return f"**{inner.strip()}**" if inner.strip() else ""
+    if name in ("em", "i"):
+        return f"*{inner.strip()}*" if inner.strip() else ""
+    if name == "code":
+        return f"`{inner.strip()}`"
+    if name == "a":
+        href = node.get("href")
+        text = inner.strip()
+        if href and text and not href.startswith(("javascript:", "#")):
+            return f"[{text}]({urljoin(base_url, href)})"
+        return text
+    if name == "img":
+        src = node.get("src")
+        return f"![{node.get('alt', '').strip()}]({urljoin(base_url, src)})" if src else ""
+    if name in ("div", "section", "article", "main", "figure", "figcaption", "table", "tr"):
+        return f"\n{inner}\n"
+    return inner
+
+
+_EXTRACTOR_FUNCTIONS = {
+    "local": extract_local,
+    "firecrawl": extract_firecrawl,
+}
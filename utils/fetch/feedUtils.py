@@ -0,0 +1,256 @@
+''' Utils function related to the aggregated news feed '''
+import logging
+import os
+import re
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from utils.cache.singleflightUtils import flights
+from utils.clients import clientUtils, resilienceUtils
+from utils.fetch.extractUtils import USER_AGENT
+from utils.metrics import metricsUtils
+
+logger = logging.getLogger(__name__)
+
+FEED_TTL = int(os.getenv("FEED_TTL", "300"))  # Seconds a feed is served without refreshing it
+FEED_STALE_TTL = int(os.getenv("FEED_STALE_TTL", "3600"))  # Then served stale while it is refreshed
+FEED_ITEMS = int(os.getenv("FEED_ITEMS", "12"))  # Items fetched per source
+FEED_TIMEOUT = 10
+HN_WORKERS = 8  # Concurrent Hacker News item lookups
+
+HN_API_URL = os.getenv("HN_API_URL", "https://hacker-news.firebaseio.com/v0")
+GDELT_API_URL = os.getenv("GDELT_API_URL", "https://api.gdeltproject.org/api/v2/doc/doc")
+GDELT_QUERY = os.getenv("GDELT_QUERY", "technology")
+ARXIV_API_URL = os.getenv("ARXIV_API_URL", "https://export.arxiv.org/api/query")
+ARXIV_QUERY = os.getenv("ARXIV_QUERY", "all")
+
+_ATOM = "{http://www.w3.org/2005/Atom}"
+_WHITESPACE = re.compile(r"\s+")
+
+
+def feed_item(item_id, title, url, by=None, score=None, published=None, comments_url=None) -> dict:
+    """One entry of any source, published in seconds since the epoch."""
+    return {
+        "id": str(item_id),
+        "title": _WHITESPACE.sub(" ", title).strip(),
+        "url": url,
+        "by": by,
+        "score": score,
+        "published": published,
+        "comments_url": comments_url,
+    }
+
+
+def _get(upstream: str, url: str, params: dict = None):
+    def get():
+        response = clientUtils.registry.http_session().get(
+            url, params=params, headers={"User-Agent": USER_AGENT}, timeout=resilienceUtils.timeout(FEED_TIMEOUT)
+        )
+        response.raise_for_status()
+        return response
+    with metricsUtils.upstream(upstream):
+        return resilienceUtils.call(upstream, get)
+
+
+def fetch_hackernews(limit: int) -> list:
+    ids = _get("hackernews", f"{HN_API_URL}/topstories.json").json()[:limit]
+
+    def lookup(story_id):
+        try:
+            return _get("hackernews", f"{HN_API_URL}/item/{story_id}.json").json()
+        except Exception as e:
+            logger.warning(f"Skipping Hacker News item {story_id}: {e}")
+            return None
+
+    # The API has no batch lookup, the items share the keep-alive pool instead
+    with ThreadPoolExecutor(max_workers=max(1, min(HN_WORKERS, len(ids))), thread_name_prefix="feed-hn") as executor:
+        stories = list(executor.map(lookup, ids))
+    items = []
+    for story in stories:
+        if not story or story.get("deleted") or story.get("dead") or not story.get("title"):
+            continue
+        comments_url = f"https://news.ycombinator.com/item?id={story['id']}"
+        items.append(feed_item(
+            story["id"], story["title"], story.get("url") or comments_url,
+            by=story.get("by"), score=story.get("score"), published=story.get("time"), comments_url=comments_url,
+        ))
+    if ids and not items:
+        raise ValueError("No Hacker News item could be loaded")
+    return items
+
+
+def fetch_gdelt(limit: int) -> list:
+    response = _get("gdelt", GDELT_API_URL, {
+        "query": GDELT_QUERY, "mode": "artlist", "maxrecords": limit, "format": "json",
+    })
+    try:
+        articles = response.json().get("articles") or []
+    except ValueError:
+        # GDELT answers throttled requests with a plain text notice
+        raise ValueError(f"Unexpected GDELT response: {response.text[:200]}")
+    return [
+        feed_item(
+            article["url"], article["title"], article["url"],
+            by=article.get("domain"), published=_parse_time(article.get("seendate"), "%Y%m%dT%H%M%SZ"),
+        )
+        for article in articles
+        if article.get("url") and article.get("title")
+    ]
+
+
+def fetch_arxiv(limit: int) -> list:
+    response = _get("arxiv", ARXIV_API_URL, {
+        "search_query": ARXIV_QUERY, "start": 0, "max_results": limit,
+        "sortBy": "lastUpdatedDate", "sortOrder": "descending",
+    })
+    items = []
+    for entry in ET.fromstring(response.content).iter(f"{_ATOM}entry"):
+        link = entry.findtext(f"{_ATOM}id", "").strip()
+        title = entry.findtext(f"{_ATOM}title", "")
+        if not link or not title:
+            continue
+        authors = [name.text.strip() for name in entry.iter(f"{_ATOM}name") if name.text]
+        items.append(feed_item(
+            link, title, link,
+            by=", ".join(authors) or None, published=_parse_time(entry.findtext(f"{_ATOM}published")),
+        ))
+    return items
+
+
+SOURCES = {
+    "hackernews": fetch_hackernews,
+    "gdelt": fetch_gdelt,
+    "arxiv": fetch_arxiv,
+}
+
+
+def _parse_time(value, fmt: str = None):
+    if not value:
+        return None
+    try:
+        if fmt:
+            moment = datetime.strptime(value.strip(), fmt).replace(tzinfo=timezone.utc)
+        else:
+            moment = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return int(moment.timestamp())
+
+
+class NewsFeed:
+    """
+    Latest items of each news source in the shared cache, so every worker
+    and visitor reads one copy. A feed is served as is for ttl seconds,
+    then served stale for up to stale_ttl seconds while one background
+    refresh replaces it. Only sources without any copy make the request
+    wait, and they are fetched concurrently.
+    """
+
+    def __init__(self, cache, sources: dict = None, ttl: int = FEED_TTL, stale_ttl: int = FEED_STALE_TTL,
+                 items: int = FEED_ITEMS):
+        self.cache = cache
+        self.sources = sources or SOURCES
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.items = items
+        self._executor = ThreadPoolExecutor(max_workers=2 * len(self.sources), thread_name_prefix="feed")
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.fresh_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.errors = 0
+
+    def get(self, names: list) -> dict:
+        """
+        {name: {"items", "fetched_at", "stale"}} for the sources, or
+        {"error"} for a source that has no copy and couldn't be fetched.
+        """
+        now = time.time()
+        feeds, missing = {}, {}
+        for name in names:
+            entry = self.cache.get(_cache_key(name))
+            if entry is None:
+                missing[name] = self._executor.submit(self._refresh, name)
+                continue
+            stale = entry["fetched_at"] + self.ttl <= now
+            if stale:
+                self._refresh_in_background(name)
+            with self._lock:
+                if stale:
+                    self.stale_hits += 1
+                else:
+                    self.fresh_hits += 1
+            feeds[name] = {**entry, "stale": stale}
+        for name, future in missing.items():
+            with self._lock:
+                self.misses += 1
+            try:
+                feeds[name] = {**future.result(), "stale": False}
+            except Exception as e:
+                logger.error(f"Failed to fetch the {name} feed: {e}")
+                feeds[name] = {"error": f"Failed to load {name}"}
+        return {name: feeds[name] for name in names}
+
+    def max_age(self, feeds: dict) -> int:
+        """Seconds until the first of feeds is due for a refresh, 0 if one is already."""
+        now = time.time()
+        ages = [feed["fetched_at"] + self.ttl - now for feed in feeds.values() if not feed.get("stale", True)]
+        return max(0, int(min(ages))) if len(ages) == len(feeds) else 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "fresh_hits": self.fresh_hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+                "errors": self.errors,
+                "refreshing": sorted(self._refreshing),
+            }
+
+    def _refresh_in_background(self, name: str) -> None:
+        with self._lock:
+            if name in self._refreshing:
+                return
+            self._refreshing.add(name)
+
+        def refresh():
+            try:
+                self._refresh(name)
+            except Exception as e:
+                # The stale copy keeps being served until a refresh succeeds
+                logger.warning(f"Failed to refresh the {name} feed: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(name)
+        self._executor.submit(refresh)
+
+    def _refresh(self, name: str) -> dict:
+        # One refresh per source at a time, across worker processes too
+        return flights.do(f"feed_refresh_{name}", lambda: self._fetch(name))
+
+    def _fetch(self, name: str) -> dict:
+        # Another process may have refreshed it while we waited
+        entry = self.cache.get(_cache_key(name))
+        if entry is not None and entry["fetched_at"] + self.ttl > time.time():
+            return entry
+        try:
+            items = self.sources[name](self.items)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+        entry = {"items": items, "fetched_at": time.time()}
+        self.cache.set(_cache_key(name), entry, timeout=self.ttl + self.stale_ttl)
+        with self._lock:
+            self.refreshes += 1
+        return entry
+
+
+def _cache_key(name: str) -> str:
+    return f"news_feed_{name}"
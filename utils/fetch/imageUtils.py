@@ -1,14 +1,77 @@
 ''' Utils function related to image fetch '''
-
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
 from io import BytesIO
 
-import requests
 from PIL import Image
 from reportlab.lib.units import inch
 
+from utils.clients import resilienceUtils
+from utils.fetch import urlUtils
+from utils.metrics import metricsUtils
+
 CDN_PREFIXES = ["https://substackcdn.com/image/fetch/"]
 PPI = 96  # 96 px to 1 inch
 LETTER_MAX_DISPLAY_WIDTH = 6
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(10 * 1024 * 1024)))  # Larger images are left out of the PDF
+IMAGE_TIMEOUT = 15
+
+
+@dataclass(frozen=True)
+class DisplayImage:
+    data: bytes
+    width: int
+    height: int
+
+
+class ImageCache:
+    """LRU of display-ready images bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._images = OrderedDict()  # url -> DisplayImage
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, url: str):
+        with self._lock:
+            image = self._images.get(url)
+            if image is None:
+                self.misses += 1
+                return None
+            self._images.move_to_end(url)
+            self.hits += 1
+            return image
+
+    def put(self, url: str, image: DisplayImage) -> None:
+        if len(image.data) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._images.pop(url, None)
+            if previous is not None:
+                self._size -= len(previous.data)
+            self._images[url] = image
+            self._size += len(image.data)
+            while self._size > self.max_bytes:
+                _, evicted = self._images.popitem(last=False)
+                self._size -= len(evicted.data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._images),
+                "bytes": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+image_cache = ImageCache(IMAGE_CACHE_MAX_BYTES)
 
 
 # Check if the image is displayed in the html body
@@ -18,17 +81,50 @@ def is_image_displayed(top_image_url: str, html: str) -> bool:
     return index > -1 or _is_url_start_with_cdn_prefixes(top_image_url, CDN_PREFIXES)
 
 
-def get_image_display_size(url):
-    iw, ih = _get_image_size_from_url(url)
+def display_size(iw, ih):
+    """Width and height in points of an image shown on a letter page."""
     aspect = ih / float(iw)
     display_width = min(iw / PPI, LETTER_MAX_DISPLAY_WIDTH)
     return display_width * inch, display_width * aspect * inch
 
 
-def _get_image_size_from_url(url):
-    data = requests.get(url).content
-    im = Image.open(BytesIO(data))
-    return im.size
+def fetch_display_image(url) -> DisplayImage:
+    """
+    Download an image once and downscale it to the letter display width.
+    Results are kept in the image cache so later calls don't download again.
+    """
+    image = image_cache.get(url)
+    if image is not None:
+        return image
+
+    with metricsUtils.upstream("image"):
+        data = resilienceUtils.call(resilienceUtils.host_upstream("image", url), _download_image, url)
+    with metricsUtils.timer("image_resize"):
+        image = _downscale(data)
+    image_cache.put(url, image)
+    return image
+
+
+def _download_image(url) -> bytes:
+    # The URL comes from the page's metadata, so it gets the same checks as the page itself
+    body, _ = urlUtils.download_public(url, ("image/",), IMAGE_MAX_BYTES, IMAGE_TIMEOUT)
+    return body
+
+
+def _downscale(data: bytes) -> DisplayImage:
+    max_width = LETTER_MAX_DISPLAY_WIDTH * PPI
+    with Image.open(BytesIO(data)) as im:
+        width, height = im.size
+        if width <= max_width:
+            return DisplayImage(data, width, height)
+
+        resized = im.resize((max_width, round(height * max_width / width)), Image.LANCZOS)
+        output = BytesIO()
+        if resized.mode in ("RGBA", "LA", "P"):
+            resized.save(output, format="PNG", optimize=True)
+        else:
+            resized.convert("RGB").save(output, format="JPEG", quality=85)
+        return DisplayImage(output.getvalue(), resized.width, resized.height)
 
 
 def _is_url_start_with_cdn_prefixes(top_image_url: str, prefixes: []) -> bool:
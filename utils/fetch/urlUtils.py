@@ -0,0 +1,142 @@
+''' Utils function related to article URLs '''
+import ipaddress
+import os
+import re
+import socket
+from urllib.parse import parse_qsl, urljoin, urlencode, urlsplit, urlunsplit
+
+from utils.clients import clientUtils, resilienceUtils
+
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "gbraid", "wbraid", "msclkid", "yclid", "igshid",
+    "mc_cid", "mc_eid", "_ga", "_gl", "_hsenc", "_hsmi", "mkt_tok", "spm",
+    "ref_src", "ref_url", "cmpid", "ncid", "sr_share", "smid", "at_medium",
+    "at_campaign", "s_cid", "__twitter_impression",
+}
+TRACKING_PREFIXES = ("utm_", "pk_", "mtm_", "oly_", "vero_")
+AMP_PARAMS = {"amp": {"", "1", "true"}, "outputtype": {"amp"}, "output": {"amp"}}
+DEFAULT_PORTS = {"http": 80, "https": 443}
+ALLOW_PRIVATE_URLS = os.getenv("ALLOW_PRIVATE_URLS", "0") == "1"  # Only for local development and benchmarks
+MAX_REDIRECTS = 5
+
+# Only after another path segment, /amp on its own is a page of its own
+_AMP_PATH_SUFFIX = re.compile(r"(?:(?<=.)/amp/?|\.amp(?:\.html)?)$", re.IGNORECASE)
+# https://example-com.cdn.ampproject.org/c/s/example.com/path and www.google.com/amp/s/example.com/path
+_AMP_CACHE_PATH = re.compile(r"^/(s/)?(.+)$", re.IGNORECASE)
+_AMP_CACHE_CONTENT_TYPE = re.compile(r"^/[civ](?=/)", re.IGNORECASE)
+
+
+class UnsafeURLError(ValueError):
+    """Raised for URLs the server must not fetch itself, such as ones on its own network."""
+
+
+def check_public_url(url: str) -> None:
+    """
+    Raise UnsafeURLError unless url is http(s) and every address its host
+    resolves to is public, so loopback, private, link-local and cloud
+    metadata addresses can't be reached through server-side fetches.
+    """
+    parts = urlsplit(url)
+    if parts.scheme.lower() not in DEFAULT_PORTS or not parts.hostname:
+        raise UnsafeURLError(f"Unsupported URL {url!r}")
+    try:
+        port = parts.port or DEFAULT_PORTS[parts.scheme.lower()]
+        addresses = {info[4][0] for info in socket.getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)}
+    except (socket.gaierror, UnicodeError, ValueError) as e:
+        raise UnsafeURLError(f"Can't resolve {parts.hostname}: {e}")
+    if ALLOW_PRIVATE_URLS:
+        return
+    for address in addresses:
+        if not _is_public_address(address):
+            raise UnsafeURLError(f"{parts.hostname} resolves to the non-public address {address}")
+
+
+def download_public(url: str, content_types: tuple, max_bytes: int, timeout: float, headers: dict = None):
+    """
+    Body and final URL of a GET of url that only ever reaches public
+    addresses: redirects are followed by hand so every hop is checked
+    before it is requested. Raises ValueError when the Content-Type
+    doesn't contain one of content_types or the body exceeds max_bytes.
+    """
+    for _ in range(MAX_REDIRECTS + 1):
+        check_public_url(url)
+        response = clientUtils.registry.http_session().get(
+            url, headers=headers, timeout=resilienceUtils.timeout(timeout), stream=True, allow_redirects=False,
+        )
+        with response:
+            if response.is_redirect:
+                url = urljoin(url, response.headers["Location"])
+                continue
+            response.raise_for_status()
+            content_type = response.headers.get("Content-Type", "")
+            if not any(accepted in content_type for accepted in content_types):
+                raise ValueError(f"Unsupported content type {content_type!r}")
+            body = response.raw.read(max_bytes + 1, decode_content=True)
+            if len(body) > max_bytes:
+                raise ValueError(f"{url} is larger than {max_bytes} bytes")
+        return body, url
+    raise ValueError(f"Too many redirects for {url}")
+
+
+def _is_public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    # is_global is False for loopback, private, link-local (169.254.169.254), shared and reserved ranges
+    return ip.is_global and not ip.is_multicast
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Canonical form of an article URL, so the same article reached through
+    tracking links or AMP variants shares one cache entry.
+    Lowercases the scheme and host, drops default ports, fragments,
+    tracking parameters and AMP markers, and sorts the remaining parameters.
+    """
+    url = unwrap_amp_cache(url.strip())
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if host.startswith("amp.") and host.count(".") > 1:
+        host = host[len("amp."):]
+    netloc = host
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{host}:{parts.port}"
+    if parts.username:
+        credentials = parts.username + (f":{parts.password}" if parts.password else "")
+        netloc = f"{credentials}@{netloc}"
+
+    path = _AMP_PATH_SUFFIX.sub("", parts.path) or "/"
+    query = [
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not _is_tracking_param(name) and not _is_amp_param(name, value)
+    ]
+    return urlunsplit((scheme, netloc, path, urlencode(sorted(query)), ""))
+
+
+def unwrap_amp_cache(url: str) -> str:
+    """The publisher's URL of a page served from the Google AMP cache, other URLs as they are."""
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if host.endswith(".cdn.ampproject.org"):
+        path = _AMP_CACHE_CONTENT_TYPE.sub("", parts.path)
+    elif host.startswith("www.google.") and parts.path.startswith("/amp/"):
+        path = parts.path[len("/amp"):]
+    else:
+        return url
+    match = _AMP_CACHE_PATH.match(path)
+    if not match:
+        return url
+    scheme = "https" if match.group(1) else "http"
+    query = f"?{parts.query}" if parts.query else ""
+    return f"{scheme}://{match.group(2)}{query}"
+
+
+def _is_tracking_param(name: str) -> bool:
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def _is_amp_param(name: str, value: str) -> bool:
+    values = AMP_PARAMS.get(name.lower())
+    return values is not None and value.lower() in values
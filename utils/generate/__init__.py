@@ -3,5 +3,7 @@ Generate package for PDF generation and document formatting.
 """
 
 from . import pdfUtils
+from . import streamUtils
+from . import summaryUtils
 
-__all__ = ['pdfUtils']
+__all__ = ['pdfUtils', 'streamUtils', 'summaryUtils']
@@ -1,7 +1,12 @@
 ''' Utils function related to image fetch '''
 import io
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
 
-import requests
 from reportlab.lib.enums import TA_JUSTIFY
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import ParagraphStyle
@@ -14,19 +19,63 @@ from reportlab.platypus import (
     Image as ReportLabImage
 )
 
-from utils.fetch.imageUtils import get_image_display_size
+from utils.fetch.imageUtils import display_size, fetch_display_image
 
-filename = './temp.png'
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+_styles = None
+
+
+class PdfQueueFullError(Exception):
+    """Raised when too many PDFs are already queued for rendering."""
+
+
+class PdfRenderTimeoutError(Exception):
+    """Raised when rendering a PDF takes longer than the pool's timeout."""
+
+
+def _get_styles():
+    """Stylesheet built once per process and reused by every render."""
+    global _styles
+    if _styles is None:
+        styles = getSampleStyleSheet()
+        styles.add(ParagraphStyle(name="Justify", alignment=TA_JUSTIFY))
+        _styles = styles
+    return _styles
 
 
 # To generate pdf from the content
 def generate_pdf(content, top_image_url=None):
+    image = None
+    if top_image_url != '' and top_image_url is not None:
+        # Downloaded once, already downscaled to the display width
+        image = _top_image(top_image_url)
+    buffer = io.BytesIO(render_pdf(content, image))
+    buffer.seek(0)
+    return buffer
+
+
+def _top_image(url):
+    try:
+        return fetch_display_image(url)
+    except ValueError as e:
+        # Refused (private address, too large, not an image), the PDF goes without it
+        logger.warning(f"Leaving the image {url} out of the PDF: {e}")
+        return None
+
+
+def render_pdf(content, image=None) -> bytes:
+    """Lay out content and an optional DisplayImage, returning the PDF bytes."""
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(
         buffer, pagesize=letter, topMargin=0.5 * inch, bottomMargin=0.5 * inch
     )
-    styles = getSampleStyleSheet()
-    styles.add(ParagraphStyle(name="Justify", alignment=TA_JUSTIFY))
+    styles = _get_styles()
     flowables = []
 
     # Add title
@@ -35,19 +84,157 @@ def generate_pdf(content, top_image_url=None):
     flowables.append(Spacer(1, 12))
 
     # Add content and top image
-    if top_image_url != '' and top_image_url is not None:
-        img = requests.get(top_image_url, stream=True).raw
-        width, height = get_image_display_size(top_image_url)
-        flowables.append(ReportLabImage(img, width=width, height=height))
+    if image is not None:
+        width, height = display_size(image.width, image.height)
+        flowables.append(ReportLabImage(io.BytesIO(image.data), width=width, height=height))
 
-    content_lines = content.split("\n")[1:]
-    for i, line in enumerate(content_lines):
+    # Consecutive lines share one paragraph, blank lines become spacers
+    block = []
+    for line in content.split("\n")[1:]:
         if line.strip():
-            p = Paragraph(line, styles["Justify"])
-            flowables.append(p)
-        else:
-            flowables.append(Spacer(1, 6))
+            block.append(line)
+            continue
+        if block:
+            flowables.append(Paragraph("<br/>".join(block), styles["Justify"]))
+            block = []
+        flowables.append(Spacer(1, 6))
+    if block:
+        flowables.append(Paragraph("<br/>".join(block), styles["Justify"]))
 
     doc.build(flowables)
-    buffer.seek(0)
-    return buffer
+    return buffer.getvalue()
+
+
+def _init_worker(memory_limit: int) -> None:
+    # The cap is headroom on top of what the worker already maps
+    if memory_limit and resource is not None:
+        limit = _address_space_size() + memory_limit
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    _get_styles()
+
+
+def _address_space_size() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * resource.getpagesize()
+    except (OSError, ValueError):
+        return 0
+
+
+class PdfRenderPool:
+    """
+    Renders PDFs in worker processes so ReportLab layout doesn't hold the
+    request thread. At most max_workers + max_queue renders are accepted at
+    once, beyond that PdfQueueFullError is raised right away. Each worker may
+    grow by memory_limit bytes before its allocations fail, a render still
+    running after timeout seconds gets its pool's workers terminated.
+    Workers come from a fork server rather than forking the threaded app.
+    With max_workers=0 PDFs are rendered on the calling thread.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, timeout: float, memory_limit: int = 0):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self._slots = threading.BoundedSemaphore(max(1, max_workers) + max_queue)
+        self._lock = threading.Lock()
+        self._executor = None
+        self.active = 0  # Renders holding a slot, queued or running
+        self.rendered = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def render(self, content, top_image_url=None) -> bytes:
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise PdfQueueFullError("Too many PDFs are being generated, please retry shortly")
+        with self._lock:
+            self.active += 1
+
+        try:
+            image = _top_image(top_image_url) if top_image_url else None
+            if self.max_workers == 0:
+                pdf = render_pdf(content, image)
+            else:
+                pdf = self._render_in_worker(content, image)
+        finally:
+            self._release()
+        self.rendered += 1
+        return pdf
+
+    def _render_in_worker(self, content, image) -> bytes:
+        end = time.monotonic() + self.timeout
+        for attempt in range(2):
+            executor, future = self._submit(content, image)
+            try:
+                return future.result(timeout=max(0.0, end - time.monotonic()))
+            except FutureTimeoutError:
+                # A running render can't be cancelled, only stopping its worker frees the slot
+                if not future.cancel():
+                    self._recycle(executor)
+                self.timed_out += 1
+                raise PdfRenderTimeoutError(f"PDF rendering took longer than {self.timeout}s")
+            except BrokenProcessPool:
+                # Another render timed out or a worker hit the memory cap, try once on a fresh pool
+                if attempt or time.monotonic() >= end:
+                    raise
+
+    def has_capacity(self) -> bool:
+        """Whether a render would start right away instead of waiting for a worker."""
+        with self._lock:
+            return self.active < max(1, self.max_workers)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "active": self.active,
+            "rendered": self.rendered,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+    def _release(self) -> None:
+        with self._lock:
+            self.active -= 1
+        self._slots.release()
+
+    def _submit(self, content, image):
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._create_executor()
+            try:
+                return self._executor, self._executor.submit(render_pdf, content, image)
+            except BrokenProcessPool:
+                # A worker died (e.g. hit the memory cap), start a fresh pool
+                self._executor = self._create_executor()
+                return self._executor, self._executor.submit(render_pdf, content, image)
+
+    def _recycle(self, executor: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        terminate = getattr(executor, "terminate_workers", None)  # Python 3.14+
+        if terminate is not None:
+            terminate()
+            return
+        for process in list((executor._processes or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=_worker_context(),
+            initializer=_init_worker,
+            initargs=(self.memory_limit,),
+        )
+
+
+def _worker_context():
+    # Forking would copy the app's threads' locks and open SQLite connections into the worker
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    context = multiprocessing.get_context("forkserver")
+    # The server imports only the renderer, not the app's __main__
+    context.set_forkserver_preload([__name__])
+    return context
@@ -0,0 +1,82 @@
+''' Utils function related to streamed completions '''
+import json
+
+import requests
+
+from utils.clients import resilienceUtils
+from utils.metrics import metricsUtils
+from utils.ratelimit import quotaUtils
+from utils.response import responseUtils
+
+
+def format_sse(data, event=None) -> str:
+    """Format a payload as a server-sent event."""
+    message = f"data: {responseUtils.dumps(data)}\n\n"
+    if event is not None:
+        message = f"event: {event}\n{message}"
+    return message
+
+
+def stream_openai_chat(openai_client, **kwargs):
+    """Yield text deltas from an OpenAI chat completion."""
+    # Measured up to the response headers, the time to the first token
+    with metricsUtils.upstream("openai_chat_stream"):
+        stream = resilienceUtils.call(
+            quotaUtils.openai_upstream(openai_client.api_key), openai_client.chat.completions.create, stream=True, **kwargs
+        )
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield delta
+
+
+def stream_query_engine(query_engine, query: str):
+    """Yield text deltas from a llama_index streaming query engine."""
+    response = query_engine.query(query)
+    for delta in response.response_gen:
+        if delta:
+            yield delta
+
+
+def stream_llama_chat(llama, api_request_json: dict, timeout: int = 15):
+    """
+    Yield text deltas from the Llama API.
+    The SDK only offers an asyncio stream, so the OpenAI compatible event
+    stream is read here with requests using the client's endpoint and headers,
+    over the client's pooled session when it has one.
+    """
+    payload = {key: value for key, value in api_request_json.items() if key != "timeout"}
+    payload["stream"] = True
+    http = getattr(llama, "session", requests)
+
+    def post():
+        response = http.post(
+            f"{llama.hostname}{llama.domain_path}",
+            headers=llama.headers,
+            json=payload,
+            stream=True,
+            timeout=resilienceUtils.timeout(timeout),
+        )
+        if not response.ok:
+            response.close()
+            response.raise_for_status()
+        return response
+
+    # Retried until the stream starts, never once deltas were sent
+    with metricsUtils.upstream("llama_stream"):
+        response = resilienceUtils.call(quotaUtils.llama_upstream(llama.api_token), post)
+    with response:
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            choices = json.loads(data).get("choices") or []
+            if not choices:
+                continue
+            delta = (choices[0].get("delta") or {}).get("content")
+            if delta:
+                yield delta
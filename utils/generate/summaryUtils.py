@@ -0,0 +1,161 @@
+''' Utils function related to article summaries '''
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.clients import resilienceUtils
+from utils.metrics import metricsUtils
+from utils.ratelimit import quotaUtils
+
+logger = logging.getLogger(__name__)
+
+# Articles up to this size are summarized with a single completion
+SUMMARY_SINGLE_CALL_TOKENS = int(os.getenv("SUMMARY_SINGLE_CALL_TOKENS", "6000"))
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "3000"))
+SUMMARY_MAX_PARALLEL = int(os.getenv("SUMMARY_MAX_PARALLEL", "4"))
+SUMMARY_MAX_TOKENS = 500
+CHUNK_SUMMARY_MAX_TOKENS = 300
+SUMMARY_TIMEOUT = 15
+CHARS_PER_TOKEN = 4  # Estimate used when the tokenizer can't be loaded
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_encoding = None
+_encoding_failed = False
+
+
+def article_messages(content):
+    return [
+        {"role": "system", "content": "You are a helpful assistant that summarizes articles."},
+        {"role": "user", "content": f"Summarize the following article in a concise paragraph:\n\"\"\"{content}\"\"\""}
+    ]
+
+
+def chunk_messages(chunk):
+    return [
+        {"role": "system", "content": "You are a helpful assistant that summarizes articles."},
+        {"role": "user", "content": (
+            "The following is one part of a longer article. Summarize its key points "
+            f"in a few sentences:\n\"\"\"{chunk}\"\"\""
+        )}
+    ]
+
+
+def combine_messages(partial_summaries):
+    return [
+        {"role": "system", "content": "You are a helpful assistant that summarizes articles."},
+        {"role": "user", "content": (
+            "The following are summaries of consecutive parts of one article. Combine them "
+            f"into a concise paragraph summarizing the whole article:\n\"\"\"{partial_summaries}\"\"\""
+        )}
+    ]
+
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def split_into_chunks(text: str, max_tokens: int) -> list:
+    """
+    Split text into chunks of at most max_tokens, on paragraph boundaries
+    where possible. Paragraphs longer than max_tokens are cut by tokens.
+    """
+    chunks = []
+    current, current_tokens = [], 0
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        tokens = count_tokens(paragraph)
+        if tokens > max_tokens:
+            pieces = _split_by_tokens(paragraph, max_tokens)
+        else:
+            pieces = [(paragraph, tokens)]
+        for piece, piece_tokens in pieces:
+            if current and current_tokens + piece_tokens > max_tokens:
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def prepare_messages(openai_client, model: str, content: str):
+    """
+    Messages for the completion that produces the final summary, and the
+    tokens spent getting there.
+    Long content is first split into chunks that are summarized concurrently,
+    repeatedly until the partial summaries fit in a single call.
+    """
+    text, tokens_used, is_partial = content, 0, False
+    while count_tokens(text) > SUMMARY_SINGLE_CALL_TOKENS:
+        chunks = split_into_chunks(text, SUMMARY_CHUNK_TOKENS)
+        logger.info(f"Summarizing {len(chunks)} chunks of a long article")
+        partials, used = _summarize_chunks(openai_client, model, chunks)
+        text, tokens_used, is_partial = "\n\n".join(partials), tokens_used + used, True
+    return (combine_messages(text) if is_partial else article_messages(text)), tokens_used
+
+
+def summarize(openai_client, model: str, content: str):
+    """Summary of content and the total tokens spent on it."""
+    messages, tokens_used = prepare_messages(openai_client, model, content)
+    summary, used = _complete(openai_client, model, messages, SUMMARY_MAX_TOKENS)
+    return summary, tokens_used + used
+
+
+def _summarize_chunks(openai_client, model: str, chunks: list):
+    if len(chunks) == 1:
+        summary, used = _complete(openai_client, model, chunk_messages(chunks[0]), CHUNK_SUMMARY_MAX_TOKENS)
+        return [summary], used
+    with ThreadPoolExecutor(max_workers=max(1, min(SUMMARY_MAX_PARALLEL, len(chunks)))) as executor:
+        results = list(executor.map(
+            lambda chunk: _complete(openai_client, model, chunk_messages(chunk), CHUNK_SUMMARY_MAX_TOKENS),
+            chunks,
+        ))
+    return [summary for summary, _ in results], sum(used for _, used in results)
+
+
+def _complete(openai_client, model: str, messages: list, max_tokens: int):
+    with metricsUtils.upstream("openai_chat"):
+        response = resilienceUtils.call(quotaUtils.openai_upstream(openai_client.api_key), lambda: openai_client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            timeout=resilienceUtils.timeout(SUMMARY_TIMEOUT)
+        ))
+    usage = getattr(response, "usage", None)
+    return response.choices[0].message.content.strip(), getattr(usage, "total_tokens", None) or 0
+
+
+def _split_by_tokens(text: str, max_tokens: int) -> list:
+    encoding = _get_encoding()
+    if encoding is None:
+        size = max_tokens * CHARS_PER_TOKEN
+        return [(text[i:i + size], max_tokens) for i in range(0, len(text), size)]
+    tokens = encoding.encode(text, disallowed_special=())
+    return [
+        (encoding.decode(tokens[i:i + max_tokens]), len(tokens[i:i + max_tokens]))
+        for i in range(0, len(tokens), max_tokens)
+    ]
+
+
+def _get_encoding():
+    """
+    The cl100k_base tokenizer, loaded on first use. tiktoken downloads it
+    unless TIKTOKEN_CACHE_DIR has a copy, token counts are estimated from
+    the text length when that fails.
+    """
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logger.warning(f"Tokenizer unavailable, estimating token counts: {e}")
+            _encoding_failed = True
+    return _encoding
@@ -3,5 +3,7 @@ Index package for handling document indexing and search functionality.
 """
 
 from . import indexUtils
+from . import lexicalUtils
+from . import retrievalUtils
 
-__all__ = ['indexUtils']
+__all__ = ['indexUtils', 'lexicalUtils', 'retrievalUtils']
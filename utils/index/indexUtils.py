@@ -1,30 +1,239 @@
 ''' Utils function related to document index '''
-from typing import Union
-
-from langchain_openai import ChatOpenAI
-from llama_index.core import VectorStoreIndex, Document, ServiceContext
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Union
 
+from utils.cache.singleflightUtils import flights
 from utils.constants import IndexModel
+from utils.index.lexicalUtils import LexicalIndex
+from utils.metrics import metricsUtils
+
+# llama_index and langchain are slow to import, they are loaded on first use
+if TYPE_CHECKING:
+    from llama_index.core import VectorStoreIndex, ServiceContext
+
+logger = logging.getLogger(__name__)
+
+INDEX_CACHE_DIR = os.getenv("INDEX_CACHE_DIR", os.path.join(".cache", "index"))
+INDEX_CACHE_MAX_ENTRIES = int(os.getenv("INDEX_CACHE_MAX_ENTRIES", "32"))
+INDEX_CACHE_MAX_DISK_ENTRIES = int(os.getenv("INDEX_CACHE_MAX_DISK_ENTRIES", "256"))
+INDEX_CACHE_TTL = int(os.getenv("INDEX_CACHE_TTL", str(24 * 3600)))  # 1 day
+
+_META_FILENAME = "reader_meta.json"
+
+
+class IndexCache:
+    """
+    Two-tier cache of RAG indexes keyed by a digest of the indexed content.
+    The memory tier is an LRU of live index objects, the disk tier holds
+    persisted storage contexts so embeddings survive restarts.
+    """
+
+    def __init__(self, persist_dir: str, max_entries: int, max_disk_entries: int, ttl: int):
+        self.persist_dir = persist_dir
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (created_at, index)
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str, model: str):
+        """Return the cached index for key, or None if absent or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, index = entry
+                if not self._is_expired(created_at):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return index
+                del self._entries[key]
+                self.evictions += 1
+
+        index = self._load_from_disk(key, model)
+        with self._lock:
+            if index is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, index, self._read_created_at(key))
+        return index
+
+    def put(self, key: str, index, persist: bool = True) -> None:
+        """Store index in memory, and on disk unless persist is False."""
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, index, created_at)
+        if persist:
+            self._persist(key, index, created_at)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        shutil.rmtree(self.persist_dir, ignore_errors=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+    def _is_expired(self, created_at: float) -> bool:
+        return self.ttl > 0 and time.time() - created_at > self.ttl
+
+    def _remember(self, key: str, index, created_at: float) -> None:
+        self._entries[key] = (created_at, index)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.persist_dir, key)
+
+    def _read_created_at(self, key: str) -> float:
+        try:
+            with open(os.path.join(self._path(key), _META_FILENAME)) as f:
+                return json.load(f)["created_at"]
+        except (OSError, ValueError, KeyError):
+            return 0.0
+
+    def _load_from_disk(self, key: str, model: str):
+        path = self._path(key)
+        if not os.path.isdir(path):
+            return None
+        if self._is_expired(self._read_created_at(key)):
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+        try:
+            from llama_index.core import StorageContext, load_index_from_storage
+            storage_context = StorageContext.from_defaults(persist_dir=path)
+            index = load_index_from_storage(
+                storage_context,
+                service_context=_create_service_context(model)
+            )
+        except Exception as e:
+            logger.warning(f"Discarding unreadable persisted index {key}: {e}")
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+        os.utime(path)  # Mark as recently used for disk eviction
+        return index
+
+    def _persist(self, key: str, index, created_at: float) -> None:
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            index.storage_context.persist(persist_dir=tmp_path)
+            with open(os.path.join(tmp_path, _META_FILENAME), "w") as f:
+                json.dump({"created_at": created_at}, f)
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Failed to persist index {key}: {e}")
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            return
+        self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        try:
+            names = [n for n in os.listdir(self.persist_dir) if not n.endswith(".tmp")]
+        except OSError:
+            return
+        paths = sorted(
+            (os.path.join(self.persist_dir, n) for n in names),
+            key=lambda p: os.path.getmtime(p) if os.path.exists(p) else 0,
+        )
+        for path in paths[:max(0, len(paths) - self.max_disk_entries)]:
+            shutil.rmtree(path, ignore_errors=True)
+
 
+index_cache = IndexCache(
+    INDEX_CACHE_DIR,
+    INDEX_CACHE_MAX_ENTRIES,
+    INDEX_CACHE_MAX_DISK_ENTRIES,
+    INDEX_CACHE_TTL,
+)
 
-def create_rag_index(content: str, model: str, indexModel: IndexModel) -> Union[VectorStoreIndex, None]:
+
+def make_index_key(content: str, model: str, indexModel: IndexModel) -> str:
+    """Stable cache key for an index built over content with model."""
+    digest = hashlib.sha256()
+    for part in (indexModel.value, model, content):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+@metricsUtils.timed("index")
+def get_or_create_rag_index(content: str, model: str, indexModel: IndexModel) -> Union["VectorStoreIndex", LexicalIndex, None]:
+    """Return a cached RAG index for the content, building it on a miss."""
+    key = make_index_key(content, model, indexModel)
+    index = index_cache.get(key, model)
+    if index is not None:
+        return index
+    # Concurrent requests for the same content wait for a single build
+    return flights.do(f"index_{key}", lambda: _build_rag_index(key, content, model, indexModel))
+
+
+def _build_rag_index(key: str, content: str, model: str, indexModel: IndexModel):
+    # Another process may have persisted the index while we waited
+    index = index_cache.get(key, model)
+    if index is not None:
+        return index
+
+    index = create_rag_index(content, model, indexModel)
+    if index is not None:
+        # Lexical indexes are cheaper to rebuild than to load from disk
+        index_cache.put(key, index, persist=indexModel == IndexModel.VECTOR_STORE)
+    return index
+
+
+def create_rag_index(content: str, model: str, indexModel: IndexModel) -> Union["VectorStoreIndex", LexicalIndex, None]:
     """Create a RAG index based on the content and model type."""
     if indexModel == IndexModel.VECTOR_STORE:
         return _create_vector_store_rag_index(content, model)
+    if indexModel in (IndexModel.LEXICAL, IndexModel.HYBRID):
+        return LexicalIndex(content, model, hybrid=indexModel == IndexModel.HYBRID)
     return None
 
 
-def _create_vector_store_rag_index(content: str, model: str, temperature: float = 0.2) -> VectorStoreIndex:
-    """Create a vector store RAG index with the given content and model."""
-    # Create a Document object from the content
-    document = Document(text=content)
+def _create_service_context(model: str, temperature: float = 0.2) -> "ServiceContext":
+    """Create a service context using the selected model."""
+    from langchain_openai import ChatOpenAI
+    from llama_index.core import ServiceContext
 
-    # Create service context with selected model
     llm = ChatOpenAI(
         model_name=model,
         temperature=temperature
     )
-    service_context = ServiceContext.from_defaults(llm=llm)
+    return ServiceContext.from_defaults(llm=llm)
+
+
+def _create_vector_store_rag_index(content: str, model: str, temperature: float = 0.2) -> "VectorStoreIndex":
+    """Create a vector store RAG index with the given content and model."""
+    from llama_index.core import VectorStoreIndex, Document
+
+    # Create a Document object from the content
+    document = Document(text=content)
+
+    # Create service context with selected model
+    service_context = _create_service_context(model, temperature)
 
     # Create and return index
     return VectorStoreIndex.from_documents(
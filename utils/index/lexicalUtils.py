@@ -0,0 +1,234 @@
+''' Utils function related to the local lexical index '''
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from utils.clients import resilienceUtils
+from utils.metrics import metricsUtils
+from utils.ratelimit import quotaUtils
+
+logger = logging.getLogger(__name__)
+
+LEXICAL_TOP_K = int(os.getenv("LEXICAL_TOP_K", "4"))
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "12"))
+HYBRID_LEXICAL_WEIGHT = 0.3  # Share of the lexical score in the hybrid ranking
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+CHUNK_MIN_WORDS = 40
+CHUNK_MAX_WORDS = 200
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "do", "does", "for", "from",
+    "how", "in", "is", "it", "of", "on", "or", "that", "the", "this", "to", "was", "what",
+    "when", "where", "which", "who", "why", "with", "about", "article", "can", "you",
+}
+
+_HEADING = re.compile(r"^\s{0,3}(#{1,6})\s+(.+?)\s*#*\s*$")
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_TERM = re.compile(r"[a-z0-9]+")
+
+
+def tokenize_terms(text: str) -> list:
+    return [t for t in _TERM.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+class BM25Matrix:
+    """
+    Sparse term matrix of BM25 weights stored term by term (CSC layout), so
+    scoring a query is a gather of its terms' postings and one bincount.
+    """
+
+    def __init__(self, documents: list):
+        self.size = len(documents)
+        self.vocabulary = {}  # term -> column
+        rows, columns, counts = [], [], []
+        lengths = np.zeros(self.size, dtype=np.float32)
+        for row, terms in enumerate(documents):
+            lengths[row] = len(terms)
+            term_counts = {}
+            for term in terms:
+                term_counts[term] = term_counts.get(term, 0) + 1
+            for term, count in term_counts.items():
+                rows.append(row)
+                columns.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+                counts.append(count)
+
+        rows = np.asarray(rows, dtype=np.int32)
+        columns = np.asarray(columns, dtype=np.int32)
+        tf = np.asarray(counts, dtype=np.float32)
+        order = np.argsort(columns, kind="stable")
+        rows, columns, tf = rows[order], columns[order], tf[order]
+
+        document_frequency = np.bincount(columns, minlength=len(self.vocabulary)).astype(np.float32)
+        idf = np.log1p((self.size - document_frequency + 0.5) / (document_frequency + 0.5))
+        average_length = lengths.mean() if self.size else 1.0
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[rows] / (average_length or 1.0))
+        self._weights = idf[columns] * tf * (BM25_K1 + 1) / (tf + norm)
+        self._rows = rows
+        self._offsets = np.concatenate(([0], np.cumsum(document_frequency))).astype(np.int64)
+
+    def score(self, terms: list) -> np.ndarray:
+        """BM25 score of every document for the query terms."""
+        columns = {self.vocabulary[t] for t in terms if t in self.vocabulary}
+        if not columns:
+            return np.zeros(self.size, dtype=np.float32)
+        spans = [slice(self._offsets[c], self._offsets[c + 1]) for c in columns]
+        rows = np.concatenate([self._rows[s] for s in spans])
+        weights = np.concatenate([self._weights[s] for s in spans])
+        return np.bincount(rows, weights=weights, minlength=self.size).astype(np.float32)
+
+
+@dataclass
+class Chunk:
+    text: str
+    section: str
+
+
+@dataclass
+class LexicalResponse:
+    """Answer of a LexicalQueryEngine, shaped like a llama_index response."""
+    response: str = ""
+    source_nodes: list = field(default_factory=list)
+    response_gen: object = None
+
+    def __str__(self):
+        return self.response
+
+
+def split_chunks(content: str) -> list:
+    """
+    Paragraph sized chunks of a markdown article tagged with their section
+    heading. Short paragraphs are merged, long ones are cut by words.
+    """
+    chunks, words, section = [], [], ""
+
+    def flush():
+        if words:
+            chunks.append(Chunk(" ".join(words), section))
+            words.clear()
+
+    for paragraph in _PARAGRAPH_BREAK.split(content):
+        for line in paragraph.strip().splitlines():
+            heading = _HEADING.match(line)
+            if heading:
+                flush()
+                section = heading.group(2)
+                continue
+            words.extend(line.split())
+            while len(words) > CHUNK_MAX_WORDS:
+                chunks.append(Chunk(" ".join(words[:CHUNK_MAX_WORDS]), section))
+                del words[:CHUNK_MAX_WORDS]
+        if len(words) >= CHUNK_MIN_WORDS:
+            flush()
+    flush()
+    return chunks
+
+
+class LexicalIndex:
+    """
+    BM25 index over the chunks of one article, built locally without any
+    embedding calls. In hybrid mode the lexical candidates are re-ranked by
+    embedding similarity, chunk embeddings are computed once per index.
+    """
+
+    def __init__(self, content: str, model: str, hybrid: bool = False):
+        self.model = model
+        self.hybrid = hybrid
+        self.chunks = split_chunks(content)
+        self.matrix = BM25Matrix([tokenize_terms(f"{c.section} {c.text}") for c in self.chunks])
+        self._embeddings = {}  # chunk position -> unit vector
+        self._lock = threading.Lock()
+
+    def search(self, query: str, top_k: int = LEXICAL_TOP_K, openai_client=None) -> list:
+        """Positions of the chunks that best match query, best first."""
+        scores = self.matrix.score(tokenize_terms(query))
+        candidates = HYBRID_CANDIDATES if self.hybrid else top_k
+        ranked = [int(i) for i in np.argsort(-scores, kind="stable")[:candidates] if scores[i] > 0]
+        if not ranked:
+            return list(range(min(top_k, len(self.chunks))))
+        if self.hybrid and len(ranked) > 1:
+            ranked = self._rerank(query, ranked, scores, openai_client or _default_openai_client())
+        return ranked[:top_k]
+
+    def context(self, positions: list) -> str:
+        """The chunks at positions in article order, under their section headings."""
+        parts, section = [], None
+        for position in sorted(positions):
+            chunk = self.chunks[position]
+            if chunk.section and chunk.section != section:
+                parts.append(f"## {chunk.section}")
+            section = chunk.section
+            parts.append(chunk.text)
+        return "\n\n".join(parts)
+
+    def as_query_engine(self, streaming: bool = False, instructions: str = "", openai_client=None):
+        return LexicalQueryEngine(self, streaming, instructions, openai_client)
+
+    def _rerank(self, query: str, ranked: list, scores: np.ndarray, openai_client) -> list:
+        with self._lock:
+            missing = [i for i in ranked if i not in self._embeddings]
+        vectors = embed_texts(openai_client, [query] + [self.chunks[i].text for i in missing])
+        with self._lock:
+            for position, vector in zip(missing, vectors[1:]):
+                self._embeddings[position] = vector
+            chunk_vectors = np.stack([self._embeddings[i] for i in ranked])
+        similarity = chunk_vectors @ vectors[0]
+        lexical = scores[ranked] / (scores[ranked].max() or 1.0)
+        combined = HYBRID_LEXICAL_WEIGHT * lexical + (1 - HYBRID_LEXICAL_WEIGHT) * similarity
+        return [ranked[i] for i in np.argsort(-combined, kind="stable")]
+
+
+class LexicalQueryEngine:
+    """Answers a query from the top chunks of a LexicalIndex with one chat completion."""
+
+    def __init__(self, index: LexicalIndex, streaming: bool, instructions: str, openai_client=None):
+        self.index = index
+        self.streaming = streaming
+        self.instructions = instructions
+        self.openai_client = openai_client or _default_openai_client()
+
+    def query(self, query: str) -> LexicalResponse:
+        with metricsUtils.timer("retrieval"):
+            positions = self.index.search(query, openai_client=self.openai_client)
+        kwargs = {
+            "model": self.index.model,
+            "messages": [
+                {"role": "system", "content": (
+                    f"{self.instructions}\n"
+                    f"Answer using these excerpts of the article: <content>{self.index.context(positions)}</content>"
+                )},
+                {"role": "user", "content": query},
+            ],
+            "temperature": 0.2,
+            "timeout": resilienceUtils.timeout(15),
+        }
+        sources = [self.index.chunks[p] for p in positions]
+        if self.streaming:
+            from utils.generate.streamUtils import stream_openai_chat
+            return LexicalResponse(source_nodes=sources, response_gen=stream_openai_chat(self.openai_client, **kwargs))
+        with metricsUtils.timer("generation"), metricsUtils.upstream("openai_chat"):
+            completion = resilienceUtils.call(
+                quotaUtils.openai_upstream(self.openai_client.api_key), self.openai_client.chat.completions.create, **kwargs
+            )
+        return LexicalResponse(completion.choices[0].message.content.strip(), sources)
+
+
+def embed_texts(openai_client, texts: list, attempts: int = resilienceUtils.RETRY_ATTEMPTS) -> list:
+    """Unit length embeddings of texts."""
+    with metricsUtils.timer("embedding"), metricsUtils.upstream("openai_embeddings"):
+        response = resilienceUtils.call(
+            quotaUtils.openai_upstream(openai_client.api_key), openai_client.embeddings.create,
+            model=EMBEDDING_MODEL, input=texts, attempts=attempts,
+        )
+    vectors = [np.asarray(item.embedding, dtype=np.float32) for item in response.data]
+    return [v / (np.linalg.norm(v) or 1.0) for v in vectors]
+
+
+def _default_openai_client():
+    from utils.clients.clientUtils import registry
+    return registry.openai(os.getenv("OPENAI_API_KEY"))
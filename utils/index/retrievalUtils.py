@@ -0,0 +1,157 @@
+''' Utils function related to retrieving passages of an article '''
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from utils.cache.cacheUtils import stable_key
+from utils.generate.summaryUtils import count_tokens
+from utils.index.lexicalUtils import BM25Matrix, tokenize_terms
+from utils.metrics import metricsUtils
+from utils.startup.startupUtils import ensure_nltk_data
+
+logger = logging.getLogger(__name__)
+
+# Prompt tokens of article context sent with a Llama query
+LLAMA_CONTEXT_TOKENS = int(os.getenv("LLAMA_CONTEXT_TOKENS", "2000"))
+SENTENCE_INDEX_CACHE_SIZE = 32
+NEIGHBOR_SENTENCES = 1  # Sentences kept on each side of a hit for context
+
+_HEADING = re.compile(r"^\s{0,3}(#{1,6})\s+(.+?)\s*#*\s*$")
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])")
+
+
+@dataclass(frozen=True)
+class Sentence:
+    text: str
+    section: str
+    paragraph: int
+
+
+@dataclass(frozen=True)
+class RetrievedContext:
+    text: str
+    prompt_tokens: int
+    full_tokens: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.full_tokens - self.prompt_tokens)
+
+
+def split_sentences(text: str) -> list:
+    """Sentences of text, with the punkt tokenizer when its data is available."""
+    if ensure_nltk_data("punkt"):
+        from nltk.tokenize import sent_tokenize
+        return sent_tokenize(text)
+    return _SENTENCE_END.split(text)
+
+
+class SentenceIndex:
+    """
+    Sentences of an article with the heading of the section they belong to,
+    scored against a query with a BM25Matrix.
+    """
+
+    def __init__(self, content: str):
+        self.content = content
+        self.full_tokens = count_tokens(content)
+        self.sentences = []
+        section = ""
+        for paragraph_number, paragraph in enumerate(_PARAGRAPH_BREAK.split(content)):
+            lines = []
+            for line in paragraph.strip().splitlines():
+                heading = _HEADING.match(line)
+                if heading:
+                    section = heading.group(2)
+                elif line.strip():
+                    lines.append(line.strip())
+            for text in split_sentences(" ".join(lines)):
+                if text.strip():
+                    self.sentences.append(Sentence(text.strip(), section, paragraph_number))
+
+        self.matrix = BM25Matrix([tokenize_terms(s.text) for s in self.sentences])
+
+    def score(self, query: str) -> list:
+        """BM25 score of every sentence for query."""
+        return self.matrix.score(tokenize_terms(query)).tolist()
+
+    def retrieve(self, query: str, max_tokens: int) -> RetrievedContext:
+        """
+        The best matching passages for query within max_tokens, in article
+        order under their section headings. Articles that already fit are
+        returned whole.
+        """
+        if self.full_tokens <= max_tokens:
+            return RetrievedContext(self.content, self.full_tokens, self.full_tokens)
+
+        scores = self.score(query)
+        ranked = sorted((i for i, s in enumerate(scores) if s > 0), key=lambda i: -scores[i])
+        if not ranked:
+            # Nothing matches, the lead of the article is the best guess
+            ranked = list(range(len(self.sentences)))
+
+        selected, used = set(), 0
+        for hit in ranked:
+            window = [
+                i for i in range(hit - NEIGHBOR_SENTENCES, hit + NEIGHBOR_SENTENCES + 1)
+                if 0 <= i < len(self.sentences) and i not in selected
+                and self.sentences[i].section == self.sentences[hit].section
+            ]
+            cost = sum(count_tokens(self.sentences[i].text) for i in window)
+            if used + cost > max_tokens:
+                if hit in selected or used + count_tokens(self.sentences[hit].text) > max_tokens:
+                    continue
+                window, cost = [hit], count_tokens(self.sentences[hit].text)
+            selected.update(window)
+            used += cost
+
+        text = self._render(sorted(selected))
+        return RetrievedContext(text, count_tokens(text), self.full_tokens)
+
+    def _render(self, ids: list) -> str:
+        parts, section, previous = [], None, None
+        for i in ids:
+            sentence = self.sentences[i]
+            if sentence.section != section:
+                section = sentence.section
+                if section:
+                    parts.append(f"\n\n## {section}\n")
+            elif previous is not None and i != previous + 1:
+                parts.append(" [...] ")
+            elif previous is not None and sentence.paragraph != self.sentences[previous].paragraph:
+                parts.append("\n\n")
+            else:
+                parts.append(" ")
+            parts.append(sentence.text)
+            previous = i
+        return "".join(parts).strip()
+
+
+_indexes = OrderedDict()  # content digest -> SentenceIndex
+_indexes_lock = threading.Lock()
+
+
+def get_sentence_index(content: str) -> SentenceIndex:
+    """SentenceIndex of content, reused for follow-up questions on the same article."""
+    key = stable_key("sentences", content)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+
+    index = SentenceIndex(content)
+    with _indexes_lock:
+        _indexes[key] = index
+        while len(_indexes) > SENTENCE_INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
+
+
+@metricsUtils.timed("retrieval")
+def retrieve_context(content: str, query: str, max_tokens: int = LLAMA_CONTEXT_TOKENS) -> RetrievedContext:
+    return get_sentence_index(content).retrieve(query, max_tokens)
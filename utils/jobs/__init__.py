@@ -0,0 +1,7 @@
+"""
+Jobs package for running work in the background and tracking its result.
+"""
+
+from . import jobUtils, speculateUtils
+
+__all__ = ['jobUtils', 'speculateUtils']
@@ -0,0 +1,174 @@
+''' Utils function related to background jobs '''
+import logging
+import math
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.metrics import metricsUtils
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+ERROR = "error"
+
+STORE_POLL_INTERVAL = 0.25  # Seconds between checks when waiting on another process's job
+
+
+class JobQueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class Job:
+    def __init__(self, name: str):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.status = PENDING
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._done = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._done.wait(timeout)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """
+    Runs jobs on a bounded thread pool and keeps finished jobs around for
+    `ttl` seconds so their result can be polled.
+    With a shared store (get/set with a timeout, e.g. the app cache) each
+    job's state is also written there, so any worker process can answer
+    a poll for it.
+    """
+
+    def __init__(self, max_workers: int = 4, max_pending: int = 100, ttl: int = 600, store=None):
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def submit(self, name: str, fn, *args, **kwargs) -> Job:
+        """Queue fn(*args, **kwargs) and return its job."""
+        job = Job(name)
+        with self._lock:
+            self._prune()
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise JobQueueFullError(f"Too many pending jobs ({self._pending})")
+            self._pending += 1
+            self.submitted += 1
+            self._jobs[job.id] = job
+        self._publish(job)
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id: str, timeout: float = None):
+        """Return the job once finished or once timeout expires, None if unknown."""
+        job = self.get(job_id)
+        if job is not None:
+            job.wait(timeout)
+        return job
+
+    def status(self, job_id: str, timeout: float = 0):
+        """
+        The job as a dict once finished or once timeout expires, looked up
+        in the store when another process runs it. None if unknown.
+        """
+        if not math.isfinite(timeout):
+            raise ValueError(f"Job wait timeout must be finite, got {timeout}")
+        job = self.wait(job_id, timeout) if timeout else self.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if self.store is None:
+            return None
+        deadline = time.monotonic() + (timeout or 0)
+        while True:
+            state = self.store.get(_store_key(job_id))
+            if state is None or state["status"] in (DONE, ERROR) or time.monotonic() >= deadline:
+                return state
+            time.sleep(min(STORE_POLL_INTERVAL, max(0.0, deadline - time.monotonic())))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pending": self._pending,
+                "tracked": len(self._jobs),
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+            }
+
+    def _run(self, job: Job, fn, args, kwargs) -> None:
+        metricsUtils.record_stage("job_queue", time.time() - job.created_at)
+        job.status = RUNNING
+        self._publish(job)
+        try:
+            job.result = fn(*args, **kwargs)
+            job.status = DONE
+        except Exception as e:
+            logger.error(f"Job {job.name} ({job.id}) failed: {e}")
+            job.error = str(e)
+            job.status = ERROR
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._pending -= 1
+                if job.status == DONE:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+            self._publish(job)
+            job._done.set()
+
+    def _publish(self, job: Job) -> None:
+        if self.store is None:
+            return
+        try:
+            self.store.set(_store_key(job.id), job.to_dict(), timeout=self.ttl)
+        except Exception as e:
+            # Polls on this process still see the job, only other workers miss it
+            logger.warning(f"Failed to store job {job.id}: {e}")
+
+    def _prune(self) -> None:
+        """Forget finished jobs older than the ttl. Caller holds the lock."""
+        cutoff = time.time() - self.ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+def _store_key(job_id: str) -> str:
+    return f"job_{job_id}"
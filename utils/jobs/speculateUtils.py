@@ -0,0 +1,89 @@
+''' Utils function related to speculative background work '''
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+SPECULATE = os.getenv("SPECULATE", "0") == "1"  # Opt-in, spends CPU on work that may go unused
+SPECULATE_WORKERS = int(os.getenv("SPECULATE_WORKERS", "1"))
+SPECULATE_MAX_PENDING = int(os.getenv("SPECULATE_MAX_PENDING", "8"))
+
+
+class Speculator:
+    """
+    Low-priority pool for work that a follow-up request will probably
+    need, such as the index and PDF of an article that was just fetched.
+    When max_pending tasks are already waiting, the oldest is cancelled to
+    make room. A task is skipped if busy() reports load, or its own ready()
+    check fails, at the moment it would start.
+    Tasks write their results to the regular caches. They go through the
+    same single flights as the requests, so a request arriving mid-task
+    joins it.
+    """
+
+    def __init__(self, max_workers: int = SPECULATE_WORKERS, max_pending: int = SPECULATE_MAX_PENDING, busy=None):
+        self.max_pending = max_pending
+        self.busy = busy or (lambda: False)
+        # Not niced: a speculative render may start the PDF pool's forkserver, every worker would inherit it
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="speculate")
+        self._pending = OrderedDict()  # key -> Future, until the task starts
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.cancelled = 0
+
+    def submit(self, key: str, fn, *args, ready=None) -> bool:
+        """
+        Queue fn(*args) unless the server is busy or the same key is already
+        waiting. Returns whether it was queued.
+        """
+        if self.busy():
+            with self._lock:
+                self.skipped += 1
+            return False
+        with self._lock:
+            if key in self._pending:
+                return False
+            while len(self._pending) >= self.max_pending:
+                # Older articles are less likely to be read next
+                _, oldest = self._pending.popitem(last=False)
+                if oldest.cancel():
+                    self.cancelled += 1
+            self.submitted += 1
+            self._pending[key] = self._executor.submit(self._run, key, fn, args, ready)
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "skipped": self.skipped,
+                "cancelled": self.cancelled,
+            }
+
+    def _run(self, key: str, fn, args, ready) -> None:
+        with self._lock:
+            self._pending.pop(key, None)
+        if self.busy() or (ready is not None and not ready()):
+            with self._lock:
+                self.skipped += 1
+            return
+        try:
+            fn(*args)
+        except Exception as e:
+            # Nobody is waiting for it, the request will do the work itself
+            logger.info(f"Speculative {key} failed: {e}")
+            with self._lock:
+                self.failed += 1
+        else:
+            with self._lock:
+                self.completed += 1
+
@@ -0,0 +1,7 @@
+"""
+Metrics package for stage latencies, upstream calls and the /metrics endpoint.
+"""
+
+from . import metricsUtils
+
+__all__ = ['metricsUtils']
@@ -0,0 +1,244 @@
+''' Utils function related to latency metrics '''
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# Seconds, from cache hits to slow completions
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Stage durations of the request being handled, for its Server-Timing header
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values = {}  # label values -> count
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, label_values)} {_number(value)}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values = {}  # label values -> current value
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def dec(self, *label_values, amount: float = 1) -> None:
+        self.inc(*label_values, amount=-amount)
+
+    def value(self, *label_values) -> float:
+        with self._lock:
+            return self._values.get(label_values, 0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, label_values)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values) -> None:
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[position] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    labels = _labels(self.labels + ("le",), label_values + (_number(bound),))
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _labels(self.labels + ("le",), label_values + ("+Inf",))
+                lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, label_values)} {_number(series[-2])}")
+                lines.append(f"{self.name}_count{_labels(self.labels, label_values)} {series[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Metrics of this process in the Prometheus text format.
+    Collectors are callables run at scrape time that return
+    (name, type, help, [(labels dict, value)]) tuples, for numbers other
+    components already keep such as cache statistics.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str, labels: tuple = ()) -> Counter:
+        return self._add(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: tuple = ()) -> Gauge:
+        return self._add(Gauge(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def add_collector(self, collector) -> None:
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics, collectors = list(self._metrics), list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collector in collectors:
+            for name, metric_type, help_text, samples in collector():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def _add(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram(
+    "reader_stage_seconds", "Time spent in each stage of the request pipeline", ("stage",)
+)
+upstream_seconds = registry.histogram(
+    "reader_upstream_seconds", "Latency of calls to upstream services", ("upstream",)
+)
+upstream_requests = registry.counter(
+    "reader_upstream_requests_total", "Calls to upstream services by outcome", ("upstream", "outcome")
+)
+http_seconds = registry.histogram(
+    "reader_http_request_seconds", "Time to produce a response, by endpoint", ("endpoint",)
+)
+http_requests = registry.counter(
+    "reader_http_requests_total", "Responses by endpoint and status", ("endpoint", "status")
+)
+http_in_flight = registry.gauge(
+    "reader_http_requests_in_flight", "Requests being handled, streamed responses until they end"
+)
+
+
+@contextmanager
+def timer(stage: str):
+    """Record the duration of the block as stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+def timed(stage: str):
+    """Decorator recording each call of the function as stage."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def upstream(name: str):
+    """Count the call to an upstream service in the block and record its latency."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        upstream_requests.inc(name, "error")
+        raise
+    else:
+        upstream_requests.inc(name, "ok")
+    finally:
+        upstream_seconds.observe(time.perf_counter() - start, name)
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    stage_seconds.observe(seconds, stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+def start_request() -> None:
+    """Collect the stages recorded on this thread for the Server-Timing header."""
+    _request_timings.set({})
+    http_in_flight.inc()
+
+
+def end_request() -> None:
+    """Count the request as handled, once its response has been sent."""
+    http_in_flight.dec()
+
+
+def finish_request(endpoint: str, status: int, seconds: float) -> str:
+    """Record the response and return its Server-Timing header value."""
+    http_seconds.observe(seconds, endpoint)
+    http_requests.inc(endpoint, str(status))
+    timings = _request_timings.get() or {}
+    _request_timings.set(None)
+    entries = [f"{stage};dur={duration * 1000:.1f}" for stage, duration in timings.items()]
+    entries.append(f"total;dur={seconds * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if isinstance(value, float) and (math.isinf(value) or math.isnan(value)):
+        return "+Inf" if value > 0 else "NaN"
+    return repr(float(value)) if isinstance(value, float) else str(value)
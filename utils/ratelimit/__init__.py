@@ -0,0 +1,8 @@
+"""
+Rate limit package for request limits and upstream quotas shared by every
+worker process on a host.
+"""
+
+from . import limiterUtils, quotaUtils
+
+__all__ = ['limiterUtils', 'quotaUtils']
@@ -0,0 +1,178 @@
+''' Utils function related to request rate limits '''
+import math
+import os
+import sqlite3
+import time
+import urllib.parse
+
+from limits.errors import ConfigurationError
+from limits.storage import Storage
+from limits.strategies import STRATEGIES, RateLimiter
+from limits.util import WindowStats
+
+from utils.cache.sqliteUtils import ThreadConnections
+
+DEFAULT_STORAGE_URI = "sqlite:///" + os.path.join(".cache", "ratelimit.sqlite3")
+PRUNE_EVERY = 1000  # Writes between sweeps of expired rows
+
+
+class SQLiteStorage(Storage):
+    """
+    Flask-Limiter storage in a SQLite database, so every worker process on
+    the host counts against the same limits. Registered for
+    sqlite:///relative/path and sqlite:////absolute/path URIs.
+    Holds fixed-window counters and the token buckets of TokenBucketRateLimiter.
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        path = urllib.parse.urlparse(uri).path
+        self.path = path[1:] if path.startswith("/") else path
+        if not self.path:
+            raise ConfigurationError(f"No database path in {uri}")
+        self._writes = 0
+        self._connections = ThreadConnections(self.path)
+        self._connections.get().execute(
+            "CREATE TABLE IF NOT EXISTS limits ("
+            " key TEXT PRIMARY KEY,"
+            " value REAL NOT NULL,"
+            " updated REAL NOT NULL,"
+            " expires REAL NOT NULL)"
+        )
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _update(self, key: str, change):
+        """
+        Run change(row or None, now) -> (value, updated, expires, result) on
+        the row of key in one write transaction, so concurrent workers see
+        each other's updates, and return result.
+        """
+        conn = self._connections.get()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT value, updated, expires FROM limits WHERE key = ?", (key,)
+            ).fetchone()
+            value, updated, expires, result = change(row, now)
+            conn.execute(
+                "INSERT OR REPLACE INTO limits (key, value, updated, expires) VALUES (?, ?, ?, ?)",
+                (key, value, updated, expires),
+            )
+            self._writes += 1
+            if self._writes % PRUNE_EVERY == 0:
+                conn.execute("DELETE FROM limits WHERE expires <= ?", (now,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def _row(self, key: str):
+        return self._connections.get().execute(
+            "SELECT value, updated, expires FROM limits WHERE key = ?", (key,)
+        ).fetchone()
+
+    # Fixed and sliding window counters
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        def change(row, now):
+            count = row[0] if row is not None and row[2] > now else 0
+            expires = row[2] if row is not None and row[2] > now else now + expiry
+            return count + amount, now, expires, int(count + amount)
+        return self._update(key, change)
+
+    def get(self, key: str) -> int:
+        row = self._row(key)
+        return int(row[0]) if row is not None and row[2] > time.time() else 0
+
+    def get_expiry(self, key: str) -> float:
+        row = self._row(key)
+        return row[2] if row is not None and row[2] > time.time() else time.time()
+
+    # Token buckets
+
+    def acquire(self, key: str, capacity: float, rate: float, amount: float) -> bool:
+        """Take amount tokens from the bucket if it holds that many, refilling at rate per second."""
+        def change(row, now):
+            tokens = _refilled(row, now, capacity, rate)
+            allowed = tokens >= amount
+            if allowed:
+                tokens -= amount
+            return tokens, now, now + (capacity - tokens) / rate, allowed
+        return self._update(key, change)
+
+    def tokens(self, key: str, capacity: float, rate: float) -> float:
+        return _refilled(self._row(key), time.time(), capacity, rate)
+
+    def check(self) -> bool:
+        try:
+            self._connections.get().execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> int:
+        return self._connections.get().execute("DELETE FROM limits").rowcount
+
+    def clear(self, key: str) -> None:
+        self._connections.get().execute("DELETE FROM limits WHERE key = ?", (key,))
+
+
+def _refilled(row, now: float, capacity: float, rate: float) -> float:
+    if row is None:
+        return capacity
+    value, updated, _ = row
+    return min(capacity, value + max(0.0, now - updated) * rate)
+
+
+class TokenBucketRateLimiter(RateLimiter):
+    """
+    "30 per minute" as a bucket of 30 tokens refilled at 0.5 per second:
+    bursts up to the limit are allowed, after which requests are spaced out
+    instead of being refused until the window rolls over.
+    A request costing more than the whole bucket is charged the bucket.
+    """
+
+    def __init__(self, storage):
+        super().__init__(storage)
+        if not hasattr(storage, "acquire"):
+            raise ConfigurationError("The token-bucket strategy needs sqlite:// storage")
+
+    def hit(self, item, *identifiers, cost: int = 1) -> bool:
+        capacity, rate = _bucket(item)
+        return self.storage.acquire(item.key_for(*identifiers), capacity, rate, min(cost, capacity))
+
+    def test(self, item, *identifiers, cost: int = 1) -> bool:
+        capacity, rate = _bucket(item)
+        return self.storage.tokens(item.key_for(*identifiers), capacity, rate) >= min(cost, capacity)
+
+    def get_window_stats(self, item, *identifiers) -> WindowStats:
+        capacity, rate = _bucket(item)
+        tokens = self.storage.tokens(item.key_for(*identifiers), capacity, rate)
+        # Reset is when the next request fits while empty, when the bucket is full otherwise
+        wait = (1 - tokens) / rate if tokens < 1 else (capacity - tokens) / rate
+        return WindowStats(time.time() + wait, int(tokens))
+
+
+def _bucket(item):
+    return item.amount, item.amount / item.get_expiry()
+
+
+STRATEGIES.setdefault("token-bucket", TokenBucketRateLimiter)
+
+
+def weighted_cost(units: float, per_unit: float, cap: int = None) -> int:
+    """
+    Requests counted against a limit for work of the given size, one per
+    started per_unit. per_unit of 0 disables the weighting.
+    """
+    if per_unit <= 0 or units <= per_unit:
+        return 1
+    cost = math.ceil(units / per_unit)
+    return min(cost, cap) if cap else cost
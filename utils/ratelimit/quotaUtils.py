@@ -0,0 +1,160 @@
+''' Utils function related to upstream API quotas '''
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from utils.cache.sqliteUtils import ThreadConnections
+
+logger = logging.getLogger(__name__)
+
+# Requests and tokens held back from the upstream's own limit, as a fraction of it
+QUOTA_RESERVE = float(os.getenv("UPSTREAM_QUOTA_RESERVE", "0.05"))
+DEFAULT_RETRY_AFTER = 5  # Seconds to back off after a 429 without a Retry-After
+
+_DURATION_PART = re.compile(r"([\d.]+)(ms|h|m|s)")
+_UNIT_SECONDS = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+
+
+class QuotaExhaustedError(Exception):
+    """Raised when an upstream is out of quota until retry_after seconds from now."""
+
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"{upstream} quota exhausted, retry in {retry_after:.0f}s")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class UpstreamQuota:
+    """
+    Remaining requests and tokens the upstreams report in their rate limit
+    headers, kept in SQLite so every worker process sees the latest numbers.
+    Calls are shed once what's left drops below the reserve, or after a 429
+    until its Retry-After passes, rather than sent to fail upstream.
+    """
+
+    def __init__(self, path: str, reserve: float = QUOTA_RESERVE):
+        self.path = path
+        self.reserve = reserve
+        self._lock = threading.Lock()
+        self.shed = 0
+        self.throttled = 0
+        self._connections = ThreadConnections(path)
+        self._connections.get().execute(
+            "CREATE TABLE IF NOT EXISTS quotas ("
+            " upstream TEXT NOT NULL,"
+            " kind TEXT NOT NULL,"  # requests, tokens or blocked
+            " remaining REAL,"
+            " quota REAL,"
+            " reset_at REAL NOT NULL,"
+            " PRIMARY KEY (upstream, kind))"
+        )
+
+    def record(self, upstream: str, status: int, headers) -> None:
+        """Update the quota of upstream from the status and headers of one of its responses."""
+        now = time.time()
+        rows = []
+        for kind in ("requests", "tokens"):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            if remaining is None:
+                continue
+            try:
+                rows.append((
+                    upstream, kind, float(remaining),
+                    float(headers.get(f"x-ratelimit-limit-{kind}") or 0) or None,
+                    now + parse_duration(headers.get(f"x-ratelimit-reset-{kind}") or "1s"),
+                ))
+            except ValueError:
+                continue
+        if status == 429:
+            rows.append((upstream, "blocked", None, None, now + _retry_after(headers)))
+            with self._lock:
+                self.throttled += 1
+            logger.warning(f"{upstream} returned 429, holding calls back")
+        if rows:
+            self._connections.get().executemany(
+                "INSERT OR REPLACE INTO quotas (upstream, kind, remaining, quota, reset_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def check(self, upstream: str, tokens: int = 0) -> None:
+        """
+        Raise QuotaExhaustedError if a call to upstream using about tokens
+        would dip into the reserve.
+        """
+        now = time.time()
+        rows = self._connections.get().execute(
+            "SELECT kind, remaining, quota, reset_at FROM quotas WHERE upstream = ? AND reset_at > ?",
+            (upstream, now),
+        ).fetchall()
+        exhausted_until = max((
+            reset_at for kind, remaining, quota, reset_at in rows
+            if kind == "blocked" or remaining - (tokens if kind == "tokens" else 1) < (quota or 0) * self.reserve
+        ), default=None)
+        if exhausted_until is not None:
+            with self._lock:
+                self.shed += 1
+            raise QuotaExhaustedError(upstream, exhausted_until - now)
+
+    def stats(self) -> dict:
+        now = time.time()
+        rows = self._connections.get().execute(
+            "SELECT upstream, kind, remaining, quota, reset_at FROM quotas WHERE reset_at > ?", (now,)
+        ).fetchall()
+        upstreams = {}
+        for upstream, kind, remaining, quota, reset_at in rows:
+            upstreams.setdefault(upstream, {})[kind] = {
+                "remaining": remaining,
+                "limit": quota,
+                "resets_in": reset_at - now,
+            }
+        with self._lock:
+            return {"upstreams": upstreams, "shed": self.shed, "throttled": self.throttled}
+
+    def response_hook(self, upstream: str):
+        """httpx response hook recording the quota of upstream from each response."""
+        def hook(response):
+            try:
+                self.record(upstream, response.status_code, response.headers)
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to record {upstream} quota: {e}")
+        return hook
+
+
+def openai_upstream(api_key: str) -> str:
+    """Quota and breaker name of an OpenAI key, each key has its own limits."""
+    return "openai_" + _key_digest(api_key)
+
+
+def llama_upstream(api_key: str) -> str:
+    """Breaker name of a Llama API key, one key running out of quota doesn't stop the others."""
+    return "llama_" + _key_digest(api_key)
+
+
+def _key_digest(api_key: str) -> str:
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:12]
+
+
+def parse_duration(value: str) -> float:
+    """Seconds in an OpenAI reset duration such as 6m0s, 1.5s or 20ms."""
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return float(value)
+    return sum(float(number) * _UNIT_SECONDS[unit] for number, unit in parts)
+
+
+def _retry_after(headers) -> float:
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return DEFAULT_RETRY_AFTER
+
+
+quotas = UpstreamQuota(os.getenv("UPSTREAM_QUOTA_PATH", os.path.join(".cache", "ratelimit.sqlite3")))
@@ -0,0 +1,8 @@
+"""
+Response package for JSON serialization, compression, ETags and static
+asset caching.
+"""
+
+from . import responseUtils
+
+__all__ = ['responseUtils']
@@ -0,0 +1,219 @@
+''' Utils function related to response serialization, compression and caching '''
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import orjson
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import brotli
+except ImportError:  # br is only offered when the brotli package is installed
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))  # Smaller bodies are sent as they are
+COMPRESS_CACHE_BYTES = int(os.getenv("COMPRESS_CACHE_BYTES", str(16 * 1024 * 1024)))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # Close to gzip's speed with smaller output
+STATIC_MAX_AGE = 365 * 24 * 3600  # For versioned static URLs, their content never changes
+
+_COMPRESSIBLE_TYPES = ("application/json", "application/javascript", "application/xml", "image/svg+xml")
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    JSON provider for app.json serializing with orjson. Keys keep their
+    insertion order, types orjson doesn't know go through Flask's default.
+    """
+
+    sort_keys = False
+
+    def _option(self) -> int:
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, default=self.default, option=self._option()).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # The encoded bytes go straight into the response, without a str in between
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self._option() | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def dumps(obj) -> str:
+    """obj as compact JSON, e.g. for server-sent events."""
+    return orjson.dumps(obj, default=DefaultJSONProvider.default, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+
+
+def negotiate_encoding(accept_encodings):
+    """br or gzip, whichever the client prefers by its Accept-Encoding, None for neither."""
+    return accept_encodings.best_match(("br", "gzip") if brotli is not None else ("gzip",))
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def is_compressible(mimetype: str) -> bool:
+    return bool(mimetype) and (mimetype.startswith("text/") or mimetype in _COMPRESSIBLE_TYPES)
+
+
+class ResponseOptimizer:
+    """
+    after_request step giving 200 responses a strong ETag, answering GETs
+    whose If-None-Match matches it with a 304 and compressing sizeable
+    text bodies with br or gzip. Compressed static files are kept in
+    memory by ETag so each one is compressed once. Streamed responses
+    such as server-sent events are passed through untouched.
+    """
+
+    def __init__(self, min_bytes: int = COMPRESS_MIN_BYTES, cache_bytes: int = COMPRESS_CACHE_BYTES):
+        self.min_bytes = min_bytes
+        self.cache_bytes = cache_bytes
+        self._compressed = OrderedDict()  # variant ETag -> compressed static file
+        self._size = 0
+        self._lock = threading.Lock()
+        self.compressed = 0
+        self.bytes_saved = 0
+        self.not_modified = 0
+
+    def process(self, request, response):
+        if response.status_code != 200 or (response.is_streamed and not response.direct_passthrough):
+            return response
+
+        encoding = None
+        if is_compressible(response.mimetype) and "Content-Encoding" not in response.headers:
+            response.vary.add("Accept-Encoding")
+            length = response.content_length
+            if length is None or length >= self.min_bytes:
+                encoding = negotiate_encoding(request.accept_encodings)
+
+        etag, weak = response.get_etag()
+        if etag is None and not response.direct_passthrough:
+            etag = hashlib.blake2b(response.get_data(), digest_size=16).hexdigest()
+        if etag is not None:
+            # Each encoding is its own representation with its own ETag
+            response.set_etag(f"{etag}-{encoding}" if encoding else etag, weak)
+            response.make_conditional(request)
+            if response.status_code == 304:
+                with self._lock:
+                    self.not_modified += 1
+                return response
+
+        if encoding is not None:
+            self._compress(response, encoding)
+        return response
+
+    def _compress(self, response, encoding: str) -> None:
+        etag = response.get_etag()[0]
+        static = response.direct_passthrough
+        body = self._cached(etag) if static and etag else None
+        if body is None:
+            # Files from send_file are read now instead of streamed by the server
+            response.direct_passthrough = False
+            data = response.get_data()
+            if len(data) < self.min_bytes:
+                return
+            body = compress(data, encoding)
+            if len(body) >= len(data):
+                return
+            if static and etag:
+                self._store(etag, body)
+            with self._lock:
+                self.bytes_saved += len(data) - len(body)
+        else:
+            original = response.response
+            if hasattr(original, "close"):
+                original.close()
+            response.direct_passthrough = False
+        response.set_data(body)
+        response.headers["Content-Encoding"] = encoding
+        with self._lock:
+            self.compressed += 1
+
+    def _cached(self, etag: str):
+        with self._lock:
+            body = self._compressed.get(etag)
+            if body is not None:
+                self._compressed.move_to_end(etag)
+            return body
+
+    def _store(self, etag: str, body: bytes) -> None:
+        if len(body) > self.cache_bytes:
+            return
+        with self._lock:
+            if etag in self._compressed:
+                return
+            self._compressed[etag] = body
+            self._size += len(body)
+            while self._size > self.cache_bytes:
+                _, evicted = self._compressed.popitem(last=False)
+                self._size -= len(evicted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "compressed": self.compressed,
+                "bytes_saved": self.bytes_saved,
+                "not_modified": self.not_modified,
+                "cached_files": len(self._compressed),
+                "cached_bytes": self._size,
+                "brotli": brotli is not None,
+            }
+
+
+class AssetVersions:
+    """
+    Short content hashes of static files for cache-busting ?v= URLs,
+    recomputed when a file's modification time changes.
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self._versions = {}  # filename -> (mtime, version)
+        self._lock = threading.Lock()
+
+    def version(self, filename: str):
+        """Version of filename, None when it doesn't exist."""
+        path = os.path.join(self.folder, filename)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        with self._lock:
+            known = self._versions.get(filename)
+        if known is not None and known[0] == mtime:
+            return known[1]
+        with open(path, "rb") as f:
+            version = hashlib.blake2b(f.read(), digest_size=5).hexdigest()
+        with self._lock:
+            self._versions[filename] = (mtime, version)
+        return version
+
+
+def cache_static(response, versioned: bool):
+    """
+    Versioned static URLs are cached for a year, others are revalidated
+    with their ETag on every use.
+    """
+    if response.status_code not in (200, 304):
+        return response
+    if versioned:
+        response.cache_control.public = True
+        response.cache_control.max_age = STATIC_MAX_AGE
+        response.cache_control.immutable = True
+        response.cache_control.no_cache = None
+    else:
+        response.cache_control.no_cache = True
+    return response
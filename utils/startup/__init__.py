@@ -0,0 +1,7 @@
+"""
+Startup package for provisioning local data and prewarming heavy imports.
+"""
+
+from . import startupUtils
+
+__all__ = ['startupUtils']
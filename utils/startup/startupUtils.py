@@ -0,0 +1,84 @@
+''' Utils function related to application startup '''
+import importlib
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Vendored or pre-provisioned NLTK data, searched before NLTK's default locations
+NLTK_DATA_DIR = os.getenv("NLTK_DATA_DIR", "nltk_data")
+NLTK_ALLOW_DOWNLOAD = os.getenv("NLTK_ALLOW_DOWNLOAD", "1") == "1"
+NLTK_RESOURCES = {"punkt": "tokenizers/punkt"}
+
+# Integrations imported lazily by the app, loaded ahead of time by prewarm()
+PREWARM_MODULES = [
+    "openai",
+    "firecrawl",
+    "utils.clients.llamaUtils",
+    "langchain_openai",
+    "llama_index.core",
+]
+
+_nltk_lock = threading.Lock()
+_nltk_ready = {}
+
+
+def ensure_nltk_data(name: str = "punkt", allow_download: bool = NLTK_ALLOW_DOWNLOAD) -> bool:
+    """
+    Make an NLTK resource available, looking in NLTK_DATA_DIR first.
+    It is only downloaded when missing and allow_download is set, so nothing
+    touches the network at import time. Returns whether it is available.
+    """
+    with _nltk_lock:
+        if name in _nltk_ready:
+            return _nltk_ready[name]
+
+        import nltk
+
+        data_dir = os.path.abspath(NLTK_DATA_DIR)
+        if data_dir not in nltk.data.path:
+            nltk.data.path.insert(0, data_dir)
+        try:
+            nltk.data.find(NLTK_RESOURCES[name])
+            available = True
+        except LookupError:
+            available = allow_download and nltk.download(name, download_dir=data_dir, quiet=True)
+            if not available:
+                logger.warning(f"NLTK resource '{name}' is not available in {data_dir}")
+        _nltk_ready[name] = bool(available)
+        return _nltk_ready[name]
+
+
+def prewarm() -> dict:
+    """Import the heavy integrations and load NLP data, returning timings in seconds."""
+    timings = {}
+    for module in PREWARM_MODULES:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            logger.warning(f"Prewarm could not import {module}: {e}")
+        timings[module] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ensure_nltk_data("punkt")
+    timings["nltk:punkt"] = time.perf_counter() - start
+    logger.info(f"Prewarm finished in {sum(timings.values()):.2f}s")
+    return timings
+
+
+def schedule_prewarm(delay: float = 1.0) -> threading.Timer:
+    """Run prewarm() on a daemon thread once the server had time to bind."""
+    timer = threading.Timer(delay, prewarm)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
+if __name__ == "__main__":
+    # Provision NLTK data ahead of time, e.g. while building a container image
+    for resource_name in NLTK_RESOURCES:
+        ok = ensure_nltk_data(resource_name, allow_download=True)
+        print(f"{resource_name}: {'ready' if ok else 'unavailable'} in {os.path.abspath(NLTK_DATA_DIR)}")